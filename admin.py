@@ -1,10 +1,22 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import Database
-from config import ADMIN_USERNAME
+from database import async_db
+from config import ADMIN_USERNAMES
+from callback_router import CallbackRouter
+
+# Маршруты кнопок админ-панели; handle_admin_callback - обработчик для CallbackQueryHandler
+admin_router = CallbackRouter()
+
+async def admin_guard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Проверка доступа к кнопкам админ-панели"""
+    query = update.callback_query
+    if query.from_user.username not in ADMIN_USERNAMES:
+        await query.answer("У вас нет доступа к этой функции.", show_alert=True)
+        return False
+    return True
 
 async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.username != ADMIN_USERNAME:
+    if update.effective_user.username not in ADMIN_USERNAMES:
         await update.message.reply_text("У вас нет доступа к админ-панели.")
         return
 
@@ -15,14 +27,10 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text("Админ-панель:", reply_markup=reply_markup)
 
+@admin_router.route("admin_pending_orders", guard=admin_guard)
 async def show_pending_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    if query.from_user.username != ADMIN_USERNAME:
-        await query.answer("У вас нет доступа к этой функции.", show_alert=True)
-        return
-
-    with Database() as db:
-        orders = db.get_pending_orders()
+    orders = await async_db.get_pending_orders()
 
     if not orders:
         await query.edit_message_text(
@@ -51,18 +59,14 @@ async def show_pending_orders(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     await query.edit_message_text(message, reply_markup=reply_markup)
 
-async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    if query.from_user.username != ADMIN_USERNAME:
-        await query.answer("У вас нет доступа к этой функции.", show_alert=True)
-        return
-
-    order_id = int(query.data.split('_')[2])
-    
-    with Database() as db:
+@admin_router.route("admin_confirm_{order_id:int}", guard=admin_guard)
+async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE, order_id):
+    def confirm(db):
         db.update_order_status(order_id, 'paid')
-        order = db.get_order(order_id)
-        
+        return db.get_order(order_id)
+
+    order = await async_db.run(confirm)
+
     # Отправляем уведомление пользователю
     try:
         await context.bot.send_message(
@@ -82,24 +86,13 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await show_pending_orders(update, context)
 
-async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-
-    if query.from_user.username != ADMIN_USERNAME:
-        await query.edit_message_text("У вас нет доступа к админ-панели.")
-        return
+@admin_router.route("admin_menu", guard=admin_guard)
+async def show_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    keyboard = [
+        [InlineKeyboardButton("📋 Ожидающие заказы", callback_data="admin_pending_orders")],
+        [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.callback_query.edit_message_text("Админ-панель:", reply_markup=reply_markup)
 
-    if query.data == "admin_menu":
-        keyboard = [
-            [InlineKeyboardButton("📋 Ожидающие заказы", callback_data="admin_pending_orders")],
-            [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("Админ-панель:", reply_markup=reply_markup)
-    
-    elif query.data == "admin_pending_orders":
-        await show_pending_orders(update, context)
-    
-    elif query.data.startswith("admin_confirm_"):
-        await confirm_payment(update, context) 
\ No newline at end of file
+handle_admin_callback = admin_router.dispatch
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from telegram import Update
+from telegram.error import BadRequest, Forbidden
+from telegram.ext import ContextTypes
+from config import ADMIN_USERNAMES, ADMIN_NOTIFY_TIMEOUT
+from database import async_db
+from broadcast import rate_limiter, record_delivery_error
+
+logger = logging.getLogger(__name__)
+
+class AdminNotifier:
+    """
+    Уведомления администраторам.
+
+    Сообщения отправляются всем администраторам параллельно в фоновой задаче,
+    поэтому обработчик пользователя не ждет Telegram. На каждого получателя
+    действует свой таймаут. @username администраторов один раз переводятся
+    в числовые chat id (из входящих обновлений, таблицы users или getChat)
+    и кэшируются.
+    """
+
+    def __init__(self, usernames=ADMIN_USERNAMES, timeout: float = ADMIN_NOTIFY_TIMEOUT):
+        self.usernames = list(usernames)
+        self.timeout = timeout
+        self._chat_ids = {}
+        self._lookup_done = False
+        self._tasks = set()
+
+    def remember(self, user):
+        """Запоминает chat id администратора по входящему обновлению"""
+        if user and user.username in self.usernames and self._chat_ids.get(user.username) != user.id:
+            self._chat_ids[user.username] = user.id
+
+    async def remember_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик для всех обновлений (группа -1), не мешает остальным обработчикам"""
+        if isinstance(update, Update):
+            self.remember(update.effective_user)
+
+    async def _resolve(self, bot):
+        missing = [username for username in self.usernames if username not in self._chat_ids]
+        if not missing or self._lookup_done:
+            return
+        self._lookup_done = True
+        try:
+            self._chat_ids.update(await async_db.get_telegram_ids_by_usernames(missing))
+        except Exception as e:
+            logger.error(f"Ошибка при поиске администраторов в базе: {e}")
+        for username in missing:
+            if username in self._chat_ids:
+                continue
+            try:
+                chat = await asyncio.wait_for(bot.get_chat(f"@{username}"), self.timeout)
+                self._chat_ids[username] = chat.id
+            except Exception as e:
+                logger.warning(f"Не удалось получить chat id администратора @{username}: {e}")
+
+    async def _send_one(self, bot, username, text, kwargs):
+        chat_id = self._chat_ids.get(username, f"@{username}")
+        try:
+            await rate_limiter.acquire(chat_id)
+            await asyncio.wait_for(bot.send_message(chat_id=chat_id, text=text, **kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Таймаут при отправке уведомления админу {username}")
+        except (Forbidden, BadRequest) as e:
+            # Статус доставки хранится по числовому chat id, у @username его еще нет
+            telegram_id = chat_id if isinstance(chat_id, int) else None
+            if not await record_delivery_error(telegram_id, e):
+                logger.error(f"Ошибка при отправке уведомления админу {username}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Ошибка при отправке уведомления админу {username}: {str(e)}")
+
+    async def send(self, bot, text, exclude=None, **kwargs):
+        """Отправляет уведомление всем администраторам (кроме exclude) и ждет завершения"""
+        await self._resolve(bot)
+        await asyncio.gather(*(
+            self._send_one(bot, username, text, kwargs)
+            for username in self.usernames if username != exclude
+        ))
+
+    def notify(self, context: ContextTypes.DEFAULT_TYPE, text, exclude=None, **kwargs):
+        """Запускает отправку уведомления в фоне и сразу возвращает управление"""
+        task = context.application.create_task(self.send(context.bot, text, exclude=exclude, **kwargs))
+        # Храним ссылку, чтобы задачу не собрал сборщик мусора до завершения
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+admin_notifier = AdminNotifier()
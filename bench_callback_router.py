@@ -0,0 +1,185 @@
+import argparse
+import sys
+import time
+from bot import callback_router
+from admin import admin_router
+
+# Типичные нажатия кнопок: callback_data -> ожидаемый обработчик
+SAMPLES = {
+    'main_menu': 'show_main_menu',
+    'check_subscription': 'check_subscription',
+    'show_categories': 'show_categories',
+    'feedback': 'feedback',
+    'catpage_12_n_3456': 'show_category_page',
+    'catpage_12_p_3400': 'show_category_page',
+    'category_list_7': 'show_categories',
+    'category_15': 'show_categories',
+    'product_4821': 'show_product',
+    'buy_4821': 'process_buy',
+    'confirm_4821': 'confirm_order',
+    'paid_913': 'paid_order',
+    'profile': 'profile',
+    'language': 'show_language_menu',
+    'orders': 'show_user_orders',
+    'show_language_menu': 'show_language_menu',
+    'lang_uz': 'change_language',
+    'show_statistics': 'show_statistics',
+    'stats_week': 'show_period_statistics',
+    'complete_cart_55': 'complete_cart',
+    'cancel_cart_55': 'cancel_cart',
+    'status_913_completed': 'update_order_status',
+    'admin_menu': 'show_admin_menu',
+    'admin_orders': 'admin_orders',
+    'admin_products': 'admin_products',
+    'admin_stats': 'admin_stats',
+    'admin_confirm_913': 'admin_confirm_order',
+}
+
+def compact_samples():
+    """Компактные callback_data (как в кнопках каталога) -> ожидаемый обработчик и аргументы"""
+    return [
+        (callback_router.pack('c', 12, 'n', 3456), 'show_category_page',
+         {'category_id': 12, 'direction': 'n', 'anchor_id': 3456}),
+        (callback_router.pack('p', 4821, back=(12, 3456, 1)), 'show_product',
+         {'product_id': 4821, 'back': (12, 3456, 1)}),
+        (callback_router.pack('b', 4821, back=(12,)), 'process_buy',
+         {'product_id': 4821, 'back': (12,)}),
+        # Длинный стек не помещается в 64 байта и хранится на сервере
+        (callback_router.pack('p', 4821, back=tuple(range(10 ** 9, 10 ** 9 + 20))), 'show_product',
+         {'product_id': 4821, 'back': tuple(range(10 ** 9, 10 ** 9 + 20))}),
+    ]
+
+def legacy_match(data):
+    """
+    Поиск обработчика цепочкой if/elif, как в прежнем handle_callback,
+    вместе с разбором аргументов, который делали сами обработчики
+    """
+    if data.startswith("admin_"):
+        if data == "admin_menu":
+            return 'show_admin_menu'
+        elif data == "admin_orders":
+            return 'admin_orders'
+        elif data == "admin_products":
+            return 'admin_products'
+        elif data == "admin_stats":
+            return 'admin_stats'
+        elif data.startswith("admin_confirm_"):
+            int(data.split('_')[2])
+            return 'admin_confirm_order'
+        return None
+    if data == "main_menu":
+        return 'show_main_menu'
+    elif data == "check_subscription":
+        return 'check_subscription'
+    elif data == "show_categories":
+        return 'show_categories'
+    elif data == "feedback":
+        return 'feedback'
+    elif data.startswith("catpage_"):
+        _, category_id, direction, anchor_id = data.split('_')
+        int(category_id), int(anchor_id)
+        return 'show_category_page'
+    elif data.startswith("category_list_"):
+        int(data.split('_')[2])
+        return 'show_categories'
+    elif data.startswith("category_"):
+        int(data.split('_')[1])
+        return 'show_categories'
+    elif data.startswith("product_"):
+        int(data.split('_')[1])
+        return 'show_product'
+    elif data.startswith("buy_"):
+        int(data.split('_')[1])
+        return 'process_buy'
+    elif data.startswith("confirm_"):
+        int(data.split('_')[1])
+        return 'confirm_order'
+    elif data.startswith("paid_"):
+        int(data.split('_')[1])
+        return 'paid_order'
+    elif data == "profile":
+        return 'profile'
+    elif data == "language":
+        return 'show_language_menu'
+    elif data == "orders":
+        return 'show_user_orders'
+    elif data == "show_language_menu":
+        return 'show_language_menu'
+    elif data.startswith("lang_"):
+        return 'change_language'
+    elif data == "show_statistics":
+        return 'show_statistics'
+    elif data.startswith("stats_"):
+        return 'show_period_statistics'
+    elif data.startswith("complete_cart_"):
+        int(data.split('_')[2])
+        return 'complete_cart'
+    elif data.startswith("cancel_cart_"):
+        int(data.split('_')[2])
+        return 'cancel_cart'
+    elif data.startswith("status_"):
+        _, order_id, new_status = data.split('_')
+        int(order_id)
+        return 'update_order_status'
+    return None
+
+def check_routes():
+    """
+    Проверяет таблицы маршрутов: шаблоны не пересекаются и каждая
+    кнопка из SAMPLES попадает в ожидаемый обработчик
+
+    Returns:
+        bool: True, если ошибок нет
+    """
+    ok = True
+    for name, router in (('bot', callback_router), ('admin', admin_router)):
+        routes = router.routes
+        for i, route in enumerate(routes):
+            for other in routes[i + 1:]:
+                if route.overlaps(other):
+                    print(f"[{name}] пересекаются шаблоны {route.pattern!r} и {other.pattern!r}")
+                    ok = False
+        print(f"[{name}] маршрутов: {len(routes)}")
+
+    for data, expected in SAMPLES.items():
+        route, args = callback_router.match(data)
+        handler = route.handler.__name__ if route else None
+        if handler != expected:
+            print(f"{data!r}: ожидался {expected}, получен {handler}")
+            ok = False
+
+    for data, expected, expected_args in compact_samples():
+        route, args = callback_router.match(data)
+        handler = route.handler.__name__ if route else None
+        if len(data.encode('utf-8')) > 64 or handler != expected or args != expected_args:
+            print(f"{data!r}: ожидался {expected}{expected_args}, получен {handler}{args}")
+            ok = False
+    return ok
+
+def run_benchmark(iterations: int):
+    """Сравнивает скорость поиска обработчика: цепочка if/elif и таблица маршрутов"""
+    samples = list(SAMPLES) * iterations
+    compact = [data for data, _, _ in compact_samples()] * (len(samples) // 4)
+    for name, match, samples in (
+        ('if/elif', legacy_match, samples),
+        ('CallbackRouter', callback_router.match, samples),
+        ('CallbackRouter, компактная форма', callback_router.match, compact),
+    ):
+        started = time.perf_counter()
+        for data in samples:
+            match(data)
+        elapsed = time.perf_counter() - started
+        print(f"{name}:")
+        print(f"  нажатий: {len(samples)}")
+        print(f"  {len(samples) / elapsed:,.0f} в секунду, {elapsed / len(samples) * 1e6:.2f} мкс на нажатие")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Бенчмарк и проверка маршрутов callback-кнопок")
+    parser.add_argument('--iterations', type=int, default=20000, help="Количество проходов по всем образцам")
+    parser.add_argument('--check', action='store_true', help="Только проверить маршруты (код выхода 1 при ошибке)")
+    args = parser.parse_args()
+
+    if not check_routes():
+        sys.exit(1)
+    if not args.check:
+        run_benchmark(args.iterations)
@@ -0,0 +1,65 @@
+import argparse
+import statistics
+import time
+from database import Database
+
+class CountingCursor:
+    """Обертка над курсором, считающая выполненные запросы"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.queries = 0
+
+    def execute(self, operation, params=None):
+        self.queries += 1
+        return self._cursor.execute(operation, params)
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+def old_screen(db, category_id):
+    """Экран категории так, как он собирался раньше (4 запроса)"""
+    categories = db.get_categories(category_id)
+    products = db.get_products_by_category(category_id) if category_id else []
+    parent = db.get_category(category_id) if category_id else None
+    header = db.get_category(category_id) if category_id else None
+    return categories, products, parent, header
+
+def new_screen(db, category_id):
+    """Экран категории одним запросом"""
+    return db.get_category_screen(category_id)
+
+def p95(samples):
+    return statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+
+def run_benchmark(iterations: int):
+    """Сравнивает количество запросов и p95 задержки старого и нового способа"""
+    with Database() as db:
+        db.cursor.execute("SELECT id FROM categories")
+        category_ids = [None] + [row['id'] for row in db.cursor.fetchall()]
+
+        for name, build in (('Старый (4 запроса)', old_screen), ('Новый (1 запрос)', new_screen)):
+            counter = CountingCursor(db.cursor)
+            db.cursor = counter
+            samples = []
+            try:
+                for _ in range(iterations):
+                    for category_id in category_ids:
+                        started = time.perf_counter()
+                        build(db, category_id)
+                        samples.append((time.perf_counter() - started) * 1000)
+            finally:
+                db.cursor = counter._cursor
+
+            print(f"{name}:")
+            print(f"  экранов: {len(samples)}")
+            print(f"  запросов на экран: {counter.queries / len(samples):.2f}")
+            print(f"  среднее: {statistics.mean(samples):.2f} мс, p95: {p95(samples):.2f} мс")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Бенчмарк построения экрана категории")
+    parser.add_argument('--iterations', type=int, default=20, help="Количество проходов по всем категориям")
+    args = parser.parse_args()
+
+    print("Запуск бенчмарка экрана категории...")
+    run_benchmark(args.iterations)
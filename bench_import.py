@@ -0,0 +1,45 @@
+import argparse
+import time
+import tracemalloc
+from fake_moysklad import start_fake_moysklad
+from moysklad import MoySkladClient, TokenBucket
+from import_products import import_products_to_db
+
+# Бенчмарк импорта на больших каталогах: для каждого размера запускает имитацию
+# МойСклад и полный импорт в базу из DB_CONFIG, замеряя время и пиковую память.
+# Пиковая память должна оставаться почти одинаковой при росте каталога.
+# ВНИМАНИЕ: товары и категории записываются в настроенную базу - используйте тестовую.
+
+def run_import(products: int, folders: int):
+    """Полный импорт каталога из products товаров; возвращает (секунды, пик памяти в байтах, сводка импорта)"""
+    server, base_url = start_fake_moysklad(products, folders)
+    # Локальной имитации лимиты МойСклад не нужны
+    client = MoySkladClient('bench', 'bench', base_url=base_url, rate_limiter=TokenBucket(10 ** 6, 1))
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        summary = import_products_to_db(full=True, client=client)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        client.close()
+        server.shutdown()
+    return elapsed, peak, summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Бенчмарк импорта товаров на большом каталоге")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Размеры каталога (количество товаров)")
+    parser.add_argument('--folders', type=int, default=200, help="Количество папок товаров")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        print(f"Импорт каталога из {size} товаров...")
+        results.append((size,) + run_import(size, args.folders))
+
+    print()
+    print(f"{'товаров':>10} {'время, с':>10} {'товаров/с':>10} {'пик памяти, МБ':>15}")
+    for size, elapsed, peak, summary in results:
+        print(f"{size:>10} {elapsed:>10.2f} {size / elapsed:>10.0f} {peak / 1024 / 1024:>15.1f}")
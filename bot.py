@@ -1,6 +1,4 @@
 # Стандартные библиотеки
-import asyncio
-import json
 import logging
 import os
 import sys
@@ -9,17 +7,27 @@ from logging.handlers import RotatingFileHandler
 # Сторонние библиотеки
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import (
+    Application, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, ChatMemberHandler,
+    filters, ContextTypes
+)
 
 # Локальные импорты
 from config import (
     BOT_TOKEN, CHANNEL_USERNAME, SHOP_ADDRESSES, 
     ADMIN_USERNAMES, PAYMENT_INFO, 
-    MOYSKLAD_LOGIN, MOYSKLAD_PASSWORD,
-    WELCOME_MESSAGE,
-    SUBSCRIPTION_MESSAGE, CATEGORIES_MESSAGE
+    MOYSKLAD_WEBHOOK_PORT
 )
-from database import Database
+from database import async_db, get_pool_stats
+from catalog_cache import catalog_cache
+from migrations import run_migrations
+from moysklad_webhook import MoySkladWebhookProcessor, start_webhook_server
+from catalog_sync import setup_catalog_sync
+from broadcast import broadcast_manager, record_delivery_error
+from admin_notifier import admin_notifier
+from subscription_cache import subscription_cache
+from callback_router import callback_router
+from dashboard import dashboard_cache, setup_stats_rollup
 
 # Поддерживаемые языки
 LANGUAGES = {
@@ -142,6 +150,15 @@ PROFILE_MESSAGE = """
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         logger.info(f"Получена команда /start от пользователя {update.effective_user.id}")
+        # Пользователь, ранее заблокировавший бота, снова получает рассылки
+        if await async_db.mark_user_reachable(update.effective_user.id):
+            logger.info(f"Пользователь {update.effective_user.id} снова доступен для сообщений")
+
+        # Вернувшемуся подписчику сразу показываем меню, без запроса к Telegram
+        if await subscription_cache.get(update.effective_user.id):
+            await show_main_menu(update, context)
+            return
+
         keyboard = [
             [InlineKeyboardButton("Подписаться на канал", url=f"https://t.me/{CHANNEL_USERNAME[1:]}")],
             [InlineKeyboardButton("Проверить подписку", callback_data="check_subscription")]
@@ -157,6 +174,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка в функции start: {str(e)}")
         await update.message.reply_text("Произошла ошибка. Пожалуйста, попробуйте позже или обратитесь к администратору.")
 
+@callback_router.route("check_subscription")
 async def check_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         query = update.callback_query
@@ -169,15 +187,8 @@ async def check_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await show_main_menu(update, context)
             return
         
-        # Проверка подписки на канал
-        try:
-            logger.info(f"Попытка проверить статус участника в канале {CHANNEL_USERNAME}")
-            member = await context.bot.get_chat_member(chat_id=CHANNEL_USERNAME, user_id=user_id)
-            logger.info(f"Статус пользователя в канале: {member.status}")
-            is_subscribed = member.status in ['member', 'administrator', 'creator']
-        except Exception as e:
-            logger.error(f"Ошибка при проверке подписки: {str(e)}")
-            is_subscribed = False
+        # Проверка подписки на канал (результат кэшируется, см. subscription_cache.py)
+        is_subscribed = await subscription_cache.check(context.bot, query.from_user)
 
         logger.info(f"Результат проверки подписки: {is_subscribed}")
 
@@ -196,6 +207,7 @@ async def check_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE)
         if query:
             await query.answer("Произошла ошибка. Попробуйте позже.", show_alert=True)
 
+@callback_router.route("main_menu")
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     keyboard = [
@@ -216,48 +228,88 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=reply_markup
         )
 
-async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def _page_navigation(category_id, products, has_prev, has_next):
+    """Кнопки перехода между страницами товаров категории"""
+    row = []
+    if products and has_prev:
+        row.append(InlineKeyboardButton("◀️ Назад", callback_data=callback_router.pack('c', category_id, 'p', products[0]['id'])))
+    if products and has_next:
+        row.append(InlineKeyboardButton("Далее ▶️", callback_data=callback_router.pack('c', category_id, 'n', products[-1]['id'])))
+    return row
+
+def _page_ref(category_id, direction=None, anchor_id=None):
+    """
+    Стек возврата на страницу категории для кнопок товара
+
+    Returns:
+        tuple: (category_id,) для первой страницы, иначе (category_id, anchor_id, 1 - далее / 0 - назад)
+    """
+    if direction is None:
+        return (category_id or 0,)
+    return (category_id, anchor_id, 1 if direction == 'n' else 0)
+
+def _back_to_page(back, category_id):
+    """callback_data кнопки возврата на страницу категории, с которой открыли товар"""
+    if len(back) == 3:
+        page_category_id, anchor_id, is_next = back
+        return callback_router.pack('c', page_category_id, 'n' if is_next else 'p', anchor_id)
+    if back:
+        category_id = back[0]
+    return f"category_{category_id}" if category_id else "show_categories"
+
+@callback_router.route("show_categories")
+@callback_router.route("category_list_{parent_id:int}")
+@callback_router.route("category_{parent_id:int}")
+async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE, parent_id=None):
     """Показывает категории или подкатегории"""
-    query = update.callback_query
-    
-    # Получаем parent_id из callback_data
-    parent_id = None
-    if query.data != "show_categories":
-        # Формат может быть: category_list_[parent_id] или category_[id]
-        parts = query.data.split('_')
-        if len(parts) > 2 and parts[1] == "list":
-            parent_id = int(parts[2])
-        elif len(parts) == 2:
-            parent_id = int(parts[1])
+    await render_category(update.callback_query, parent_id)
+
+async def render_category(query, parent_id, page=None, page_ref=None):
+    """
+    Отрисовывает экран категории
+
+    Args:
+        query: CallbackQuery, сообщение которого редактируется
+        parent_id (int): ID категории или None для корня каталога
+        page (dict): Страница товаров из get_products_page; None - первая страница
+        page_ref (tuple): Стек возврата на эту страницу (см. _page_ref)
+    """
+    # Заголовок, родитель, подкатегории и первая страница товаров - одним запросом
+    screen = await catalog_cache.get_category_screen(parent_id)
+    # Путь, родитель и наличие товаров в подкатегориях - по дереву категорий из кэша
+    tree = await catalog_cache.get_category_tree()
+    if page is None:
+        page = {'products': screen['products'], 'has_prev': False, 'has_next': screen['has_next']}
     
-    with Database() as db:
-        categories = db.get_categories(parent_id)
-        # Проверяем, есть ли товары в текущей категории
-        products = db.get_products_by_category(parent_id) if parent_id else []
+    if page_ref is None:
+        page_ref = _page_ref(parent_id)
     
     keyboard = []
     
-    # Добавляем товары, если они есть
-    if products:
-        for product in products:
-            keyboard.append([InlineKeyboardButton(f"📦 {product['name']}", 
-                                               callback_data=f"product_{product['id']}")])
+    # Добавляем товары текущей страницы, если они есть; из карточки товара "Назад" вернет на эту страницу
+    for product in page['products']:
+        keyboard.append([InlineKeyboardButton(f"📦 {product['name']}", 
+                                           callback_data=callback_router.pack('p', product['id'], back=page_ref))])
+    
+    navigation = _page_navigation(parent_id, page['products'], page['has_prev'], page['has_next'])
+    if navigation:
+        keyboard.append(navigation)
     
-    # Добавляем подкатегории
-    for category in categories:
-        keyboard.append([InlineKeyboardButton(f"📁 {category['name']}", 
-                                           callback_data=f"category_list_{category['id']}")])
+    # Добавляем подкатегории (только на первой странице); ветки без товаров не показываем
+    if not page['has_prev']:
+        for category in screen['categories']:
+            if not tree.has_products_below(category['id']):
+                continue
+            keyboard.append([InlineKeyboardButton(f"📁 {category['name']}", 
+                                               callback_data=f"category_list_{category['id']}")])
     
     # Кнопка "Назад"
     if parent_id:
-        # Получаем родительскую категорию текущей категории
-        with Database() as db:
-            current_category = db.get_category(parent_id)
-            parent_category_id = current_category.get('parent_id') if current_category else None
+        ancestors = tree.ancestors(parent_id)
         
-        if parent_category_id:
+        if ancestors:
             keyboard.append([InlineKeyboardButton("🔙 Назад", 
-                                               callback_data=f"category_list_{parent_category_id}")])
+                                               callback_data=f"category_list_{ancestors[-1]['id']}")])
         else:
             keyboard.append([InlineKeyboardButton("🔙 Назад", 
                                                callback_data="show_categories")])
@@ -267,37 +319,43 @@ async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    # Формируем заголовок
+    # Формируем заголовок: путь к категории берем из дерева категорий в кэше, без запросов по уровням
     if parent_id:
-        with Database() as db:
-            category = db.get_category(parent_id)
-        header = f"Категория: {category['name'] if category else 'Неизвестная категория'}"
+        path = [category['name'] for category in tree.path(parent_id)]
+        header = f"Категория: {' / '.join(path) or screen['name'] or 'Неизвестная категория'}"
     else:
         header = "Выберите категорию:"
     
     await query.edit_message_text(header, reply_markup=reply_markup)
 
-async def show_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_router.route("catpage_{category_id:int}_{direction}_{anchor_id:int}", code='c')
+async def show_category_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                             category_id, direction, anchor_id):
+    """Показывает следующую (direction='n') или предыдущую страницу товаров категории"""
     query = update.callback_query
-    category_id = int(query.data.split('_')[1])
-    
-    with Database() as db:
-        products = db.get_products_by_category(category_id)
     
-    keyboard = []
-    for product in products:
-        keyboard.append([InlineKeyboardButton(product['name'], callback_data=f"product_{product['id']}")])
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="show_categories")])
+    if direction == 'n':
+        page = await catalog_cache.get_products_page(category_id, after_id=anchor_id)
+    else:
+        page = await catalog_cache.get_products_page(category_id, before_id=anchor_id)
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text("Выберите товар:", reply_markup=reply_markup)
+    # Вернулись к началу - показываем первую страницу вместе с подкатегориями
+    if not page['has_prev']:
+        await render_category(query, category_id)
+        return
+    await render_category(query, category_id, page, _page_ref(category_id, direction, anchor_id))
+
+@callback_router.route("product_{product_id:int}", code='p')
+async def show_product(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id, back=()):
+    """
+    Карточка товара
 
-async def show_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    Args:
+        back (tuple): Стек возврата на страницу категории, с которой открыли товар
+    """
     query = update.callback_query
-    product_id = int(query.data.split('_')[1])
     
-    with Database() as db:
-        product = db.get_product(product_id)
+    product = await catalog_cache.get_product(product_id)
     
     availability = []
     if product['stock_point1']:
@@ -319,18 +377,17 @@ async def show_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     keyboard = []
     if product['stock_point1'] or product['stock_point2']:
-        keyboard.append([InlineKeyboardButton("🚚 Купить с доставкой", callback_data=f"buy_{product_id}")])
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=f"category_{product['category_id']}")])
+        keyboard.append([InlineKeyboardButton("🚚 Купить с доставкой", callback_data=callback_router.pack('b', product_id, back=back))])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=_back_to_page(back, product['category_id']))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(message, reply_markup=reply_markup)
 
-async def process_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_router.route("buy_{product_id:int}", code='b')
+async def process_buy(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id, back=()):
     query = update.callback_query
-    product_id = int(query.data.split('_')[1])
     
-    with Database() as db:
-        product = db.get_product(product_id)
+    product = await catalog_cache.get_product(product_id)
     
     message = (
         "🚚 Информация о доставке:\n\n"
@@ -342,22 +399,25 @@ async def process_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     keyboard = [
         [InlineKeyboardButton("✅ Подтвердить заказ", callback_data=f"confirm_{product_id}")],
-        [InlineKeyboardButton("🔙 Назад", callback_data=f"product_{product_id}")]
+        [InlineKeyboardButton("🔙 Назад", callback_data=callback_router.pack('p', product_id, back=back))]
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(message, reply_markup=reply_markup)
 
-async def confirm_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_router.route("confirm_{product_id:int}")
+async def confirm_order(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id):
     """Подтверждение заказа пользователем"""
     query = update.callback_query
-    product_id = int(query.data.split('_')[1])
     user_id = query.from_user.id
     
-    with Database() as db:
+    def create_order(db):
         user = db.get_user(user_id)
         product = db.get_product(product_id)
         order_id = db.create_order(user['id'], product_id, 1)  # По умолчанию с первой точки
+        return product, order_id
+
+    product, order_id = await async_db.run(create_order)
     
     payment_info = (
         "💳 Информация об оплате:\n\n"
@@ -378,14 +438,15 @@ async def confirm_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(payment_info, reply_markup=reply_markup)
 
+@callback_router.route("profile")
 async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает профиль пользователя"""
     user = update.effective_user
     
-    with Database() as db:
-        user_data = db.get_user(user.id)
-        orders_count = db.get_user_orders_count(user.id)
-        user_lang = user_data.get('language', 'ru') if user_data else 'ru'
+    user_data, orders_count = await async_db.run(
+        lambda db: (db.get_user(user.id), db.get_user_orders_count(user.id))
+    )
+    user_lang = user_data.get('language', 'ru') if user_data else 'ru'
     
     message = (
         f"👤 *Профиль*\n\n"
@@ -440,15 +501,14 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 ]])
             )
             # Уведомление других админов о попытке взлома
-            for admin in ADMIN_USERNAMES:
-                if admin != user.username:
-                    await context.bot.send_message(
-                        chat_id=f"@{admin}",
-                        text=f"🚨 Внимание! Попытка входа в админ-панель\n"
-                             f"От: @{user.username}\n"
-                             f"ID: {user.id}\n"
-                             f"Время: {update.message.date.strftime('%Y-%m-%d %H:%M:%S')}"
-                    )
+            admin_notifier.notify(
+                context,
+                f"🚨 Внимание! Попытка входа в админ-панель\n"
+                f"От: @{user.username}\n"
+                f"ID: {user.id}\n"
+                f"Время: {update.message.date.strftime('%Y-%m-%d %H:%M:%S')}",
+                exclude=user.username
+            )
             return
 
         # Парсинг введенных данных
@@ -503,19 +563,37 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         
         # Уведомление других админов о входе
-        for admin in ADMIN_USERNAMES:
-            if admin != user.username:
-                await context.bot.send_message(
-                    chat_id=f"@{admin}",
-                    text=f"ℹ️ Администратор @{user.username} вошел в панель управления\n"
-                         f"⏰ Время: {update.message.date.strftime('%Y-%m-%d %H:%M:%S')}"
-                )
+        admin_notifier.notify(
+            context,
+            f"ℹ️ Администратор @{user.username} вошел в панель управления\n"
+            f"⏰ Время: {update.message.date.strftime('%Y-%m-%d %H:%M:%S')}",
+            exclude=user.username
+        )
             
     except Exception as e:
         logger.error(f"Критическая ошибка в команде admin: {str(e)}")
         if update and update.message:
             await update.message.reply_text("Произошла ошибка при обработке команды. Попробуйте позже.")
 
+async def admin_callback_guard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Проверка доступа к админским кнопкам"""
+    query = update.callback_query
+    if query.from_user.username not in ADMIN_USERNAMES:
+        await query.answer("Доступ запрещен", show_alert=True)
+        return False
+    return True
+
+@callback_router.route("admin_menu", guard=admin_callback_guard)
+async def show_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Меню админ-панели"""
+    keyboard = [
+        [InlineKeyboardButton("📋 Ожидающие заказы", callback_data="admin_orders")],
+        [InlineKeyboardButton("📦 Управление товарами", callback_data="admin_products")],
+        [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")]
+    ]
+    await update.callback_query.edit_message_text("🔐 Админ-панель:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+@callback_router.route("admin_orders", guard=admin_callback_guard)
 async def admin_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает список ожидающих заказов"""
     query = update.callback_query
@@ -523,9 +601,8 @@ async def admin_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer("Доступ запрещен", show_alert=True)
         return
 
-    with Database() as db:
-        # Получаем как ожидающие, так и оплаченные заказы
-        orders = db.get_pending_orders()
+    # Получаем как ожидающие, так и оплаченные заказы
+    orders = await async_db.get_pending_orders()
 
     if not orders:
         keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]]
@@ -552,6 +629,7 @@ async def admin_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")])
     await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
 
+@callback_router.route("admin_products", guard=admin_callback_guard)
 async def admin_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Управление товарами"""
     query = update.callback_query
@@ -567,6 +645,7 @@ async def admin_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     await query.edit_message_text("📦 Управление товарами:", reply_markup=InlineKeyboardMarkup(keyboard))
 
+@callback_router.route("admin_stats", guard=admin_callback_guard)
 async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает статистику"""
     query = update.callback_query
@@ -574,81 +653,106 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer("Доступ запрещен", show_alert=True)
         return
 
-    with Database() as db:
-        total_orders = len(db.get_all_orders())
-        pending_orders = len(db.get_pending_orders())
-        total_users = len(db.get_all_users())
+    summary = await dashboard_cache.get()
         
     message = (
         "📊 Статистика магазина:\n\n"
-        f"👥 Всего пользователей: {total_users}\n"
-        f"📦 Всего заказов: {total_orders}\n"
-        f"⏳ Ожидают обработки: {pending_orders}\n"
+        f"👥 Всего пользователей: {summary['total_users']}\n"
+        f"📦 Всего заказов: {summary['total_orders']}\n"
+        f"⏳ Ожидают обработки: {summary['pending_orders']}\n"
     )
+
+    cache_stats = catalog_cache.get_stats()
+    message += (
+        f"\n🗂 Кэш каталога: {cache_stats['hits']} попаданий, "
+        f"{cache_stats['misses']} промахов ({cache_stats['hit_rate']:.0%}), "
+        f"записей {cache_stats['entries']}, вытеснено {cache_stats['evictions']}\n"
+    )
+    pool_stats = get_pool_stats()
+    message += (
+        f"🔌 Соединения с базой: занято {pool_stats['in_use']} из {pool_stats['size']} "
+        f"(максимум {pool_stats['max_in_use']}), ожиданий {pool_stats['waits']}, "
+        f"таймаутов {pool_stats['timeouts']}\n"
+    )
+    delivery_stats, last_broadcast, last_sync = summary['delivery'], summary['last_broadcast'], summary['last_sync']
+    unreachable = delivery_stats.get('blocked', 0) + delivery_stats.get('deactivated', 0)
+    message += (
+        f"📵 Недоступны для рассылок: {unreachable} "
+        f"(заблокировали бота: {delivery_stats.get('blocked', 0)}, удалены: {delivery_stats.get('deactivated', 0)})\n"
+    )
+    if last_broadcast:
+        total = last_broadcast['sent'] + last_broadcast['failed'] + last_broadcast['skipped']
+        message += (
+            f"📣 Последняя рассылка: отправлено {last_broadcast['sent']}, ошибок {last_broadcast['failed']}, "
+            f"сэкономлено {last_broadcast['skipped']} отправок ({last_broadcast['skipped'] / total if total else 0:.0%})\n"
+        )
+    if last_sync:
+        message += (
+            f"🔄 Синхронизация с МойСклад: {last_sync['finished_at']:%d.%m %H:%M}, "
+            f"{last_sync['status']}, {last_sync['duration']:.0f} с, ошибок {last_sync['errors']}\n"
+        )
     
     keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]]
     await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
 
-async def admin_confirm_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_router.route("admin_confirm_{order_id:int}", guard=admin_callback_guard)
+async def admin_confirm_order(update: Update, context: ContextTypes.DEFAULT_TYPE, order_id):
     """Подтверждение заказа администратором"""
-    query = update.callback_query
-    order_id = int(query.data.split('_')[2])
-    
-    with Database() as db:
+    def confirm(db):
         db.update_order_status(order_id, "confirmed")
-        order = db.get_order(order_id)
-        
-        # Отправляем уведомление пользователю
-        try:
-            await context.bot.send_message(
-                chat_id=order['user_telegram_id'],
-                text=f"✅ Ваш заказ #{order_id} подтвержден!\n\n"
-                     f"📦 Как получить заказ:\n\n"
-                     f"1️⃣ Закажите доставку через приложение:\n"
-                     f"   • Яндекс Go\n"
-                     f"   • InDriver\n\n"
-                     f"2️⃣ Процесс доставки:\n"
-                     f"   • Водитель приедет к нашей точке\n"
-                     f"   • Мы передадим ему ваш заказ\n"
-                     f"   • Он доставит его прямо к вам домой\n\n"
-                     f"💡 Преимущества такой доставки:\n"
-                     f"   • Быстро и надежно\n"
-                     f"   • Вы сами выбираете удобное время\n"
-                     f"   • Отслеживание заказа в реальном времени\n"
-                     f"   • Конфиденциальность гарантирована\n\n"
-                     f"📞 Наш менеджер свяжется с вами для:\n"
-                     f"   • Подтверждения готовности заказа\n"
-                     f"   • Координации процесса доставки\n"
-                     f"   • Ответов на ваши вопросы"
-            )
-        except Exception as e:
+        return db.get_order(order_id)
+
+    order = await async_db.run(confirm)
+
+    # Отправляем уведомление пользователю
+    try:
+        await context.bot.send_message(
+            chat_id=order['user_telegram_id'],
+            text=f"✅ Ваш заказ #{order_id} подтвержден!\n\n"
+                 f"📦 Как получить заказ:\n\n"
+                 f"1️⃣ Закажите доставку через приложение:\n"
+                 f"   • Яндекс Go\n"
+                 f"   • InDriver\n\n"
+                 f"2️⃣ Процесс доставки:\n"
+                 f"   • Водитель приедет к нашей точке\n"
+                 f"   • Мы передадим ему ваш заказ\n"
+                 f"   • Он доставит его прямо к вам домой\n\n"
+                 f"💡 Преимущества такой доставки:\n"
+                 f"   • Быстро и надежно\n"
+                 f"   • Вы сами выбираете удобное время\n"
+                 f"   • Отслеживание заказа в реальном времени\n"
+                 f"   • Конфиденциальность гарантирована\n\n"
+                 f"📞 Наш менеджер свяжется с вами для:\n"
+                 f"   • Подтверждения готовности заказа\n"
+                 f"   • Координации процесса доставки\n"
+                 f"   • Ответов на ваши вопросы"
+        )
+    except Exception as e:
+        if not await record_delivery_error(order.get('user_telegram_id'), e):
             logger.error(f"Ошибка при отправке уведомления пользователю: {str(e)}")
     
     # Обновляем список заказов
     await admin_orders(update, context)
 
-async def paid_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_router.route("paid_{order_id:int}")
+async def paid_order(update: Update, context: ContextTypes.DEFAULT_TYPE, order_id):
     """Обработка подтверждения оплаты от пользователя"""
     query = update.callback_query
-    order_id = int(query.data.split('_')[1])
     
-    with Database() as db:
+    def mark_paid(db):
         db.update_order_status(order_id, "paid")
-        
         # Получаем информацию о заказе
-        order = db.get_order(order_id)
-        
-        # Отправляем уведомление администраторам
-        for admin_username in ADMIN_USERNAMES:
-            try:
-                await context.bot.send_message(
-                    chat_id=f"@{admin_username}",
-                    text=f"💰 Новый оплаченный заказ #{order_id}\n"
-                         f"От пользователя: @{query.from_user.username or 'Без username'}\n"
-                         "Ожидает подтверждения оплаты"
-                )
-            except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления админу {admin_username}: {str(e)}")
+        return db.get_order(order_id)
+
+    order = await async_db.run(mark_paid)
+    
+    # Отправляем уведомление администраторам
+    admin_notifier.notify(
+        context,
+        f"💰 Новый оплаченный заказ #{order_id}\n"
+        f"От пользователя: @{query.from_user.username or 'Без username'}\n"
+        "Ожидает подтверждения оплаты"
+    )
     
     await query.edit_message_text(
         "✅ Спасибо за оплату!\n"
@@ -656,6 +760,7 @@ async def paid_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Вы получите уведомление, когда заказ будет подтвержден."
     )
 
+@callback_router.route("feedback")
 async def feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка запроса на отправку обратной связи"""
     query = update.callback_query
@@ -675,8 +780,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         feedback_text = update.message.text
         user = update.effective_user
         
-        with Database() as db:
-            feedback_id = db.save_feedback(user.id, feedback_text)
+        feedback_id = await async_db.save_feedback(user.id, feedback_text)
         
         # Отправляем подтверждение пользователю
         keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data="main_menu")]]
@@ -686,116 +790,53 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         
         # Уведомляем администраторов
-        for admin in ADMIN_USERNAMES:
-            try:
-                await context.bot.send_message(
-                    chat_id=f"@{admin}",
-                    text=f"📬 Новый отзыв!\n\n"
-                         f"От: @{user.username}\n"
-                         f"ID: {user.id}\n"
-                         f"Текст: {feedback_text}\n"
-                         f"ID отзыва: #{feedback_id}"
-                )
-            except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления админу {admin}: {str(e)}")
+        admin_notifier.notify(
+            context,
+            f"📬 Новый отзыв!\n\n"
+            f"От: @{user.username}\n"
+            f"ID: {user.id}\n"
+            f"Текст: {feedback_text}\n"
+            f"ID отзыва: #{feedback_id}"
+        )
         
         context.user_data['awaiting_feedback'] = False
         return
 
-async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    # Админские callback
-    if query.data.startswith("admin_"):
-        if query.from_user.username not in ADMIN_USERNAMES:
-            await query.answer("Доступ запрещен", show_alert=True)
-            return
-            
-        if query.data == "admin_menu":
-            keyboard = [
-                [InlineKeyboardButton("📋 Ожидающие заказы", callback_data="admin_orders")],
-                [InlineKeyboardButton("📦 Управление товарами", callback_data="admin_products")],
-                [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")]
-            ]
-            await query.edit_message_text("🔐 Админ-панель:", reply_markup=InlineKeyboardMarkup(keyboard))
-        elif query.data == "admin_orders":
-            await admin_orders(update, context)
-        elif query.data == "admin_products":
-            await admin_products(update, context)
-        elif query.data == "admin_stats":
-            await admin_stats(update, context)
-        elif query.data.startswith("admin_confirm_"):
-            await admin_confirm_order(update, context)
-        return
+@callback_router.route("stats_{period}")
+async def show_period_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE, period):
+    """Статистика за выбранный период (day, week, month)"""
+    stats = await async_db.get_statistics(period=period)
+    await show_statistics(update, context, stats)
 
-    # Обычные callback
-    if query.data == "main_menu":
-        await show_main_menu(update, context)
-    elif query.data == "check_subscription":
-        await check_subscription(update, context)
-    elif query.data == "show_categories":
-        await show_categories(update, context)
-    elif query.data == "feedback":
-        await feedback(update, context)
-    elif query.data.startswith("category_list_"):
-        await show_categories(update, context)
-    elif query.data.startswith("category_"):
-        # Получаем ID категории и показываем её содержимое
-        category_id = int(query.data.split('_')[1])
-        await show_categories(update, context)
-    elif query.data.startswith("product_"):
-        await show_product(update, context)
-    elif query.data.startswith("buy_"):
-        await process_buy(update, context)
-    elif query.data.startswith("confirm_"):
-        await confirm_order(update, context)
-    elif query.data.startswith("paid_"):
-        await paid_order(update, context)
-    elif query.data == "profile":
-        await profile(update, context)
-    elif query.data == "language":
-        await show_language_menu(update, context)
-    elif query.data == "orders":
-        await show_user_orders(update, context)
-    elif query.data == "show_language_menu":
-        await show_language_menu(update, context)
-    elif query.data.startswith("lang_"):
-        await change_language(update, context)
-    elif query.data == "show_statistics":
-        await show_statistics(update, context)
-    elif query.data.startswith("stats_"):
-        period = query.data.split("_")[1]
-        with Database() as db:
-            stats = db.get_statistics(period=period)
-        await show_statistics(update, context, stats)
-    elif query.data.startswith("complete_cart_"):
-        cart_id = int(query.data.split('_')[2])
-        with Database() as db:
-            cart = db.get_cart(cart_id)
-            if cart:
-                order_id = db.create_order_from_cart(cart_id)
-                await send_order_status_notification(context, order_id, 'created')
-                await query.edit_message_text(
-                    get_text('order_created', context.user_data.get('language', 'ru')).format(order_id=order_id),
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton(get_text('view_order_btn', context.user_data.get('language', 'ru')), 
-                        callback_data=f"view_order_{order_id}")
-                    ]])
-                )
-    elif query.data.startswith("cancel_cart_"):
-        cart_id = int(query.data.split('_')[2])
-        with Database() as db:
-            db.delete_cart(cart_id)
+@callback_router.route("complete_cart_{cart_id:int}")
+async def complete_cart(update: Update, context: ContextTypes.DEFAULT_TYPE, cart_id):
+    """Оформляет заказ из брошенной корзины"""
+    query = update.callback_query
+    order_id = await async_db.run(
+        lambda db: db.create_order_from_cart(cart_id) if db.get_cart(cart_id) else None
+    )
+    if order_id:
+        await send_order_status_notification(context, order_id, 'created')
         await query.edit_message_text(
-            get_text('cart_cancelled', context.user_data.get('language', 'ru')),
+            get_text('order_created', context.user_data.get('language', 'ru')).format(order_id=order_id),
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton(get_text('back_to_menu_btn', context.user_data.get('language', 'ru')), 
-                callback_data="main_menu")
+                InlineKeyboardButton(get_text('view_order_btn', context.user_data.get('language', 'ru')), 
+                callback_data=f"view_order_{order_id}")
             ]])
         )
-    elif query.data.startswith("status_"):
-        await update_order_status(update, context)
+
+@callback_router.route("cancel_cart_{cart_id:int}")
+async def cancel_cart(update: Update, context: ContextTypes.DEFAULT_TYPE, cart_id):
+    """Удаляет брошенную корзину"""
+    query = update.callback_query
+    await async_db.delete_cart(cart_id)
+    await query.edit_message_text(
+        get_text('cart_cancelled', context.user_data.get('language', 'ru')),
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton(get_text('back_to_menu_btn', context.user_data.get('language', 'ru')), 
+            callback_data="main_menu")
+        ]])
+    )
 
 async def setup_commands(application: Application):
     try:
@@ -837,31 +878,16 @@ async def forward_channel_post(update: Update, context: ContextTypes.DEFAULT_TYP
         # Проверяем, что сообщение из нашего канала
         if update.channel_post and update.channel_post.chat.username == CHANNEL_USERNAME[1:]:
             logger.info("Получено новое сообщение из канала")
-            
-            # Получаем всех пользователей
-            with Database() as db:
-                users = db.get_all_users()
-            
-            # Счетчики для статистики
-            successful_sends = 0
-            failed_sends = 0
-            
-            # Пересылаем сообщение каждому пользователю
-            for user in users:
-                try:
-                    await context.bot.forward_message(
-                        chat_id=user['telegram_id'],
-                        from_chat_id=update.channel_post.chat_id,
-                        message_id=update.channel_post.message_id
-                    )
-                    successful_sends += 1
-                    await asyncio.sleep(0.1)  # Небольшая задержка между отправками
-                except Exception as e:
-                    logger.error(f"Ошибка при пересылке сообщения пользователю {user['telegram_id']}: {str(e)}")
-                    failed_sends += 1
-            
-            logger.info(f"Рассылка завершена. Успешно: {successful_sends}, Ошибок: {failed_sends}")
-            
+
+            # Рассылка идет в фоне с ограничением частоты, обработчик не ждет ее окончания
+            broadcast_id = await broadcast_manager.start(
+                context.application,
+                update.channel_post.chat_id,
+                update.channel_post.message_id
+            )
+            if broadcast_id:
+                logger.info(f"Запущена рассылка {broadcast_id}")
+
     except Exception as e:
         logger.error(f"Ошибка при обработке сообщения из канала: {str(e)}")
 
@@ -870,22 +896,24 @@ async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     user = update.effective_user
     return user.username in ADMIN_USERNAMES
 
+@callback_router.route("show_statistics")
 async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE, stats=None):
     """Показывает статистику магазина"""
     if not await is_admin(update, context):
         return
     
     if stats is None:
-        with Database() as db:
-            stats = db.get_statistics()
+        stats = await async_db.get_statistics()
+    summary = await dashboard_cache.get()
     
     message = (
         "📊 *Статистика магазина*\n\n"
         f"📦 Всего заказов: {stats['total_orders']}\n"
         f"✅ Выполнено заказов: {stats['completed_orders']}\n"
-        f"💰 Общая сумма продаж: {stats['total_sales']}₽\n\n"
-        f"👥 Всего пользователей: {stats['total_users']}\n"
-        f"🆕 Новых за 24 часа: {stats['new_users_24h']}\n\n"
+        f"💰 Общая сумма продаж: {stats['total_sales']}₽\n"
+        f"⏳ Ожидают обработки: {summary['pending_orders']}\n\n"
+        f"👥 Всего пользователей: {summary['total_users']}\n"
+        f"🆕 Новых за 24 часа: {summary['new_users_24h']}\n\n"
         f"📈 Топ товаров (за неделю):\n"
     )
     
@@ -894,7 +922,7 @@ async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE, st
     
     message += "\n📊 График продаж за неделю:\n"
     for day in stats['sales_by_day']:
-        bar_length = int(day['sales'] / stats['max_daily_sales'] * 20)
+        bar_length = int(day['sales'] / stats['max_daily_sales'] * 20) if stats['max_daily_sales'] else 0
         message += f"{day['date']}: {'█' * bar_length} ({day['sales']}₽)\n"
     
     keyboard = [
@@ -946,12 +974,13 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode=ParseMode.MARKDOWN
         )
 
+@callback_router.route("language")
+@callback_router.route("show_language_menu")
 async def show_language_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает меню выбора языка"""
     user = update.effective_user
     
-    with Database() as db:
-        current_language = db.get_user_language(user.id)
+    current_language = await async_db.get_user_language(user.id)
     
     keyboard = []
     for code, name in LANGUAGES.items():
@@ -974,27 +1003,25 @@ async def show_language_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
-async def change_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_router.route("lang_{lang}")
+async def change_language(update: Update, context: ContextTypes.DEFAULT_TYPE, lang):
     """Обработка смены языка"""
     query = update.callback_query
     if query:
-        lang = query.data.split('_')[1]
         user_id = update.effective_user.id
         
-        with Database() as db:
-            if db.update_user_language(user_id, lang):
-                await query.answer(get_text('language_changed', lang))
-                await profile(update, context)
-            else:
-                await query.answer(get_text('error', lang), show_alert=True)
+        if await async_db.update_user_language(user_id, lang):
+            await query.answer(get_text('language_changed', lang))
+            await profile(update, context)
+        else:
+            await query.answer(get_text('error', lang), show_alert=True)
 
 async def send_abandoned_cart_notification(context: ContextTypes.DEFAULT_TYPE):
     """Отправляет уведомления о брошенных корзинах"""
-    with Database() as db:
-        abandoned_carts = db.get_abandoned_carts()
+    abandoned_carts = await async_db.get_abandoned_carts()
         
     for cart in abandoned_carts:
-        user_lang = db.get_user_language(cart['user_id'])
+        user_lang = await async_db.get_user_language(cart['user_id'])
         message = get_text('abandoned_cart', user_lang).format(
             product_name=cart['product_name'],
             price=cart['price']
@@ -1013,31 +1040,32 @@ async def send_abandoned_cart_notification(context: ContextTypes.DEFAULT_TYPE):
                 parse_mode=ParseMode.MARKDOWN
             )
         except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления о брошенной корзине: {str(e)}")
+            if not await record_delivery_error(cart['user_id'], e):
+                logger.error(f"Ошибка при отправке уведомления о брошенной корзине: {str(e)}")
 
 async def send_order_status_notification(context: ContextTypes.DEFAULT_TYPE, order_id: int, new_status: str):
     """Отправляет уведомление об изменении статуса заказа"""
-    with Database() as db:
-        order = db.get_order(order_id)
-        if not order:
-            return
-        
-        user_lang = db.get_user_language(order['user_id'])
-        message = get_text(f'order_status_{new_status}', user_lang).format(
-            order_id=order['id'],
-            product_name=order['product_name']
+    order = await async_db.get_order(order_id)
+    if not order:
+        return
+    
+    user_lang = await async_db.get_user_language(order['user_id'])
+    message = get_text(f'order_status_{new_status}', user_lang).format(
+        order_id=order['id'],
+        product_name=order['product_name']
+    )
+    
+    keyboard = [[InlineKeyboardButton(get_text('view_order_btn', user_lang), callback_data=f"view_order_{order['id']}")]]
+    
+    try:
+        await context.bot.send_message(
+            chat_id=order['user_id'],
+            text=message,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
         )
-        
-        keyboard = [[InlineKeyboardButton(get_text('view_order_btn', user_lang), callback_data=f"view_order_{order['id']}")]]
-        
-        try:
-            await context.bot.send_message(
-                chat_id=order['user_id'],
-                text=message,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode=ParseMode.MARKDOWN
-            )
-        except Exception as e:
+    except Exception as e:
+        if not await record_delivery_error(order['user_id'], e):
             logger.error(f"Ошибка при отправке уведомления о статусе заказа: {str(e)}")
 
 def setup_notifications(application: Application):
@@ -1047,34 +1075,27 @@ def setup_notifications(application: Application):
     # Проверка брошенных корзин каждые 6 часов
     job_queue.run_repeating(send_abandoned_cart_notification, interval=21600)
 
-async def update_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_router.route("status_{order_id:int}_{new_status:rest}", guard=admin_callback_guard)
+async def update_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE, order_id, new_status):
     """Обновляет статус заказа и отправляет уведомление"""
     query = update.callback_query
-    await query.answer()
-    
-    if not await is_admin(update, context):
-        return
     
     try:
-        _, order_id, new_status = query.data.split('_')
-        order_id = int(order_id)
-        
-        with Database() as db:
-            success = db.update_order_status(order_id, new_status)
-            if success:
-                await send_order_status_notification(context, order_id, new_status)
-                await query.edit_message_text(
-                    get_text('status_updated', context.user_data.get('language', 'ru')).format(
-                        order_id=order_id,
-                        status=new_status
-                    ),
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton(
-                            get_text('back_btn', context.user_data.get('language', 'ru')), 
-                            callback_data="admin_panel"
-                        )
-                    ]])
-                )
+        success = await async_db.update_order_status(order_id, new_status)
+        if success:
+            await send_order_status_notification(context, order_id, new_status)
+            await query.edit_message_text(
+                get_text('status_updated', context.user_data.get('language', 'ru')).format(
+                    order_id=order_id,
+                    status=new_status
+                ),
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton(
+                        get_text('back_btn', context.user_data.get('language', 'ru')), 
+                        callback_data="admin_panel"
+                    )
+                ]])
+            )
     except Exception as e:
         logger.error(f"Ошибка при обновлении статуса заказа: {str(e)}")
         await query.edit_message_text(
@@ -1087,14 +1108,15 @@ async def update_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE
             ]])
         )
 
+@callback_router.route("orders")
 async def show_user_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает список заказов пользователя"""
     query = update.callback_query
     user_id = update.effective_user.id
     
-    with Database() as db:
-        user_data = db.get_user(user_id)
-        orders = db.get_user_orders(user_id)
+    user_data, orders = await async_db.run(
+        lambda db: (db.get_user(user_id), db.get_user_orders(user_id))
+    )
     
     if not orders:
         keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="profile")]]
@@ -1135,14 +1157,23 @@ async def show_user_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
 def main():
     try:
         logger.info("Запуск бота...")
+
+        # Применяем миграции схемы один раз при старте, а не при каждом подключении
+        run_migrations()
+
         application = Application.builder().token(BOT_TOKEN).build()
 
+        # Запоминаем chat id администраторов по любым их обновлениям
+        application.add_handler(TypeHandler(Update, admin_notifier.remember_update), group=-1)
+
         # Добавляем обработчики
         application.add_handler(CommandHandler("start", start))
         application.add_handler(CommandHandler("help", start))
         application.add_handler(CommandHandler("menu", show_main_menu))
         application.add_handler(CommandHandler("admin", admin_command))
-        application.add_handler(CallbackQueryHandler(handle_callback))
+        application.add_handler(CallbackQueryHandler(callback_router.dispatch))
+        # Подписки и отписки от канала обновляют кэш подписки (бот должен быть админом канала)
+        application.add_handler(ChatMemberHandler(subscription_cache.handle_chat_member, ChatMemberHandler.CHAT_MEMBER))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
         
         # Добавляем обработчик сообщений из канала
@@ -1153,9 +1184,25 @@ def main():
         
         # Настраиваем команды и описание бота
         application.job_queue.run_once(lambda ctx: setup_commands(application), when=1)
+
+        # Продолжаем рассылки, прерванные перезапуском
+        application.job_queue.run_once(lambda ctx: broadcast_manager.resume(application), when=5)
         
         # Настраиваем периодические задачи для уведомлений
         setup_notifications(application)
+
+        # Периодическая синхронизация каталога и остатков с МойСклад
+        setup_catalog_sync(application)
+
+        # Дневные итоги для статистики магазина
+        setup_stats_rollup(application)
+
+        # Прием вебхуков МойСклад об изменении товаров и остатков
+        if MOYSKLAD_WEBHOOK_PORT:
+            try:
+                start_webhook_server(MoySkladWebhookProcessor())
+            except ValueError as e:
+                logger.error(str(e))
         
         logger.info("Бот успешно настроен и запускается...")
         
@@ -1168,13 +1215,15 @@ def main():
                     listen="0.0.0.0",
                     port=port,
                     webhook_url=webhook_url,
+                    allowed_updates=Update.ALL_TYPES,
                 )
             else:
                 logger.warning("Webhook URL not set. Running with polling.")
-                application.run_polling()
+                application.run_polling(allowed_updates=Update.ALL_TYPES)
         else:
             # Запуск через polling для локальной разработки
-            application.run_polling()
+            # chat_member по умолчанию не присылается, поэтому запрашиваем все типы обновлений
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
     except Exception as e:
         logger.error(f"Критическая ошибка при запуске бота: {str(e)}")
 
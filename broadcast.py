@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import time
+from telegram import Bot
+from telegram.error import RetryAfter, TimedOut, NetworkError, Forbidden, BadRequest
+from telegram.ext import Application
+from config import (
+    BROADCAST_RATE, BROADCAST_PER_CHAT_INTERVAL, BROADCAST_CONCURRENCY,
+    BROADCAST_BATCH_SIZE, BROADCAST_MAX_RETRIES
+)
+from database import async_db
+
+logger = logging.getLogger(__name__)
+
+class AsyncRateLimiter:
+    """
+    Ограничитель частоты отправки сообщений в Telegram.
+
+    Общий для всего бота token bucket на rate сообщений в секунду плюс
+    минимальный интервал между сообщениями в один чат. При RetryAfter
+    все отправки приостанавливаются на указанное время, а частота
+    снижается и затем постепенно возвращается к исходной.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, per_chat_interval: float = BROADCAST_PER_CHAT_INTERVAL):
+        self.max_rate = rate
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._chat_last_sent = {}
+        self._successes = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, chat_id):
+        """Ждет, пока можно будет отправить сообщение в chat_id"""
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                wait = max(
+                    self._paused_until - now,
+                    self._chat_last_sent.get(chat_id, 0.0) + self.per_chat_interval - now,
+                )
+                if wait <= 0:
+                    # Не даем накопиться больше секунды запаса, чтобы не было всплесков
+                    self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._chat_last_sent[chat_id] = now
+                        self._prune_chats(now)
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def _prune_chats(self, now):
+        if len(self._chat_last_sent) > 10000:
+            threshold = now - self.per_chat_interval
+            self._chat_last_sent = {chat: sent for chat, sent in self._chat_last_sent.items() if sent > threshold}
+
+    def retry_after(self, seconds: float):
+        """Telegram попросил подождать: пауза для всех отправок и снижение частоты"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self.rate = max(1.0, self.rate * 0.7)
+        self._successes = 0
+        logger.warning(f"Telegram ограничил частоту: пауза {seconds} с, частота {self.rate:.1f} сообщ./с")
+
+    def success(self):
+        """Успешная отправка: после серии успехов частота возвращается к исходной"""
+        self._successes += 1
+        if self.rate < self.max_rate and self._successes >= 100:
+            self.rate = min(self.max_rate, self.rate * 1.2)
+            self._successes = 0
+
+# Общий ограничитель для всех рассылок и уведомлений бота
+rate_limiter = AsyncRateLimiter()
+
+# Ответы Telegram, после которых писать пользователю бесполезно
+DEACTIVATED_ERRORS = ('user is deactivated', 'chat not found')
+
+def classify_delivery_error(error):
+    """
+    Статус доставки по ошибке Telegram
+
+    Returns:
+        str: 'blocked', 'deactivated' или None, если ошибка не связана с получателем
+    """
+    message = str(error).lower()
+    if isinstance(error, (Forbidden, BadRequest)) and any(text in message for text in DEACTIVATED_ERRORS):
+        return 'deactivated'
+    if isinstance(error, Forbidden):
+        # Бот заблокирован или не может начать диалог с пользователем
+        return 'blocked'
+    return None
+
+async def record_delivery_error(telegram_id, error):
+    """
+    Сохраняет статус пользователя, если ошибка отправки означает, что он недоступен
+
+    Returns:
+        bool: True, если пользователь помечен недоступным
+    """
+    status = classify_delivery_error(error)
+    if status is None or telegram_id is None:
+        return False
+    try:
+        await async_db.update_delivery_status(telegram_id, status, str(error))
+        logger.info(f"Пользователь {telegram_id} недоступен для сообщений ({status}): {error}")
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении статуса доставки пользователя {telegram_id}: {e}")
+    return True
+
+class BroadcastManager:
+    """
+    Фоновая рассылка постов канала всем пользователям.
+
+    Получатели читаются из базы порциями по BROADCAST_BATCH_SIZE (по возрастанию
+    users.id), внутри порции сообщения отправляются параллельно с учетом общего
+    ограничителя частоты. После каждой порции прогресс сохраняется в таблице
+    broadcasts, и после перезапуска бота рассылка продолжается с того же места.
+    Пользователи, заблокировавшие бота или удалившие аккаунт, помечаются
+    в users.delivery_status и в следующие рассылки не попадают.
+    """
+
+    def __init__(self, limiter: AsyncRateLimiter = rate_limiter,
+                 concurrency: int = BROADCAST_CONCURRENCY, batch_size: int = BROADCAST_BATCH_SIZE,
+                 max_retries: int = BROADCAST_MAX_RETRIES):
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._tasks = {}
+
+    async def start(self, application: Application, from_chat_id: int, message_id: int):
+        """
+        Создает рассылку и запускает ее в фоне
+
+        Returns:
+            int: ID рассылки или None, если это сообщение уже рассылается
+        """
+        broadcast_id = await async_db.run(lambda db: db.create_broadcast(from_chat_id, message_id))
+        if broadcast_id is None:
+            logger.info(f"Сообщение {message_id} уже рассылается, повторная рассылка не создана")
+            return None
+        self._spawn(application, {
+            'id': broadcast_id, 'from_chat_id': from_chat_id, 'message_id': message_id,
+            'last_user_id': 0, 'sent': 0, 'failed': 0,
+        })
+        return broadcast_id
+
+    async def resume(self, application: Application):
+        """Продолжает рассылки, прерванные перезапуском"""
+        for broadcast in await async_db.get_unfinished_broadcasts():
+            if broadcast['id'] not in self._tasks:
+                logger.info(f"Продолжаем рассылку {broadcast['id']} с пользователя {broadcast['last_user_id']}")
+                self._spawn(application, broadcast)
+
+    def _spawn(self, application, broadcast):
+        task = application.create_task(self._run(application.bot, broadcast))
+        self._tasks[broadcast['id']] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast['id'], None))
+
+    async def _send(self, bot: Bot, broadcast, chat_id) -> bool:
+        """Пересылает пост одному получателю; возвращает True при успехе"""
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                await bot.forward_message(
+                    chat_id=chat_id,
+                    from_chat_id=broadcast['from_chat_id'],
+                    message_id=broadcast['message_id']
+                )
+                self.limiter.success()
+                return True
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                self.limiter.retry_after(retry_after)
+            except (Forbidden, BadRequest) as e:
+                # BadRequest - подкласс NetworkError, поэтому обрабатывается раньше: повтор не поможет
+                if not await record_delivery_error(chat_id, e):
+                    logger.warning(f"Ошибка при пересылке сообщения пользователю {chat_id}: {e}")
+                return False
+            except (TimedOut, NetworkError) as e:
+                if attempt == self.max_retries:
+                    logger.warning(f"Не удалось переслать сообщение пользователю {chat_id}: {e}")
+                    return False
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                logger.warning(f"Ошибка при пересылке сообщения пользователю {chat_id}: {e}")
+                return False
+        return False
+
+    async def _run(self, bot: Bot, broadcast):
+        broadcast_id = broadcast['id']
+        last_user_id, sent, failed = broadcast['last_user_id'], broadcast['sent'], broadcast['failed']
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+
+        async def send(recipient):
+            async with semaphore:
+                return await self._send(bot, broadcast, recipient['telegram_id'])
+
+        try:
+            while True:
+                recipients = await async_db.get_broadcast_recipients(last_user_id, self.batch_size)
+                if not recipients:
+                    break
+                results = await asyncio.gather(*(send(recipient) for recipient in recipients))
+                sent += sum(results)
+                failed += len(results) - sum(results)
+                last_user_id = recipients[-1]['id']
+                await async_db.update_broadcast_progress(broadcast_id, last_user_id, sent, failed)
+
+            await async_db.update_broadcast_progress(broadcast_id, last_user_id, sent, failed, 'done')
+            skipped = (await async_db.get_broadcast(broadcast_id))['skipped']
+            total = sent + failed + skipped
+            logger.info(
+                f"Рассылка {broadcast_id} завершена за {time.monotonic() - started:.0f} с. "
+                f"Успешно: {sent}, Ошибок: {failed}, пропущено недоступных: {skipped} "
+                f"(сэкономлено {skipped / total if total else 0:.0%} отправок)"
+            )
+        except asyncio.CancelledError:
+            # Бот останавливается: прогресс уже сохранен, рассылка продолжится после запуска
+            logger.info(f"Рассылка {broadcast_id} прервана на пользователе {last_user_id}")
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка рассылки {broadcast_id}: {e}")
+            await async_db.update_broadcast_progress(broadcast_id, last_user_id, sent, failed, 'failed')
+
+broadcast_manager = BroadcastManager()
@@ -0,0 +1,117 @@
+import logging
+import secrets
+import string
+import time
+from collections import OrderedDict
+from config import CALLBACK_STATE_TTL, CALLBACK_STATE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram на callback_data, байт
+MAX_CALLBACK_DATA = 64
+
+# Компактная форма: ~<код действия>.<значение>.<значение>...
+# Если строка длиннее MAX_CALLBACK_DATA - ~$<токен>, а значения хранятся на сервере
+PREFIX = '~'
+SPILL = '$'
+SEPARATOR = '.'
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+DIGITS = {char: index for index, char in enumerate(ALPHABET)}
+
+def encode_int(value: int) -> str:
+    """Целое в base62 (отрицательные - с '-' впереди)"""
+    if value < 0:
+        return '-' + encode_int(-value)
+    chars = []
+    while True:
+        value, digit = divmod(value, BASE)
+        chars.append(ALPHABET[digit])
+        if not value:
+            return ''.join(reversed(chars))
+
+def decode_int(text: str) -> int:
+    """Обратное к encode_int; ValueError для некорректной строки"""
+    if text.startswith('-'):
+        return -decode_int(text[1:])
+    if not text:
+        raise ValueError("пустое число")
+    value = 0
+    for char in text:
+        digit = DIGITS.get(char)
+        if digit is None:
+            raise ValueError(f"не base62: {text!r}")
+        value = value * BASE + digit
+    return value
+
+class CallbackStateStore:
+    """
+    Короткоживущее хранилище значений кнопок, не помещающихся в callback_data.
+
+    Хранится в памяти процесса: после перезапуска бота или по истечении ttl
+    такие кнопки перестают работать, и пользователь открывает экран заново.
+    Самые старые записи вытесняются при превышении max_entries.
+    """
+
+    def __init__(self, ttl: float = CALLBACK_STATE_TTL, max_entries: int = CALLBACK_STATE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def put(self, value) -> str:
+        """Сохраняет значение и возвращает токен для callback_data"""
+        now = time.monotonic()
+        self._prune(now)
+        token = encode_int(secrets.randbits(48))
+        self._entries[token] = (now + self.ttl, value)
+        return token
+
+    def get(self, token):
+        """Значение по токену или None, если оно истекло или неизвестно"""
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def _prune(self, now):
+        # Записи упорядочены по времени добавления, истекшие - в начале
+        while self._entries:
+            token, (expires, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) < self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+callback_state_store = CallbackStateStore()
+
+def pack(code: str, values, store: CallbackStateStore = callback_state_store) -> str:
+    """
+    Упаковывает код действия и уже закодированные значения в callback_data
+
+    Returns:
+        str: '~код.знач...' или '~$токен', если не помещается в 64 байта
+    """
+    data = PREFIX + SEPARATOR.join([code, *values])
+    if len(data.encode('utf-8')) <= MAX_CALLBACK_DATA:
+        return data
+    return PREFIX + SPILL + store.put((code, tuple(values)))
+
+def unpack(data: str, store: CallbackStateStore = callback_state_store):
+    """
+    Разбирает компактную callback_data
+
+    Returns:
+        tuple: (код действия, список значений) или None, если состояние истекло
+    """
+    body = data[len(PREFIX):]
+    if body.startswith(SPILL):
+        state = store.get(body[len(SPILL):])
+        if state is None:
+            return None
+        code, values = state
+        return code, list(values)
+    code, *values = body.split(SEPARATOR)
+    return code, values
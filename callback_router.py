@@ -0,0 +1,304 @@
+import logging
+import re
+from telegram import Update
+from telegram.ext import ContextTypes
+import callback_codec
+
+logger = logging.getLogger(__name__)
+
+PARAM_RE = re.compile(r'^\{(\w+)(?::(\w+))?\}$')
+# '_' внутри {...} - часть имени параметра, а не разделитель
+SEPARATOR_RE = re.compile(r'_(?![^{]*\})')
+
+def parse_int(value: str) -> int:
+    """Неотрицательное целое без знака и пробелов (int() принял бы и ' -5')"""
+    if not value.isdigit():
+        raise ValueError(f"не число: {value!r}")
+    return int(value)
+
+def parse_str(value: str) -> str:
+    if not value:
+        raise ValueError("пустое значение")
+    return value
+
+# Типы параметров шаблона: {name:int}, {name} / {name:str} - один сегмент,
+# {name:rest} - весь остаток строки вместе с '_' (только последним)
+CONVERTERS = {'int': parse_int, 'str': parse_str, 'rest': parse_str}
+
+class Segment:
+    """Сегмент шаблона между '_': литерал или типизированный параметр"""
+
+    def __init__(self, kind, value):
+        self.kind = kind    # 'literal', 'int', 'str' или 'rest'
+        self.value = value  # текст литерала или имя параметра
+
+    def accepts(self, other):
+        """Может ли одна и та же строка подойти под оба сегмента"""
+        if self.kind == 'literal' and other.kind == 'literal':
+            return self.value == other.value
+        if self.kind == 'literal':
+            return other.accepts(self)
+        if other.kind == 'literal':
+            return other.value.isdigit() if self.kind == 'int' else bool(other.value)
+        return True
+
+class CallbackRoute:
+    """Скомпилированный шаблон callback_data и его обработчик"""
+
+    def __init__(self, pattern, handler, guard=None, code=None):
+        self.pattern = pattern
+        self.handler = handler
+        self.guard = guard
+        self.code = code
+        self.segments = []
+        for part in SEPARATOR_RE.split(pattern):
+            match = PARAM_RE.match(part)
+            if not match:
+                self.segments.append(Segment('literal', part))
+                continue
+            name, kind = match.group(1), match.group(2) or 'str'
+            if kind not in CONVERTERS:
+                raise ValueError(f"Неизвестный тип параметра {kind!r} в шаблоне {pattern!r}")
+            self.segments.append(Segment(kind, name))
+
+        kinds = [segment.kind for segment in self.segments]
+        if 'rest' in kinds[:-1]:
+            raise ValueError(f"Параметр rest может быть только последним: {pattern!r}")
+        # Литеральный префикс - путь в дереве, остальное - аргументы
+        literals = 0
+        while literals < len(kinds) and kinds[literals] == 'literal':
+            literals += 1
+        self.prefix = tuple(segment.value for segment in self.segments[:literals])
+        self.params = self.segments[literals:]
+        if any(segment.kind == 'literal' for segment in self.params):
+            raise ValueError(f"Литералы после параметров не поддерживаются: {pattern!r}")
+        self.greedy = bool(kinds) and kinds[-1] == 'rest'
+        self._converters = [(segment.value, CONVERTERS[segment.kind]) for segment in self.params]
+
+    def parse(self, parts):
+        """
+        Разбирает аргументы из сегментов после литерального префикса
+
+        Returns:
+            dict: Аргументы для обработчика или None, если строка не подходит
+        """
+        if self.greedy:
+            if len(parts) < len(self.params):
+                return None
+            parts = parts[:len(self.params) - 1] + ['_'.join(parts[len(self.params) - 1:])]
+        elif len(parts) != len(self.params):
+            return None
+        try:
+            return {name: convert(part) for (name, convert), part in zip(self._converters, parts)}
+        except ValueError:
+            return None
+
+    def encode(self, args, back=()):
+        """Значения для компактной формы: параметры по порядку, затем стек возврата"""
+        if len(args) != len(self.params):
+            raise ValueError(f"{self.pattern!r}: ожидалось {len(self.params)} аргументов, передано {len(args)}")
+        values = []
+        for segment, value in zip(self.params, args):
+            if segment.kind == 'int':
+                values.append(callback_codec.encode_int(value))
+            else:
+                value = str(value)
+                if not value or callback_codec.SEPARATOR in value:
+                    raise ValueError(f"{self.pattern!r}: недопустимое значение {segment.value}={value!r}")
+                values.append(value)
+        values.extend(callback_codec.encode_int(value) for value in back)
+        return values
+
+    def decode(self, values):
+        """
+        Аргументы из значений компактной формы
+
+        Returns:
+            dict: Аргументы для обработчика (с 'back', если передан стек) или None
+        """
+        count = len(self.params)
+        if len(values) < count:
+            return None
+        try:
+            args = {
+                segment.value: callback_codec.decode_int(value) if segment.kind == 'int' else parse_str(value)
+                for segment, value in zip(self.params, values)
+            }
+            if len(values) > count:
+                args['back'] = tuple(callback_codec.decode_int(value) for value in values[count:])
+        except ValueError:
+            return None
+        return args
+
+    def overlaps(self, other):
+        """Есть ли callback_data, подходящая под оба шаблона"""
+        a, b = self.segments, other.segments
+        for i in range(max(len(a), len(b))):
+            if i >= len(a) or i >= len(b):
+                return False
+            if a[i].kind == 'rest' or b[i].kind == 'rest':
+                # Остаток совпадает с чем угодно, если предыдущие сегменты совместимы
+                return a[i].accepts(b[i])
+            if not a[i].accepts(b[i]):
+                return False
+        return True
+
+class RouteNode:
+    """Узел дерева литеральных префиксов"""
+
+    def __init__(self):
+        self.children = {}
+        self.routes = {}   # количество аргументов -> маршрут
+        self.greedy = []   # маршруты с параметром rest
+
+class CallbackRouter:
+    """
+    Таблица маршрутов для callback-кнопок.
+
+    Шаблон вида 'catpage_{category_id:int}_{direction}_{anchor_id:int}' делится
+    по '_' на литеральный префикс и типизированные параметры. Префиксы хранятся
+    в дереве по сегментам (шаблоны без параметров - в отдельном словаре),
+    так что поиск обработчика занимает несколько обращений к словарям
+    независимо от количества маршрутов. Разобранные аргументы передаются
+    обработчику именованными параметрами.
+
+    Маршрут с кодом (code='p') принимает и компактную форму callback_data
+    из callback_codec, которую строит pack(): '~p.1fL' вместо 'product_4821'.
+    За аргументами в ней может идти стек возврата - целые числа, которые
+    обработчик получает в параметре back и передает дальше в кнопки
+    следующего экрана, чтобы вернуть пользователя туда, откуда он пришел
+    (например, на ту же страницу категории). Если строка не помещается
+    в 64 байта, значения сохраняются на сервере на CALLBACK_STATE_TTL.
+
+    Шаблоны, под которые может подойти одна и та же строка, отклоняются
+    при регистрации (ValueError), поэтому порядок регистрации не важен.
+    """
+
+    def __init__(self):
+        self._root = RouteNode()
+        self._exact = {}  # маршруты без параметров: callback_data -> маршрут
+        self._codes = {}  # код компактной формы -> маршрут
+        self.routes = []
+
+    def add(self, pattern, handler, guard=None, code=None):
+        """
+        Регистрирует обработчик для шаблона callback_data
+
+        Args:
+            guard: async-функция (update, context) -> bool, проверка доступа.
+                   При False обработчик не вызывается, ответ на запрос
+                   отправляет сама проверка.
+            code (str): Код действия для компактной формы (буквы и цифры)
+        """
+        route = CallbackRoute(pattern, handler, guard, code)
+        for existing in self.routes:
+            if route.overlaps(existing):
+                raise ValueError(f"Шаблон {pattern!r} пересекается с {existing.pattern!r}")
+        if code is not None:
+            if not code.isalnum():
+                raise ValueError(f"Код действия должен состоять из букв и цифр: {code!r}")
+            if code in self._codes:
+                raise ValueError(f"Код {code!r} уже занят шаблоном {self._codes[code].pattern!r}")
+            if route.greedy:
+                raise ValueError(f"Параметр rest недоступен в компактной форме: {pattern!r}")
+            self._codes[code] = route
+
+        if not route.params:
+            self._exact[pattern] = route
+            self.routes.append(route)
+            return route
+
+        node = self._root
+        for literal in route.prefix:
+            node = node.children.setdefault(literal, RouteNode())
+        if route.greedy:
+            node.greedy.append(route)
+        else:
+            node.routes[len(route.params)] = route
+        self.routes.append(route)
+        return route
+
+    def route(self, pattern, guard=None, code=None):
+        """Декоратор: регистрирует функцию как обработчик шаблона"""
+        def decorator(handler):
+            self.add(pattern, handler, guard, code)
+            return handler
+        return decorator
+
+    def pack(self, code, *args, back=()):
+        """
+        Компактная callback_data для маршрута с кодом code
+
+        Args:
+            args: Аргументы в порядке параметров шаблона
+            back: Стек возврата (целые числа), попадет в параметр back обработчика
+        """
+        return callback_codec.pack(code, self._codes[code].encode(args, back))
+
+    def match(self, data):
+        """
+        Ищет маршрут для callback_data
+
+        Returns:
+            tuple: (маршрут, аргументы) или (None, None)
+        """
+        route = self._exact.get(data)
+        if route is not None:
+            return route, {}
+        if data.startswith(callback_codec.PREFIX):
+            return self._match_compact(data)
+
+        parts = data.split('_')
+        node = self._root
+        path = [node]
+        for part in parts:
+            node = node.children.get(part)
+            if node is None:
+                break
+            path.append(node)
+
+        # Сначала самый длинный литеральный префикс
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            rest = parts[depth:]
+            route = node.routes.get(len(rest))
+            if route is not None:
+                args = route.parse(rest)
+                if args is not None:
+                    return route, args
+            for route in node.greedy:
+                args = route.parse(rest)
+                if args is not None:
+                    return route, args
+        return None, None
+
+    def _match_compact(self, data):
+        unpacked = callback_codec.unpack(data)
+        if unpacked is None:
+            return None, None
+        code, values = unpacked
+        route = self._codes.get(code)
+        args = route.decode(values) if route else None
+        if args is None:
+            return None, None
+        return route, args
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик CallbackQueryHandler: отвечает на запрос и вызывает нужный обработчик"""
+        query = update.callback_query
+        route, args = self.match(query.data or '')
+        if route is None:
+            if (query.data or '').startswith(callback_codec.PREFIX):
+                # Состояние кнопки истекло или бот перезапускался
+                await query.answer("Кнопка устарела, откройте раздел заново", show_alert=True)
+                return
+            logger.warning(f"Нет обработчика для callback {query.data!r}")
+            await query.answer()
+            return
+        if route.guard and not await route.guard(update, context):
+            return
+        await query.answer()
+        await route.handler(update, context, **args)
+
+# Маршруты кнопок бота
+callback_router = CallbackRouter()
@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import CATALOG_CACHE_TTL, CATALOG_CACHE_MAX_ENTRIES, CATALOG_VERSION_CHECK_INTERVAL
+from database import async_db, add_catalog_listener
+
+logger = logging.getLogger(__name__)
+
+class CatalogCache:
+    """
+    Read-through кэш каталога (категории, списки товаров, карточки товаров).
+
+    Записи живут не дольше ttl секунд, хранится не больше max_entries записей:
+    при переполнении вытесняется та, к которой дольше всего не обращались. Кроме того, раз в version_check_interval
+    секунд сверяется версия каталога в базе: импорт товаров и админские изменения
+    увеличивают ее, и при расхождении кэш полностью сбрасывается. Изменения,
+    сделанные в этом же процессе, сбрасывают кэш сразу.
+    """
+
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL,
+                 version_check_interval: float = CATALOG_VERSION_CHECK_INTERVAL,
+                 max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.max_entries = max_entries
+        # Порядок ключей - порядок обращений: первым идет самый давно использованный
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        # Увеличивается при каждом сбросе, чтобы не сохранить данные, загруженные до сброса
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+        add_catalog_listener(self.invalidate)
+
+    def invalidate(self):
+        """Полностью сбрасывает кэш"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._stats['invalidations'] += 1
+        logger.info("Кэш каталога сброшен")
+
+    def get_stats(self) -> dict:
+        """Возвращает счетчики попаданий и промахов"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / total if total else 0.0
+        stats['version'] = self._version
+        return stats
+
+    async def _check_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        try:
+            version = await async_db.get_catalog_version()
+        except Exception as e:
+            logger.error(f"Ошибка при проверке версии каталога: {e}")
+            return
+        if version != self._version:
+            if self._version is not None:
+                logger.info(f"Версия каталога изменилась: {self._version} -> {version}")
+                self.invalidate()
+            self._version = version
+
+    async def _get(self, key, loader):
+        await self._check_version()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[1]
+                del self._entries[key]
+            self._stats['misses'] += 1
+            generation = self._generation
+
+        value = await loader()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return value
+
+    async def get_category_tree(self):
+        """Дерево категорий (кэшируется)"""
+        return await self._get(('tree',), async_db.get_category_tree)
+
+    async def get_category_screen(self, category_id=None):
+        """Данные экрана категории: заголовок, родитель, подкатегории, товары (кэшируется)"""
+        return await self._get(('screen', category_id), lambda: async_db.get_category_screen(category_id))
+
+    async def get_products_page(self, category_id, after_id=None, before_id=None):
+        """Страница товаров категории (кэшируется)"""
+        return await self._get(
+            ('page', category_id, after_id, before_id),
+            lambda: async_db.get_products_page(category_id, after_id=after_id, before_id=before_id)
+        )
+
+    async def get_categories(self, parent_id=None):
+        """Дочерние категории (кэшируется)"""
+        return await self._get(('categories', parent_id), lambda: async_db.get_categories(parent_id))
+
+    async def get_category(self, category_id):
+        """Категория по ID (кэшируется)"""
+        return await self._get(('category', category_id), lambda: async_db.get_category(category_id))
+
+    async def get_products_by_category(self, category_id):
+        """Товары категории (кэшируется)"""
+        return await self._get(('products', category_id), lambda: async_db.get_products_by_category(category_id))
+
+    async def get_product(self, product_id):
+        """Карточка товара (кэшируется)"""
+        return await self._get(('product', product_id), lambda: async_db.get_product(product_id))
+
+catalog_cache = CatalogCache()
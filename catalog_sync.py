@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from telegram.ext import Application, ContextTypes
+from config import CATALOG_SYNC_INTERVAL, CATALOG_SYNC_JITTER
+from database import notify_catalog_listeners
+from import_products import import_products_to_db
+
+logger = logging.getLogger(__name__)
+
+class CatalogSyncJob:
+    """
+    Периодическая дельта-синхронизация каталога и остатков с МойСклад.
+
+    Импорт выполняется в отдельном потоке, чтобы не блокировать цикл событий
+    бота. Запуски не перекрываются: если предыдущий еще идет, очередной
+    пропускается (внутри процесса - по флагу выполнения, между процессами -
+    по блокировке MySQL в самом импорте). Итоги запусков пишутся в sync_runs,
+    последний результат доступен в last_summary.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-sync')
+        self._running = False
+        self.last_summary = None
+        self.failures = 0
+
+    async def __call__(self, context: ContextTypes.DEFAULT_TYPE):
+        if self._running:
+            logger.warning("Синхронизация каталога еще выполняется, запуск пропущен")
+            return
+        self._running = True
+        try:
+            loop = asyncio.get_running_loop()
+            summary = await loop.run_in_executor(self._executor, import_products_to_db)
+        except Exception as e:
+            # Например, база недоступна - импорт не успел начаться
+            self.failures += 1
+            logger.error(f"Ошибка при синхронизации каталога (подряд: {self.failures}): {e}")
+            return
+        finally:
+            self._running = False
+        if summary['status'] == 'skipped':
+            return
+
+        self.last_summary = summary
+        if summary['status'] == 'failed':
+            self.failures += 1
+            logger.error(f"Синхронизация каталога завершилась ошибкой (подряд: {self.failures})")
+            return
+        self.failures = 0
+
+        counters = summary['counters']
+        if counters['created'] or counters['updated'] or counters['stock_updated']:
+            # Кэш каталога этого процесса сбрасываем сразу, не дожидаясь проверки версии
+            notify_catalog_listeners()
+        logger.info(
+            f"Синхронизация каталога: {summary['duration']:.1f} с, товаров {counters['fetched']}, "
+            f"новых {counters['created']}, изменено {counters['updated']}, "
+            f"остатков {counters['stock_updated']}, ошибок {counters['errors']}"
+        )
+
+    def shutdown(self):
+        """Останавливает поток синхронизации"""
+        self._executor.shutdown(wait=True)
+
+catalog_sync_job = CatalogSyncJob()
+
+def setup_catalog_sync(application: Application):
+    """Добавляет периодическую синхронизацию каталога в job_queue (если CATALOG_SYNC_INTERVAL > 0)"""
+    if CATALOG_SYNC_INTERVAL <= 0:
+        logger.info("Периодическая синхронизация каталога выключена")
+        return
+    application.job_queue.run_repeating(
+        catalog_sync_job,
+        interval=CATALOG_SYNC_INTERVAL,
+        first=min(60, CATALOG_SYNC_INTERVAL),
+        name='catalog_sync',
+        # Случайный сдвиг, чтобы несколько экземпляров бота не обращались к МойСклад одновременно
+        job_kwargs={'jitter': CATALOG_SYNC_JITTER, 'max_instances': 1, 'coalesce': True}
+    )
+    logger.info(f"Синхронизация каталога каждые {CATALOG_SYNC_INTERVAL:.0f} с (разброс до {CATALOG_SYNC_JITTER:.0f} с)")
@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional
+
+class CategoryTree:
+    """
+    Дерево категорий, загруженное из таблицы categories (список смежности).
+
+    Строится одним запросом и отвечает на вопросы о детях, предках, пути
+    (хлебных крошках) и наличии товаров в поддереве без обращений к базе.
+    Узлы имеют ту же форму, что и строки categories: {'id', 'name', 'parent_id'}.
+    """
+
+    def __init__(self, rows: List[dict], product_counts: Optional[Dict[int, int]] = None):
+        self._nodes = {}
+        self._children = {None: []}
+        self._paths = {}
+        self._subtree_products = {}
+
+        for row in rows:
+            node = {'id': row['id'], 'name': row['name'], 'parent_id': row['parent_id']}
+            self._nodes[node['id']] = node
+            self._children.setdefault(node['id'], [])
+
+        for node in self._nodes.values():
+            parent_id = node['parent_id']
+            # Категории с несуществующим родителем считаем корневыми
+            if parent_id is not None and parent_id not in self._nodes:
+                parent_id = None
+            self._children[parent_id].append(node)
+
+        product_counts = product_counts or {}
+        self._product_counts = product_counts
+        # Обход от корня: путь и количество товаров в поддереве считаются один раз
+        order = []
+        stack = [(node, []) for node in reversed(self._children[None])]
+        while stack:
+            node, parent_path = stack.pop()
+            if node['id'] in self._paths:
+                continue  # Защита от циклов в данных
+            path = parent_path + [node]
+            self._paths[node['id']] = path
+            order.append(node)
+            for child in reversed(self._children[node['id']]):
+                stack.append((child, path))
+
+        for node in reversed(order):
+            total = product_counts.get(node['id'], 0)
+            for child in self._children[node['id']]:
+                total += self._subtree_products.get(child['id'], 0)
+            self._subtree_products[node['id']] = total
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, category_id):
+        return category_id in self._nodes
+
+    def get(self, category_id) -> Optional[dict]:
+        """Категория по ID"""
+        return self._nodes.get(category_id)
+
+    def children(self, parent_id=None) -> List[dict]:
+        """Дочерние категории (parent_id=None - корневые)"""
+        return list(self._children.get(parent_id, []))
+
+    def path(self, category_id) -> List[dict]:
+        """Путь от корня до категории включительно"""
+        return list(self._paths.get(category_id, []))
+
+    def ancestors(self, category_id) -> List[dict]:
+        """Родительские категории от корня, без самой категории"""
+        return self.path(category_id)[:-1]
+
+    def parent_id(self, category_id):
+        """ID родительской категории или None"""
+        node = self._nodes.get(category_id)
+        return node['parent_id'] if node else None
+
+    def has_products(self, category_id) -> bool:
+        """Есть ли товары непосредственно в категории"""
+        return self._product_counts.get(category_id, 0) > 0
+
+    def product_count_below(self, category_id) -> int:
+        """Количество товаров в категории и всех ее подкатегориях"""
+        return self._subtree_products.get(category_id, 0)
+
+    def has_products_below(self, category_id) -> bool:
+        """Есть ли товары в категории или ее подкатегориях"""
+        return self.product_count_below(category_id) > 0
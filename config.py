@@ -23,6 +23,23 @@ DB_CONFIG = {
     'port': int(os.getenv("DB_PORT", 3306))
 }
 
+# Настройки пула соединений с базой данных
+DB_POOL_NAME = os.getenv("DB_POOL_NAME", "puff_pool")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))  # mysql-connector допускает не более 32
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))  # Ожидание свободного соединения, сек.
+DB_RECONNECT_ATTEMPTS = int(os.getenv("DB_RECONNECT_ATTEMPTS", 3))
+DB_RECONNECT_DELAY = float(os.getenv("DB_RECONNECT_DELAY", 0.5))
+
+# Настройки кэша каталога
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", 300))  # Время жизни записи, сек.
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", 2000))  # Лимит записей, лишние вытесняются по LRU
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv("CATALOG_VERSION_CHECK_INTERVAL", 10))  # Проверка версии каталога, сек.
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", 20))  # Товаров на одной странице каталога
+
+# Сводка админ-панели (сбрасывается и при изменении заказов)
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", 30))  # Время жизни, сек.
+STATS_ROLLUP_INTERVAL = float(os.getenv("STATS_ROLLUP_INTERVAL", 3600))  # Как часто собирать дневные итоги статистики, сек.
+
 # Адреса магазинов
 SHOP_ADDRESSES = {
     1: os.getenv("SHOP_ADDRESS_1", "Дзержинского 16"),
@@ -31,10 +48,40 @@ SHOP_ADDRESSES = {
 
 # Список администраторов
 ADMIN_USERNAMES = os.getenv("ADMIN_USERNAMES", "BrabusGT,apoli1nariaa").split(",")
+SUBSCRIPTION_CACHE_TTL = float(os.getenv("SUBSCRIPTION_CACHE_TTL", 3600))  # Сколько доверять проверке подписки, сек.
+ADMIN_NOTIFY_TIMEOUT = float(os.getenv("ADMIN_NOTIFY_TIMEOUT", 10))  # Таймаут уведомления одному админу, сек.
+
+# Состояние кнопок, не помещающееся в 64 байта callback_data
+CALLBACK_STATE_TTL = float(os.getenv("CALLBACK_STATE_TTL", 3600))  # Сколько хранится на сервере, сек.
+CALLBACK_STATE_MAX_ENTRIES = int(os.getenv("CALLBACK_STATE_MAX_ENTRIES", 10000))  # Максимум записей в памяти
 
 # Настройки МойСклад
 MOYSKLAD_LOGIN = os.getenv("MOYSKLAD_LOGIN", "admin@nulia49121")  # Логин МойСклад
 MOYSKLAD_PASSWORD = os.getenv("MOYSKLAD_PASSWORD", "PUFFSMOKE163")  # Пароль МойСклад
+MOYSKLAD_API_URL = os.getenv("MOYSKLAD_API_URL", "https://api.moysklad.ru/api/remap/1.2")
+MOYSKLAD_PAGE_SIZE = int(os.getenv("MOYSKLAD_PAGE_SIZE", 1000))  # Максимум для entity/product
+MOYSKLAD_CONCURRENCY = int(os.getenv("MOYSKLAD_CONCURRENCY", 5))  # МойСклад: не более 5 параллельных запросов
+MOYSKLAD_RATE_LIMIT = int(os.getenv("MOYSKLAD_RATE_LIMIT", 45))  # МойСклад: не более 45 запросов...
+MOYSKLAD_RATE_PERIOD = float(os.getenv("MOYSKLAD_RATE_PERIOD", 3))  # ...за 3 секунды
+MOYSKLAD_MAX_RETRIES = int(os.getenv("MOYSKLAD_MAX_RETRIES", 5))
+MOYSKLAD_TIMEOUT = float(os.getenv("MOYSKLAD_TIMEOUT", 30))  # Таймаут запроса, сек.
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))  # Товаров в одном пакете записи
+IMPORT_PREFETCH_PAGES = int(os.getenv("IMPORT_PREFETCH_PAGES", 2))  # На сколько страниц загрузка может опережать запись
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", 10))  # Как часто писать прогресс импорта, сек.
+CATALOG_SYNC_INTERVAL = float(os.getenv("CATALOG_SYNC_INTERVAL", 900))  # Период синхронизации в боте, сек. (0 - выключено)
+CATALOG_SYNC_JITTER = float(os.getenv("CATALOG_SYNC_JITTER", 60))  # Случайный сдвиг запуска, сек.
+
+# Настройки рассылок
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 30))  # Сообщений в секунду на всего бота
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", 1))  # Минимальный интервал в один чат, сек.
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 20))  # Одновременных запросов к Telegram
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", 200))  # Получателей в порции (после порции прогресс сохраняется)
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", 3))  # Повторов отправки одному получателю
+
+# Настройки вебхуков МойСклад
+MOYSKLAD_WEBHOOK_PORT = int(os.getenv("MOYSKLAD_WEBHOOK_PORT", 0))  # Порт приема вебхуков (0 - выключено)
+MOYSKLAD_WEBHOOK_TOKEN = os.getenv("MOYSKLAD_WEBHOOK_TOKEN", "")  # Секрет в параметре token адреса вебхука (обязателен)
+MOYSKLAD_WEBHOOK_DEBOUNCE = float(os.getenv("MOYSKLAD_WEBHOOK_DEBOUNCE", 2))  # Сколько ждать серию событий, сек.
 
 # Сообщения бота
 WELCOME_MESSAGE = """
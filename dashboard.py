@@ -0,0 +1,71 @@
+import logging
+import threading
+import time
+from telegram.ext import Application, ContextTypes
+from config import DASHBOARD_CACHE_TTL, STATS_ROLLUP_INTERVAL
+from database import async_db, add_order_listener
+
+logger = logging.getLogger(__name__)
+
+class DashboardCache:
+    """
+    Кэш сводки админ-панели (Database.get_dashboard_summary).
+
+    Сводка живет ttl секунд, поэтому повторные нажатия "Статистика" не
+    обращаются к базе. Создание заказа и смена его статуса в этом процессе
+    сбрасывают кэш сразу, чтобы счетчики заказов не отставали.
+    """
+
+    def __init__(self, ttl: float = DASHBOARD_CACHE_TTL):
+        self.ttl = ttl
+        self._summary = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        # Увеличивается при каждом сбросе, чтобы не сохранить сводку, загруженную до сброса
+        self._generation = 0
+        add_order_listener(self.invalidate)
+
+    def invalidate(self):
+        """Сбрасывает сводку (вызывается и из потоков базы данных)"""
+        with self._lock:
+            self._summary = None
+            self._generation += 1
+
+    async def get(self):
+        """Сводка из кэша или из базы"""
+        with self._lock:
+            if self._summary is not None and self._expires > time.monotonic():
+                return self._summary
+            generation = self._generation
+
+        summary = await async_db.get_dashboard_summary()
+
+        with self._lock:
+            if generation == self._generation:
+                self._summary = summary
+                self._expires = time.monotonic() + self.ttl
+        return summary
+
+dashboard_cache = DashboardCache()
+
+async def rollup_stats_job(context: ContextTypes.DEFAULT_TYPE):
+    """Собирает дневные итоги статистики за завершившиеся дни (Database.rollup_stats)"""
+    try:
+        await async_db.rollup_stats()
+    except Exception as e:
+        logger.error(f"Ошибка при сборе дневных итогов статистики: {e}")
+
+def setup_stats_rollup(application: Application):
+    """
+    Добавляет сбор дневных итогов в job_queue.
+
+    Статистика читает итоги и живые данные за дни после последнего сбора,
+    поэтому интервал влияет только на объем живых данных, а не на точность.
+    """
+    application.job_queue.run_repeating(
+        rollup_stats_job,
+        interval=STATS_ROLLUP_INTERVAL,
+        first=30,
+        name='stats_rollup',
+        job_kwargs={'max_instances': 1, 'coalesce': True}
+    )
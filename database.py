@@ -1,51 +1,230 @@
+import asyncio
 import mysql.connector
+from mysql.connector import errorcode, pooling
 import logging
-from config import DB_CONFIG
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from category_tree import CategoryTree
+from config import (
+    DB_CONFIG, DB_POOL_NAME, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_RECONNECT_ATTEMPTS, DB_RECONNECT_DELAY, CATALOG_PAGE_SIZE
+)
 
 logger = logging.getLogger(__name__)
 
+# Ошибки, после которых соединение считается потерянным ("MySQL server has gone away")
+CONNECTION_LOST_ERRORS = (
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+    errorcode.CR_CONN_HOST_ERROR,
+)
+
+# Имя записи в sync_state: с какого дня дневные итоги статистики еще не собраны
+STATS_ROLLUP = 'stats_daily'
+
+# Период статистики -> количество дней, включая сегодняшний
+STATS_PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30}
+# Имя блокировки MySQL, чтобы дневные итоги не собирали два процесса одновременно
+STATS_ROLLUP_LOCK = 'stats_rollup'
+
+_pool = None
+_pool_lock = threading.Lock()
+# Свободные места в пуле: mysql-connector не умеет ждать соединение, поэтому ожидание - на семафоре
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+_pool_stats = {
+    'checkouts': 0,
+    'in_use': 0,
+    'max_in_use': 0,
+    'waits': 0,
+    'wait_time': 0.0,
+    'timeouts': 0,
+    'reconnects': 0,
+    'errors': 0,
+}
+
+def get_pool():
+    """Возвращает общий для процесса пул соединений, создавая его при первом обращении"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                logger.info(f"Создание пула соединений {DB_POOL_NAME} (размер: {DB_POOL_SIZE})")
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=DB_POOL_NAME,
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+    return _pool
+
+def get_pool_stats() -> dict:
+    """Возвращает метрики пула соединений"""
+    with _pool_lock:
+        stats = dict(_pool_stats)
+    stats['size'] = DB_POOL_SIZE
+    stats['available'] = DB_POOL_SIZE - stats['in_use']
+    return stats
+
+def _is_connection_lost(err) -> bool:
+    return getattr(err, 'errno', None) in CONNECTION_LOST_ERRORS
+
+def _acquire_connection():
+    """
+    Берет соединение из пула, ожидая освобождения не дольше DB_POOL_TIMEOUT.
+    Пул сам проверяет соединение (ping) и переподключает его при необходимости.
+    """
+    pool = get_pool()
+    started = time.monotonic()
+    # Пул исчерпан - ждем, пока другой обработчик вернет соединение
+    waited = not _pool_slots.acquire(blocking=False)
+    if waited and not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        with _pool_lock:
+            _pool_stats['timeouts'] += 1
+        raise pooling.PoolError(f"Нет свободных соединений в пуле {DB_POOL_NAME} за {DB_POOL_TIMEOUT} с")
+    try:
+        connection = pool.get_connection()
+    except Exception:
+        _pool_slots.release()
+        raise
+
+    with _pool_lock:
+        _pool_stats['checkouts'] += 1
+        _pool_stats['in_use'] += 1
+        _pool_stats['max_in_use'] = max(_pool_stats['max_in_use'], _pool_stats['in_use'])
+        if waited:
+            _pool_stats['waits'] += 1
+            _pool_stats['wait_time'] += time.monotonic() - started
+    return connection
+
+def _release_connection(connection):
+    """Возвращает соединение в пул"""
+    try:
+        connection.close()
+    finally:
+        with _pool_lock:
+            _pool_stats['in_use'] -= 1
+        _pool_slots.release()
+
+# Обработчики, вызываемые после изменения каталога в этом процессе (например, сброс кэша)
+_catalog_listeners = []
+
+def add_catalog_listener(callback):
+    """Регистрирует функцию, вызываемую после изменения каталога"""
+    _catalog_listeners.append(callback)
+
+def notify_catalog_listeners():
+    """Сообщает локальным кэшам, что каталог изменился"""
+    for callback in _catalog_listeners:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике изменения каталога: {e}")
+
+# Обработчики, вызываемые после создания заказа или смены его статуса в этом процессе
+_order_listeners = []
+
+def add_order_listener(callback):
+    """Регистрирует функцию, вызываемую после изменения заказов"""
+    _order_listeners.append(callback)
+
+def notify_order_listeners():
+    """Сообщает локальным кэшам, что заказы изменились"""
+    for callback in _order_listeners:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике изменения заказов: {e}")
+
+def bump_catalog_version(cursor):
+    """
+    Увеличивает версию каталога в рамках текущей транзакции.
+    По версии кэши каталога в других процессах узнают об изменениях.
+    """
+    cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+
+class _Cursor:
+    """
+    Обертка над курсором, которая при потере соединения переподключается
+    и повторяет запрос, если он не был частью незавершенной транзакции
+    """
+
+    def __init__(self, db, **kwargs):
+        self._db = db
+        self._kwargs = kwargs
+        self._cursor = db.connection.cursor(**kwargs)
+
+    def execute(self, operation, params=None):
+        in_transaction = self._db.connection.in_transaction
+        try:
+            return self._cursor.execute(operation, params)
+        except mysql.connector.Error as err:
+            if not _is_connection_lost(err) or in_transaction:
+                raise
+            logger.warning(f"Соединение с базой данных потеряно ({err}), переподключение...")
+            self._db._reconnect()
+            self._cursor = self._db.connection.cursor(**self._kwargs)
+            return self._cursor.execute(operation, params)
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
 class Database:
     def __init__(self):
         try:
-            logger.info("Попытка подключения к базе данных...")
-            self.connection = mysql.connector.connect(**DB_CONFIG)
-            self.cursor = self.connection.cursor(dictionary=True)
-            logger.info("Успешное подключение к базе данных")
-            self._create_tables()
+            self.connection = _acquire_connection()
         except mysql.connector.Error as err:
+            with _pool_lock:
+                _pool_stats['errors'] += 1
             logger.error(f"Ошибка подключения к базе данных: {err}")
             raise
+        # Схема создается миграциями при запуске (см. migrations.py), здесь DDL не выполняется
+        self.cursor = self._cursor(dictionary=True)
 
-    def _create_tables(self):
-        """Создает необходимые таблицы, если они не существуют"""
-        try:
-            # Создание таблицы users
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    telegram_id BIGINT UNIQUE NOT NULL,
-                    username VARCHAR(255),
-                    nickname VARCHAR(255),
-                    language VARCHAR(2) DEFAULT 'ru',
-                    is_subscribed BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            self.connection.commit()
-            logger.info("Таблицы успешно созданы или уже существуют")
-        except mysql.connector.Error as err:
-            logger.error(f"Ошибка при создании таблиц: {err}")
-            raise
+    def _cursor(self, **kwargs):
+        """Создает курсор с автоматическим переподключением"""
+        return _Cursor(self, **kwargs)
+
+    def _reconnect(self):
+        """Переподключает текущее соединение после его потери"""
+        self.connection.reconnect(attempts=DB_RECONNECT_ATTEMPTS, delay=DB_RECONNECT_DELAY)
+        with _pool_lock:
+            _pool_stats['reconnects'] += 1
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         try:
-            self.connection.close()
-            logger.info("Соединение с базой данных закрыто")
+            # Соединение не закрывается, а возвращается в пул
+            _release_connection(self.connection)
         except Exception as e:
-            logger.error(f"Ошибка при закрытии соединения: {e}")
+            logger.error(f"Ошибка при возврате соединения в пул: {e}")
+
+    def _catalog_changed(self):
+        """Фиксирует изменение каталога: версия + уведомление локальных кэшей"""
+        bump_catalog_version(self.cursor)
+        self.connection.commit()
+        notify_catalog_listeners()
+
+    def get_catalog_version(self) -> int:
+        """Получает текущую версию каталога"""
+        self.cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+        row = self.cursor.fetchone()
+        return row['version'] if row else 0
+
+    def get_last_sync_run(self, name='products'):
+        """Последний запуск синхронизации из истории sync_runs"""
+        self.cursor.execute("""
+            SELECT * FROM sync_runs WHERE name = %s
+            ORDER BY id DESC LIMIT 1
+        """, (name,))
+        return self.cursor.fetchone()
 
     def get_user(self, telegram_id):
         try:
@@ -90,13 +269,44 @@ class Database:
             self.connection.rollback()
             raise
 
+    def get_telegram_ids_by_usernames(self, usernames):
+        """Telegram ID пользователей по username: {username: telegram_id}"""
+        if not usernames:
+            return {}
+        placeholders = ', '.join(['%s'] * len(usernames))
+        self.cursor.execute(
+            f"SELECT username, telegram_id FROM users WHERE username IN ({placeholders})",
+            list(usernames)
+        )
+        return {row['username']: row['telegram_id'] for row in self.cursor.fetchall()}
+
     def update_subscription(self, telegram_id, is_subscribed):
         self.cursor.execute(
-            "UPDATE users SET is_subscribed = %s WHERE telegram_id = %s",
+            "UPDATE users SET is_subscribed = %s, subscription_checked_at = NOW() WHERE telegram_id = %s",
             (is_subscribed, telegram_id)
         )
         self.connection.commit()
 
+    def save_subscription(self, telegram_id, username, is_subscribed):
+        """Сохраняет статус подписки, создавая пользователя при первом обращении"""
+        self.cursor.execute("""
+            INSERT INTO users (telegram_id, username, is_subscribed, subscription_checked_at)
+            VALUES (%s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                username = COALESCE(VALUES(username), username),
+                is_subscribed = VALUES(is_subscribed),
+                subscription_checked_at = VALUES(subscription_checked_at)
+        """, (telegram_id, username, is_subscribed))
+        self.connection.commit()
+
+    def get_subscription(self, telegram_id):
+        """Статус подписки и сколько секунд назад он проверялся"""
+        self.cursor.execute("""
+            SELECT is_subscribed, TIMESTAMPDIFF(SECOND, subscription_checked_at, NOW()) AS age
+            FROM users WHERE telegram_id = %s
+        """, (telegram_id,))
+        return self.cursor.fetchone()
+
     def update_nickname(self, telegram_id, nickname):
         self.cursor.execute(
             "UPDATE users SET nickname = %s WHERE telegram_id = %s",
@@ -125,8 +335,130 @@ class Database:
             logger.error(f"Ошибка при получении категории: {err}")
             return None
 
+    def get_category_tree(self):
+        """Загружает все дерево категорий с количеством товаров двумя запросами"""
+        self.cursor.execute("SELECT id, name, parent_id FROM categories ORDER BY id")
+        rows = self.cursor.fetchall()
+        self.cursor.execute(
+            "SELECT category_id, COUNT(*) as count FROM products "
+            "WHERE category_id IS NOT NULL GROUP BY category_id"
+        )
+        product_counts = {row['category_id']: row['count'] for row in self.cursor.fetchall()}
+        return CategoryTree(rows, product_counts)
+
+    def get_category_screen(self, category_id=None, page_size=CATALOG_PAGE_SIZE):
+        """
+        Получить все данные для экрана категории одним запросом
+
+        Args:
+            category_id (int): ID категории или None для корня каталога
+            page_size (int): Количество товаров на первой странице
+
+        Returns:
+            dict: {'id', 'name', 'parent_id', 'categories': [...], 'products': [{'id', 'name'}],
+                   'has_next': есть ли следующая страница товаров}
+        """
+        if category_id is None:
+            self.cursor.execute("""
+                SELECT 1 AS section, id, name, parent_id, '' AS sort_name
+                FROM categories WHERE parent_id IS NULL
+                ORDER BY section, sort_name, id
+            """)
+        else:
+            # Товары берутся с запасом в одну строку, чтобы узнать о следующей странице
+            self.cursor.execute("""
+                SELECT 0 AS section, id, name, parent_id, '' AS sort_name
+                FROM categories WHERE id = %s
+                UNION ALL
+                SELECT 1, id, name, parent_id, ''
+                FROM categories WHERE parent_id = %s
+                UNION ALL
+                (SELECT 2, id, name, category_id, name
+                 FROM products WHERE category_id = %s
+                 ORDER BY name, id LIMIT %s)
+                ORDER BY section, sort_name, id
+            """, (category_id, category_id, category_id, page_size + 1))
+
+        screen = {
+            'id': category_id, 'name': None, 'parent_id': None,
+            'categories': [], 'products': [], 'has_next': False
+        }
+        for row in self.cursor.fetchall():
+            if row['section'] == 0:
+                screen['name'] = row['name']
+                screen['parent_id'] = row['parent_id']
+            elif row['section'] == 1:
+                screen['categories'].append({'id': row['id'], 'name': row['name'], 'parent_id': row['parent_id']})
+            else:
+                screen['products'].append({'id': row['id'], 'name': row['name']})
+
+        if len(screen['products']) > page_size:
+            screen['products'] = screen['products'][:page_size]
+            screen['has_next'] = True
+        return screen
+
+    def get_products_page(self, category_id, after_id=None, before_id=None, limit=CATALOG_PAGE_SIZE):
+        """
+        Получить страницу товаров категории (keyset-пагинация по (name, id))
+
+        Страница отсчитывается от товара-якоря: after_id - следующая страница,
+        before_id - предыдущая. Стоимость запроса не зависит от номера страницы.
+        Если якорь успели удалить (например, синхронизацией между нажатиями),
+        возвращается первая страница.
+
+        Returns:
+            dict: {'products': [{'id', 'name'}], 'has_prev': bool, 'has_next': bool}
+        """
+        if after_id is not None:
+            self.cursor.execute("""
+                SELECT p.id, p.name
+                FROM products p
+                JOIN products a ON a.id = %s
+                WHERE p.category_id = %s
+                AND (p.name > a.name OR (p.name = a.name AND p.id > a.id))
+                ORDER BY p.name, p.id
+                LIMIT %s
+            """, (after_id, category_id, limit + 1))
+            rows = self.cursor.fetchall()
+            if rows or self._product_exists(after_id):
+                return {'products': rows[:limit], 'has_prev': True, 'has_next': len(rows) > limit}
+            return self.get_products_page(category_id, limit=limit)
+
+        if before_id is not None:
+            self.cursor.execute("""
+                SELECT p.id, p.name
+                FROM products p
+                JOIN products a ON a.id = %s
+                WHERE p.category_id = %s
+                AND (p.name < a.name OR (p.name = a.name AND p.id < a.id))
+                ORDER BY p.name DESC, p.id DESC
+                LIMIT %s
+            """, (before_id, category_id, limit + 1))
+            rows = self.cursor.fetchall()
+            if rows or self._product_exists(before_id):
+                return {'products': list(reversed(rows[:limit])), 'has_prev': len(rows) > limit, 'has_next': True}
+            return self.get_products_page(category_id, limit=limit)
+
+        self.cursor.execute("""
+            SELECT id, name FROM products
+            WHERE category_id = %s
+            ORDER BY name, id
+            LIMIT %s
+        """, (category_id, limit + 1))
+        rows = self.cursor.fetchall()
+        return {'products': rows[:limit], 'has_prev': False, 'has_next': len(rows) > limit}
+
+    def _product_exists(self, product_id):
+        self.cursor.execute("SELECT 1 FROM products WHERE id = %s", (product_id,))
+        return self.cursor.fetchone() is not None
+
     def get_category_path(self, category_id):
-        """Получить путь к категории (список родительских категорий)"""
+        """
+        Получить путь к категории (список родительских категорий)
+
+        Бот строит путь по дереву из кэша каталога (catalog_cache.get_category_tree);
+        здесь - по одному запросу на уровень, без загрузки всего дерева.
+        """
         try:
             path = []
             current_id = category_id
@@ -152,8 +484,9 @@ class Database:
                 "INSERT INTO categories (name, parent_id) VALUES (%s, %s)",
                 (name, parent_id)
             )
-            self.connection.commit()
-            return self.cursor.lastrowid
+            category_id = self.cursor.lastrowid
+            self._catalog_changed()
+            return category_id
         except mysql.connector.Error as err:
             logger.error(f"Ошибка при создании категории: {err}")
             self.connection.rollback()
@@ -178,7 +511,7 @@ class Database:
                     (parent_id, category_id)
                 )
             
-            self.connection.commit()
+            self._catalog_changed()
             return True
         except mysql.connector.Error as err:
             logger.error(f"Ошибка при обновлении категории: {err}")
@@ -189,7 +522,7 @@ class Database:
         """Удалить категорию"""
         try:
             self.cursor.execute("DELETE FROM categories WHERE id = %s", (category_id,))
-            self.connection.commit()
+            self._catalog_changed()
             return True
         except mysql.connector.Error as err:
             logger.error(f"Ошибка при удалении категории: {err}")
@@ -235,6 +568,7 @@ class Database:
             )
 
             self.connection.commit()
+            notify_order_listeners()
             return order_id
         except mysql.connector.Error as err:
             logger.error(f"Ошибка при создании заказа: {err}")
@@ -314,6 +648,102 @@ class Database:
         self.cursor.execute("SELECT * FROM users")
         return self.cursor.fetchall()
 
+    def get_dashboard_summary(self):
+        """
+        Сводка для админ-панели: счетчики пользователей и заказов,
+        статусы доставки, последняя рассылка и синхронизация
+
+        Счетчики считаются через COUNT(*) в базе, строки заказов и
+        пользователей не выбираются.
+        """
+        self.cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM users) AS total_users,
+                (SELECT COUNT(*) FROM users WHERE created_at >= NOW() - INTERVAL 24 HOUR) AS new_users_24h,
+                (SELECT COUNT(*) FROM orders) AS total_orders,
+                (SELECT COUNT(*) FROM orders WHERE status IN ('pending', 'paid')) AS pending_orders,
+                (SELECT COUNT(*) FROM orders WHERE status = 'completed') AS completed_orders
+        """)
+        summary = dict(self.cursor.fetchone())
+        summary['delivery'] = self.get_delivery_stats()
+        summary['last_broadcast'] = self.get_last_broadcast()
+        summary['last_sync'] = self.get_last_sync_run()
+        return summary
+
+    def create_broadcast(self, from_chat_id, message_id):
+        """
+        Создает рассылку сообщения канала
+
+        Returns:
+            int: ID рассылки или None, если это сообщение уже рассылалось
+        """
+        # Недоступные пользователи в рассылку не попадают - запоминаем, сколько отправок сэкономлено
+        self.cursor.execute("""
+            INSERT IGNORE INTO broadcasts (from_chat_id, message_id, skipped)
+            SELECT %s, %s, COUNT(*) FROM users WHERE delivery_status <> 'active'
+        """, (from_chat_id, message_id))
+        self.connection.commit()
+        return self.cursor.lastrowid if self.cursor.rowcount else None
+
+    def get_unfinished_broadcasts(self):
+        """Рассылки, прерванные перезапуском бота"""
+        self.cursor.execute("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id")
+        return self.cursor.fetchall()
+
+    def get_broadcast_recipients(self, after_user_id, limit):
+        """Следующая порция получателей рассылки (по возрастанию users.id), без недоступных"""
+        self.cursor.execute("""
+            SELECT id, telegram_id FROM users
+            WHERE delivery_status = 'active' AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (after_user_id, limit))
+        return self.cursor.fetchall()
+
+    def update_broadcast_progress(self, broadcast_id, last_user_id, sent, failed, status='running'):
+        """Сохраняет прогресс рассылки, чтобы после перезапуска продолжить с того же места"""
+        self.cursor.execute("""
+            UPDATE broadcasts
+            SET last_user_id = %s, sent = %s, failed = %s, status = %s,
+                finished_at = IF(%s = 'running', NULL, NOW())
+            WHERE id = %s
+        """, (last_user_id, sent, failed, status, status, broadcast_id))
+        self.connection.commit()
+
+    def get_broadcast(self, broadcast_id):
+        """Рассылка по ID"""
+        self.cursor.execute("SELECT * FROM broadcasts WHERE id = %s", (broadcast_id,))
+        return self.cursor.fetchone()
+
+    def get_last_broadcast(self):
+        """Последняя рассылка"""
+        self.cursor.execute("SELECT * FROM broadcasts ORDER BY id DESC LIMIT 1")
+        return self.cursor.fetchone()
+
+    def update_delivery_status(self, telegram_id, status, error=None):
+        """Сохраняет статус доставки сообщений пользователю (active/blocked/deactivated)"""
+        self.cursor.execute("""
+            UPDATE users
+            SET delivery_status = %s, last_delivery_error = %s, delivery_checked_at = NOW()
+            WHERE telegram_id = %s
+        """, (status, error[:255] if error else None, telegram_id))
+        self.connection.commit()
+
+    def mark_user_reachable(self, telegram_id):
+        """Пользователь снова пишет боту - возвращаем его в рассылки"""
+        self.cursor.execute("""
+            UPDATE users
+            SET delivery_status = 'active', delivery_checked_at = NOW()
+            WHERE telegram_id = %s AND delivery_status <> 'active'
+        """, (telegram_id,))
+        self.connection.commit()
+        return self.cursor.rowcount > 0
+
+    def get_delivery_stats(self):
+        """Количество пользователей по статусу доставки"""
+        self.cursor.execute("SELECT delivery_status, COUNT(*) AS count FROM users GROUP BY delivery_status")
+        return {row['delivery_status']: row['count'] for row in self.cursor.fetchall()}
+
     def update_product_stock(self, product_id, point_number, in_stock):
         """Обновить наличие товара"""
         field = f"stock_point{point_number}"
@@ -321,12 +751,12 @@ class Database:
             f"UPDATE products SET {field} = %s WHERE id = %s",
             (in_stock, product_id)
         )
-        self.connection.commit()
+        self._catalog_changed()
 
     def delete_product(self, product_id):
         """Удалить товар"""
         self.cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
-        self.connection.commit()
+        self._catalog_changed()
 
     def add_product(self, category_id, name, description, price, strength=None):
         """Добавить новый товар"""
@@ -336,8 +766,9 @@ class Database:
                VALUES (%s, %s, %s, %s, %s)""",
             (category_id, name, description, price, strength)
         )
-        self.connection.commit()
-        return self.cursor.lastrowid
+        product_id = self.cursor.lastrowid
+        self._catalog_changed()
+        return product_id
 
     def get_product_by_article(self, article):
         """Получить товар по артикулу"""
@@ -365,7 +796,7 @@ class Database:
             
             query = f"UPDATE products SET {', '.join(update_fields)} WHERE id = %s"
             self.cursor.execute(query, values)
-            self.connection.commit()
+            self._catalog_changed()
             
             logger.info(f"Товар {product_id} успешно обновлен")
             return True
@@ -382,19 +813,9 @@ class Database:
 
     def save_feedback(self, user_id: int, text: str) -> int:
         """Сохраняет отзыв пользователя в базу данных"""
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         
         try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS feedback (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id BIGINT,
-                    text TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status ENUM('new', 'read', 'answered') DEFAULT 'new'
-                )
-            """)
-            
             cursor.execute(
                 "INSERT INTO feedback (user_id, text) VALUES (%s, %s)",
                 (user_id, text)
@@ -406,7 +827,7 @@ class Database:
 
     def get_feedback(self, status: str = None) -> list:
         """Получает список отзывов с опциональной фильтрацией по статусу"""
-        cursor = self.connection.cursor(dictionary=True)
+        cursor = self._cursor(dictionary=True)
         
         try:
             if status:
@@ -423,7 +844,7 @@ class Database:
 
     def update_feedback_status(self, feedback_id: int, status: str) -> bool:
         """Обновляет статус отзыва"""
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         
         try:
             cursor.execute(
@@ -435,62 +856,166 @@ class Database:
         finally:
             cursor.close()
 
+    def _rollup_stats(self, cursor, start, end, products=True):
+        """Пересчитывает дневные итоги за дни [start, end) по таблице orders"""
+        cursor.execute("DELETE FROM stats_daily WHERE day >= %s AND day < %s", (start, end))
+        cursor.execute("""
+            INSERT INTO stats_daily (day, orders, completed_orders, revenue)
+            SELECT DATE(created_at), COUNT(*), SUM(status = 'completed'), COALESCE(SUM(total_amount), 0)
+            FROM orders
+            WHERE created_at >= %s AND created_at < %s
+            GROUP BY DATE(created_at)
+        """, (start, end))
+        if not products:
+            return
+        cursor.execute("DELETE FROM stats_daily_products WHERE day >= %s AND day < %s", (start, end))
+        cursor.execute("""
+            INSERT INTO stats_daily_products (day, product_id, units)
+            SELECT DATE(o.created_at), oi.product_id, SUM(oi.quantity)
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            WHERE o.created_at >= %s AND o.created_at < %s
+            AND oi.product_id IS NOT NULL
+            GROUP BY DATE(o.created_at), oi.product_id
+        """, (start, end))
+
+    def rollup_stats(self) -> int:
+        """
+        Собирает дневные итоги за завершившиеся дни, которые еще не собраны
+
+        Вызывается периодической задачей бота (dashboard.setup_stats_rollup).
+        Первый запуск собирает всю историю заказов, дальше - обычно один
+        вчерашний день. Изменения статуса заказов за прошлые дни
+        пересчитываются сразу в update_order_status. Если итоги уже собирает
+        другой процесс, запуск пропускается.
+
+        Returns:
+            int: Сколько дней собрано (0 - итоги актуальны или сбор уже идет)
+        """
+        cursor = self._cursor(dictionary=True)
+        locked = False
+
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (STATS_ROLLUP_LOCK,))
+            locked = cursor.fetchone()['locked'] == 1
+            if not locked:
+                logger.info("Дневные итоги статистики уже собирает другой процесс")
+                return 0
+
+            cursor.execute(
+                "SELECT CURDATE() AS today, (SELECT watermark FROM sync_state WHERE name = %s) AS watermark",
+                (STATS_ROLLUP,)
+            )
+            row = cursor.fetchone()
+            today = row['today']
+            if row['watermark']:
+                start = date.fromisoformat(row['watermark'])
+            else:
+                cursor.execute("SELECT DATE(MIN(created_at)) AS first_day FROM orders")
+                start = cursor.fetchone()['first_day'] or today
+            if start >= today:
+                return 0
+
+            self._rollup_stats(cursor, start, today)
+            cursor.execute("""
+                INSERT INTO sync_state (name, watermark, last_run_at, last_status)
+                VALUES (%s, %s, NOW(), 'ok')
+                ON DUPLICATE KEY UPDATE
+                    watermark = VALUES(watermark),
+                    last_run_at = VALUES(last_run_at),
+                    last_status = VALUES(last_status)
+            """, (STATS_ROLLUP, today.isoformat()))
+            self.connection.commit()
+            days = (today - start).days
+            logger.info(f"Собраны дневные итоги статистики: {days} дн. с {start}")
+            return days
+        except mysql.connector.Error as err:
+            logger.error(f"Ошибка при сборе дневных итогов статистики: {err}")
+            self.connection.rollback()
+            raise
+        finally:
+            if locked:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (STATS_ROLLUP_LOCK,))
+                cursor.fetchone()
+            cursor.close()
+
     def get_statistics(self, period: str = 'week') -> dict:
-        """Получает статистику магазина за указанный период"""
-        cursor = self.connection.cursor(dictionary=True)
+        """
+        Получает статистику магазина за указанный период
+
+        Только читает: дни до отметки сбора итогов (sync_state) берутся из
+        дневных итогов (stats_daily, stats_daily_products), дни после нее -
+        из orders по диапазону created_at. Итоги собирает периодическая задача,
+        поэтому по orders обычно читается только текущий день, и время запроса
+        не растет с историей заказов.
+
+        Args:
+            period (str): day - сегодня, week - 7 дней, month - 30 дней (включая сегодня)
+        """
+        cursor = self._cursor(dictionary=True)
         
         try:
-            # Определяем временной интервал
-            if period == 'day':
-                interval = "AND created_at >= DATE_SUB(NOW(), INTERVAL 1 DAY)"
-            elif period == 'month':
-                interval = "AND created_at >= DATE_SUB(NOW(), INTERVAL 1 MONTH)"
-            else:  # week по умолчанию
-                interval = "AND created_at >= DATE_SUB(NOW(), INTERVAL 1 WEEK)"
-            
+            cursor.execute(
+                "SELECT CURDATE() AS today, (SELECT watermark FROM sync_state WHERE name = %s) AS watermark",
+                (STATS_ROLLUP,)
+            )
+            row = cursor.fetchone()
+            today = row['today']
+            start = today - timedelta(days=STATS_PERIOD_DAYS.get(period, STATS_PERIOD_DAYS['week']) - 1)
+            # Граница между собранными итогами и живыми данными, в пределах периода
+            rolled_up = date.fromisoformat(row['watermark']) if row['watermark'] else start
+            boundary = min(max(rolled_up, start), today)
+
             # Общая статистика заказов
-            cursor.execute(f"""
+            cursor.execute("""
                 SELECT 
-                    COUNT(*) as total_orders,
-                    SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed_orders,
-                    SUM(total_price) as total_sales
-                FROM orders
-                WHERE 1=1 {interval}
-            """)
+                    COALESCE(SUM(orders), 0) as total_orders,
+                    COALESCE(SUM(completed_orders), 0) as completed_orders,
+                    COALESCE(SUM(revenue), 0) as total_sales
+                FROM (
+                    SELECT orders, completed_orders, revenue
+                    FROM stats_daily
+                    WHERE day >= %s AND day < %s
+                    UNION ALL
+                    SELECT COUNT(*), SUM(status = 'completed'), SUM(total_amount)
+                    FROM orders
+                    WHERE created_at >= %s
+                ) t
+            """, (start, boundary, boundary))
             orders_stats = cursor.fetchone()
             
-            # Статистика пользователей
+            # Топ продуктов (по количеству проданных штук)
             cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_users,
-                    SUM(CASE WHEN created_at >= DATE_SUB(NOW(), INTERVAL 24 HOUR) THEN 1 ELSE 0 END) as new_users_24h
-                FROM users
-            """)
-            users_stats = cursor.fetchone()
-            
-            # Топ продуктов
-            cursor.execute(f"""
-                SELECT p.name, COUNT(*) as count
-                FROM order_items oi
-                JOIN products p ON p.id = oi.product_id
-                JOIN orders o ON o.id = oi.order_id
-                WHERE 1=1 {interval}
+                SELECT p.name, SUM(t.units) as count
+                FROM (
+                    SELECT product_id, units
+                    FROM stats_daily_products
+                    WHERE day >= %s AND day < %s
+                    UNION ALL
+                    SELECT oi.product_id, oi.quantity
+                    FROM orders o
+                    JOIN order_items oi ON oi.order_id = o.id
+                    WHERE o.created_at >= %s
+                ) t
+                JOIN products p ON p.id = t.product_id
                 GROUP BY p.id, p.name
                 ORDER BY count DESC
                 LIMIT 5
-            """)
+            """, (start, boundary, boundary))
             top_products = cursor.fetchall()
             
             # Продажи по дням
-            cursor.execute(f"""
-                SELECT 
-                    DATE(created_at) as date,
-                    SUM(total_price) as sales
+            cursor.execute("""
+                SELECT day as date, revenue as sales
+                FROM stats_daily
+                WHERE day >= %s AND day < %s
+                UNION ALL
+                SELECT DATE(created_at), COALESCE(SUM(total_amount), 0)
                 FROM orders
-                WHERE 1=1 {interval}
+                WHERE created_at >= %s
                 GROUP BY DATE(created_at)
                 ORDER BY date DESC
-            """)
+            """, (start, boundary, boundary))
             sales_by_day = cursor.fetchall()
             
             # Находим максимальные дневные продажи для масштабирования графика
@@ -500,8 +1025,6 @@ class Database:
                 'total_orders': orders_stats['total_orders'],
                 'completed_orders': orders_stats['completed_orders'],
                 'total_sales': orders_stats['total_sales'],
-                'total_users': users_stats['total_users'],
-                'new_users_24h': users_stats['new_users_24h'],
                 'top_products': top_products,
                 'sales_by_day': sales_by_day,
                 'max_daily_sales': max_daily_sales
@@ -553,7 +1076,7 @@ class Database:
 
     def get_user(self, user_id: int) -> dict:
         """Получает информацию о пользователе"""
-        cursor = self.connection.cursor(dictionary=True)
+        cursor = self._cursor(dictionary=True)
         
         try:
             cursor.execute(
@@ -579,7 +1102,7 @@ class Database:
 
     def get_user_orders_count(self, user_id: int) -> int:
         """Получает количество заказов пользователя"""
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         
         try:
             cursor.execute(
@@ -592,22 +1115,9 @@ class Database:
 
     def get_abandoned_carts(self) -> list:
         """Получает список брошенных корзин"""
-        cursor = self.connection.cursor(dictionary=True)
+        cursor = self._cursor(dictionary=True)
         
         try:
-            # Создаем таблицу корзин, если её нет
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS carts (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id BIGINT,
-                    product_id INT,
-                    quantity INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    status ENUM('active', 'abandoned', 'completed') DEFAULT 'active'
-                )
-            """)
-            
             # Получаем брошенные корзины (неактивные более 24 часов)
             cursor.execute("""
                 SELECT c.*, p.name as product_name, p.price
@@ -615,6 +1125,10 @@ class Database:
                 JOIN products p ON p.id = c.product_id
                 WHERE c.status = 'active'
                 AND c.last_updated < DATE_SUB(NOW(), INTERVAL 24 HOUR)
+                AND NOT EXISTS (
+                    SELECT 1 FROM users u
+                    WHERE u.telegram_id = c.user_id AND u.delivery_status <> 'active'
+                )
             """)
             return cursor.fetchall()
         finally:
@@ -622,7 +1136,7 @@ class Database:
 
     def get_cart(self, cart_id: int) -> dict:
         """Получает информацию о корзине"""
-        cursor = self.connection.cursor(dictionary=True)
+        cursor = self._cursor(dictionary=True)
         
         try:
             cursor.execute("""
@@ -637,7 +1151,7 @@ class Database:
 
     def create_order_from_cart(self, cart_id: int) -> int:
         """Создает заказ из брошенной корзины"""
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         
         try:
             # Получаем информацию о корзине
@@ -647,7 +1161,7 @@ class Database:
             
             # Создаем заказ
             cursor.execute("""
-                INSERT INTO orders (user_id, status, total_price)
+                INSERT INTO orders (user_id, status, total_amount)
                 VALUES (%s, 'created', %s)
             """, (cart['user_id'], cart['price'] * cart['quantity']))
             order_id = cursor.lastrowid
@@ -666,13 +1180,14 @@ class Database:
             """, (cart_id,))
             
             self.connection.commit()
+            notify_order_listeners()
             return order_id
         finally:
             cursor.close()
 
     def delete_cart(self, cart_id: int) -> bool:
         """Удаляет корзину"""
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         
         try:
             cursor.execute("""
@@ -687,7 +1202,7 @@ class Database:
 
     def get_order(self, order_id: int) -> dict:
         """Получает информацию о заказе"""
-        cursor = self.connection.cursor(dictionary=True)
+        cursor = self._cursor(dictionary=True)
         
         try:
             cursor.execute("""
@@ -703,7 +1218,7 @@ class Database:
 
     def update_order_status(self, order_id: int, status: str) -> bool:
         """Обновляет статус заказа"""
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         
         try:
             cursor.execute("""
@@ -711,7 +1226,65 @@ class Database:
                 SET status = %s
                 WHERE id = %s
             """, (status, order_id))
+            updated = cursor.rowcount > 0
+            if updated:
+                # Заказ прошлого дня: пересчитываем итоги этого дня (сегодняшний считается на лету)
+                cursor.execute(
+                    "SELECT DATE(created_at) FROM orders WHERE id = %s AND created_at < CURDATE()",
+                    (order_id,)
+                )
+                row = cursor.fetchone()
+                if row:
+                    day = row[0]
+                    self._rollup_stats(cursor, day, day + timedelta(days=1), products=False)
             self.connection.commit()
-            return cursor.rowcount > 0
+            if updated:
+                notify_order_listeners()
+            return updated
         finally:
-            cursor.close() 
\ No newline at end of file
+            cursor.close() 
+
+class AsyncDatabase:
+    """
+    Асинхронный доступ к базе данных для обработчиков бота.
+
+    Каждый вызов выполняется в ограниченном пуле потоков (по одному потоку на
+    соединение пула) с собственным соединением, поэтому медленный запрос не
+    блокирует цикл событий и обработку обновлений других пользователей.
+
+    Пример:
+        product = await async_db.get_product(product_id)
+        order_id = await async_db.run(lambda db: db.create_order(user_id, product_id, 1))
+    """
+
+    def __init__(self, max_workers: int = DB_POOL_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет func(db, *args, **kwargs) в одном соединении из пула"""
+        def call():
+            with Database() as db:
+                return func(db, *args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, call)
+
+    def __getattr__(self, name):
+        method = getattr(Database, name, None)
+        if name.startswith('_') or not callable(method):
+            raise AttributeError(name)
+
+        async def wrapper(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        # Кэшируем обертку, чтобы __getattr__ не вызывался повторно
+        setattr(self, name, wrapper)
+        return wrapper
+
+    def shutdown(self):
+        """Останавливает пул потоков"""
+        self._executor.shutdown(wait=True)
+
+async_db = AsyncDatabase()
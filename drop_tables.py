@@ -11,7 +11,11 @@ def drop_tables():
         cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
 
         # Удаляем таблицы
-        tables = ['orders', 'products', 'categories', 'users']
+        tables = [
+            'order_items', 'orders', 'carts', 'feedback', 'products',
+            'categories', 'users', 'catalog_version', 'sync_state', 'sync_runs', 'broadcasts',
+            'stats_daily', 'stats_daily_products', 'schema_migrations'
+        ]
         for table in tables:
             cursor.execute(f"DROP TABLE IF EXISTS {table}")
             print(f"Таблица {table} удалена")
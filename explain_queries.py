@@ -0,0 +1,254 @@
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+from database import Database
+from migrations import run_migrations
+
+# Таблицы, которые растут вместе с магазином: полный просмотр любой из них - регрессия
+CHECKED_TABLES = {
+    'users', 'categories', 'products', 'orders', 'order_items',
+    'carts', 'feedback', 'stats_daily', 'stats_daily_products',
+}
+
+# Запросы, для которых снимается план. Пишущие запросы затем выполняются как есть,
+# поэтому проверку запускают только на тестовой базе
+EXPLAINED_STATEMENTS = ('SELECT', '(SELECT', 'UPDATE', 'DELETE', 'INSERT')
+
+class ExplainingCursor:
+    """Обертка над курсором: перед каждым запросом сохраняет его план (EXPLAIN)"""
+
+    def __init__(self, cursor, recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+
+    def execute(self, operation, params=None):
+        self._recorder.explain(operation, params)
+        return self._cursor.execute(operation, params)
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+class ExplainingConnection:
+    """Обертка над соединением: все новые курсоры сохраняют планы запросов"""
+
+    def __init__(self, connection, recorder):
+        self._connection = connection
+        self._recorder = recorder
+
+    def cursor(self, **kwargs):
+        return ExplainingCursor(self._connection.cursor(**kwargs), self._recorder)
+
+    def __getattr__(self, attr):
+        return getattr(self._connection, attr)
+
+class PlanRecorder:
+    """Собирает планы запросов, выполненных методами Database"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self.method = None
+        self.plans = []
+
+    def explain(self, operation, params):
+        statement = operation.strip()
+        if not statement.upper().startswith(EXPLAINED_STATEMENTS):
+            return
+        if statement.upper().startswith('INSERT'):
+            # У INSERT ... VALUES плана чтения нет, у INSERT ... SELECT проверяем SELECT
+            select_at = statement.upper().find('SELECT')
+            if select_at < 0:
+                return
+            statement = statement[select_at:]
+        cursor = self._connection.cursor(dictionary=True)
+        try:
+            cursor.execute("EXPLAIN " + statement, params)
+            self.plans.append((self.method, statement, cursor.fetchall()))
+        finally:
+            cursor.close()
+
+def full_scans(plan):
+    """Строки плана с полным просмотром проверяемых таблиц"""
+    return [row for row in plan if row.get('type') == 'ALL' and row.get('table') in CHECKED_TABLES]
+
+def seed(db, users: int, orders: int):
+    """
+    Заполняет пустую базу тестовыми данными, чтобы оптимизатор выбирал
+    планы как на реальном объеме, а не полный просмотр крошечных таблиц
+    """
+    cursor = db.connection.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM users")
+        if cursor.fetchone()[0]:
+            raise SystemExit("В базе уже есть пользователи: заполнять можно только пустую тестовую базу")
+
+        rng = random.Random(42)
+        now = datetime.now()
+        print(f"Заполнение базы: {users} пользователей, {orders} заказов...")
+
+        cursor.executemany(
+            "INSERT INTO categories (name, parent_id) VALUES (%s, NULL)",
+            [(f"Категория {i}",) for i in range(20)]
+        )
+        cursor.execute("SELECT id FROM categories")
+        roots = [row[0] for row in cursor.fetchall()]
+        cursor.executemany(
+            "INSERT INTO categories (name, parent_id) VALUES (%s, %s)",
+            [(f"Подкатегория {i}", rng.choice(roots)) for i in range(200)]
+        )
+        cursor.execute("SELECT id FROM categories WHERE parent_id IS NOT NULL")
+        leaves = [row[0] for row in cursor.fetchall()]
+
+        cursor.executemany(
+            "INSERT INTO products (name, description, price, category_id, stock_point1) VALUES (%s, '', %s, %s, %s)",
+            [(f"Товар {i}", rng.randint(100, 5000), rng.choice(leaves), rng.random() < 0.5) for i in range(5000)]
+        )
+        cursor.execute("SELECT id, price FROM products")
+        products = cursor.fetchall()
+
+        cursor.executemany(
+            "INSERT INTO users (telegram_id, username, created_at, delivery_status) VALUES (%s, %s, %s, %s)",
+            [(10 ** 9 + i, f"user{i}", now - timedelta(days=rng.randint(0, 365)),
+              'active' if rng.random() < 0.9 else 'blocked') for i in range(users)]
+        )
+        cursor.execute("SELECT MIN(id), MAX(id) FROM users")
+        first_user, last_user = cursor.fetchone()
+
+        statuses = ['completed'] * 90 + ['pending'] * 5 + ['paid'] * 3 + ['confirmed'] * 2
+        batch = []
+        for _ in range(orders):
+            _, price = rng.choice(products)
+            created_at = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            batch.append((rng.randint(first_user, last_user), price, rng.choice(statuses), created_at))
+        cursor.executemany(
+            "INSERT INTO orders (user_id, total_amount, status, created_at) VALUES (%s, %s, %s, %s)",
+            batch
+        )
+        cursor.execute("SELECT id, total_amount FROM orders")
+        cursor.executemany(
+            "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, 1, %s)",
+            [(order_id, rng.choice(products)[0], amount) for order_id, amount in cursor.fetchall()]
+        )
+
+        cursor.executemany(
+            "INSERT INTO carts (user_id, product_id, quantity, last_updated, status) VALUES (%s, %s, 1, %s, %s)",
+            [(10 ** 9 + rng.randint(0, users - 1), rng.choice(products)[0],
+              now - timedelta(hours=rng.randint(0, 24 * 60)),
+              'active' if rng.random() < 0.05 else 'completed') for _ in range(users // 2)]
+        )
+        cursor.executemany(
+            "INSERT INTO feedback (user_id, text, created_at, status) VALUES (%s, %s, %s, %s)",
+            [(10 ** 9 + rng.randint(0, users - 1), "Отзыв", now - timedelta(days=rng.randint(0, 365)),
+              'new' if rng.random() < 0.05 else 'answered') for _ in range(users // 2)]
+        )
+        db.connection.commit()
+
+        for table in ('users', 'categories', 'products', 'orders', 'order_items', 'carts', 'feedback'):
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+def sample_ids(db):
+    """ID существующих записей для параметров запросов"""
+    cursor = db.connection.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT
+                (SELECT telegram_id FROM users ORDER BY id LIMIT 1) AS telegram_id,
+                (SELECT id FROM users ORDER BY id LIMIT 1) AS user_id,
+                (SELECT id FROM categories WHERE parent_id IS NOT NULL ORDER BY id LIMIT 1) AS category_id,
+                (SELECT id FROM products ORDER BY id LIMIT 1) AS product_id,
+                (SELECT id FROM orders ORDER BY id LIMIT 1) AS order_id,
+                (SELECT id FROM carts ORDER BY id LIMIT 1) AS cart_id
+        """)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+def hot_queries(ids):
+    """Методы Database, которые вызываются из обработчиков бота: (имя, вызов)"""
+    return [
+        ('get_user', lambda db: db.get_user(ids['telegram_id'])),
+        ('get_subscription', lambda db: db.get_subscription(ids['telegram_id'])),
+        ('get_telegram_ids_by_usernames', lambda db: db.get_telegram_ids_by_usernames(['user1', 'user2'])),
+        ('get_categories (корень)', lambda db: db.get_categories()),
+        ('get_categories', lambda db: db.get_categories(ids['category_id'])),
+        ('get_category_screen (корень)', lambda db: db.get_category_screen()),
+        ('get_category_screen', lambda db: db.get_category_screen(ids['category_id'])),
+        ('get_products_page (далее)', lambda db: db.get_products_page(ids['category_id'], after_id=ids['product_id'])),
+        ('get_products_page (назад)', lambda db: db.get_products_page(ids['category_id'], before_id=ids['product_id'])),
+        ('get_product', lambda db: db.get_product(ids['product_id'])),
+        ('get_user_orders', lambda db: db.get_user_orders(ids['user_id'])),
+        ('get_user_orders_count', lambda db: db.get_user_orders_count(ids['user_id'])),
+        ('get_order', lambda db: db.get_order(ids['order_id'])),
+        ('get_pending_orders', lambda db: db.get_pending_orders()),
+        ('get_dashboard_summary', lambda db: db.get_dashboard_summary()),
+        ('get_statistics (неделя)', lambda db: db.get_statistics('week')),
+        ('get_statistics (месяц)', lambda db: db.get_statistics('month')),
+        ('update_order_status', lambda db: db.update_order_status(ids['order_id'], 'completed')),
+        ('get_feedback', lambda db: db.get_feedback('new')),
+        ('get_abandoned_carts', lambda db: db.get_abandoned_carts()),
+        ('get_cart', lambda db: db.get_cart(ids['cart_id'])),
+        ('get_broadcast_recipients', lambda db: db.get_broadcast_recipients(0, 200)),
+        ('get_delivery_stats', lambda db: db.get_delivery_stats()),
+    ]
+
+def run_checks(verbose: bool) -> bool:
+    """
+    Выполняет частые запросы с EXPLAIN и ищет полные просмотры таблиц
+
+    Returns:
+        bool: True, если ни один запрос не просматривает таблицу целиком
+    """
+    with Database() as db:
+        ids = sample_ids(db)
+        if any(value is None for value in ids.values()):
+            raise SystemExit("В базе нет данных для проверки: запустите с --seed на пустой тестовой базе")
+
+        # Первый сбор дневных итогов читает всю историю заказов - это разовая операция, не проверяем
+        db.rollup_stats()
+
+        recorder = PlanRecorder(db.connection)
+        db.connection = ExplainingConnection(db.connection, recorder)
+        db.cursor = ExplainingCursor(db.cursor, recorder)
+        try:
+            for method, call in hot_queries(ids):
+                recorder.method = method
+                call(db)
+        finally:
+            db.connection = db.connection._connection
+
+    ok = True
+    for method, statement, plan in recorder.plans:
+        scans = full_scans(plan)
+        if scans or verbose:
+            query = ' '.join(statement.split())[:100]
+            print(f"{'❌' if scans else '✅'} {method}: {query}")
+            for row in plan:
+                print(f"    {row.get('table')}: type={row.get('type')}, key={row.get('key')}, rows={row.get('rows')}")
+        ok = ok and not scans
+
+    print(f"Проверено запросов: {len(recorder.plans)}, "
+          f"{'полных просмотров нет' if ok else 'есть полные просмотры таблиц'}")
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Проверка планов частых запросов: ошибка, если запрос просматривает таблицу целиком"
+    )
+    parser.add_argument('--seed', action='store_true', help="Заполнить пустую тестовую базу данными")
+    parser.add_argument('--users', type=int, default=5000, help="Пользователей при заполнении")
+    parser.add_argument('--orders', type=int, default=20000, help="Заказов при заполнении")
+    parser.add_argument('--verbose', action='store_true', help="Показать планы всех запросов")
+    args = parser.parse_args()
+
+    run_migrations()
+    if args.seed:
+        with Database() as db:
+            seed(db, args.users, args.orders)
+    if not run_checks(args.verbose):
+        sys.exit(1)
@@ -0,0 +1,181 @@
+import argparse
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+# Локальная имитация API МойСклад для проверки импорта без доступа к реальному аккаунту.
+# Запуск:
+#   python fake_moysklad.py --products 5000 --port 8081
+#   MOYSKLAD_API_URL=http://127.0.0.1:8081/api/remap/1.2 python import_products.py
+
+API_PREFIX = '/api/remap/1.2'
+
+STORES = [
+    {'id': 'store-1', 'name': '1 склад (Дзержинского)'},
+    {'id': 'store-2', 'name': '2 склад (Степана Разина)'},
+]
+
+def build_catalog(products: int = 100, folders: int = 10):
+    """
+    Детерминированно генерирует каталог: папки, товары и остатки
+
+    Returns:
+        dict: {'folders': {...}, 'products': [...], 'products_by_id': {...}, 'stock': [...]}
+    """
+    catalog_folders = {}
+    for i in range(folders):
+        parent = f"Категория {i % 3 + 1}"
+        name = f"Папка {i + 1}"
+        catalog_folders[f"folder-{i}"] = {
+            'id': f"folder-{i}",
+            'name': name,
+            'pathName': f"{parent}/{name}",
+        }
+
+    catalog_products = []
+    stock = []
+    for i in range(products):
+        folder_id = f"folder-{i % folders}" if folders else None
+        product = {
+            'id': f"product-{i}",
+            'name': f"Товар {i:06d}",
+            'description': f"Описание товара {i}",
+            'updated': f"2024-01-{i % 28 + 1:02d} 12:00:00.000",
+            'salePrices': [{'value': (i % 50 + 1) * 10000}],
+            'characteristics': [{'name': 'Крепость', 'value': f"{i % 5 * 10} мг"}],
+        }
+        if folder_id:
+            # Половина товаров приходит без pathName - путь берется из папки
+            if i % 2 == 0:
+                product['pathName'] = catalog_folders[folder_id]['pathName']
+            product['productFolder'] = {'meta': {'href': f"__BASE__/entity/productfolder/{folder_id}"}}
+        catalog_products.append(product)
+
+        for store_index, store in enumerate(STORES):
+            quantity = (i + store_index) % 4
+            if quantity:
+                stock.append({'assortmentId': product['id'], 'storeId': store['id'], 'stock': quantity})
+
+    return {
+        'folders': catalog_folders,
+        'products': catalog_products,
+        'products_by_id': {product['id']: product for product in catalog_products},
+        'stock': stock,
+    }
+
+class FakeMoySkladHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeMoySklad/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path[len(API_PREFIX):] if parsed.path.startswith(API_PREFIX) else parsed.path
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        catalog = self.server.catalog
+        by_id = path.startswith('/entity/productfolder/') or path.startswith('/entity/product/')
+        self.server.requests[path.rsplit('/', 1)[0] if by_id else path] += 1
+
+        # Имитация ограничения частоты: каждый fail_every-й запрос получает 429
+        with self.server.lock:
+            self.server.total_requests += 1
+            throttled = self.server.fail_every and self.server.total_requests % self.server.fail_every == 0
+        if throttled:
+            self.server.requests['429'] += 1
+            body = b'{"errors": [{"error": "Too Many Requests"}]}'
+            self.send_response(429)
+            self.send_header('X-Lognex-Retry-TimeInterval', '50')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if path == '/__stats':
+            return self._send_json(dict(self.server.requests))
+        if path == '/entity/store':
+            return self._send_json({'meta': {'size': len(STORES)}, 'rows': STORES})
+        if path.startswith('/entity/productfolder/'):
+            folder = catalog['folders'].get(path.rsplit('/', 1)[1])
+            return self._send_json(folder) if folder else self._send_json({'errors': []}, 404)
+        if path == '/entity/product':
+            return self._send_json(self._product_page(query))
+        if path.startswith('/entity/product/'):
+            product = catalog['products_by_id'].get(path.rsplit('/', 1)[1])
+            if not product:
+                return self._send_json({'errors': []}, 404)
+            return self._send_json(json.loads(json.dumps(product).replace('__BASE__', self.server.base_url)))
+        if path == '/report/stock/bystore/current':
+            rows = catalog['stock']
+            if query.get('filter', '').startswith('assortmentId='):
+                # Несколько значений фильтра перечисляются через ';'
+                assortment_ids = {item.split('=', 1)[1] for item in query['filter'].split(';')}
+                rows = [row for row in rows if row['assortmentId'] in assortment_ids]
+            # changedSince: время изменений не хранится, поэтому изменившимися считаются все остатки
+            return self._send_json(rows)
+        self._send_json({'errors': [{'error': f"Неизвестный путь {path}"}]}, 404)
+
+    def _product_page(self, query):
+        limit = min(int(query.get('limit', 1000)), 1000)
+        offset = int(query.get('offset', 0))
+        rows = self.server.catalog['products']
+        flt = query.get('filter', '')
+        if flt.startswith('updated>='):
+            since = flt.split('>=', 1)[1]
+            rows = [row for row in rows if row['updated'][:19] >= since]
+
+        base = self.server.base_url
+        page = [json.loads(json.dumps(row).replace('__BASE__', base)) for row in rows[offset:offset + limit]]
+        meta = {'size': len(rows), 'limit': limit, 'offset': offset}
+        if offset + limit < len(rows):
+            next_query = dict(query, limit=limit, offset=offset + limit)
+            meta['nextHref'] = f"{base}/entity/product?{urlencode(next_query)}"
+        return {'meta': meta, 'rows': page}
+
+def start_fake_moysklad(products: int = 100, folders: int = 10, host: str = '127.0.0.1', port: int = 0,
+                        fail_every: int = 0):
+    """
+    Запускает имитацию МойСклад в фоновом потоке
+
+    Args:
+        fail_every (int): Отвечать 429 на каждый N-й запрос (0 - не отвечать)
+
+    Returns:
+        tuple: (server, base_url) - server.shutdown() останавливает сервер,
+               server.requests содержит счетчики запросов по путям
+    """
+    server = ThreadingHTTPServer((host, port), FakeMoySkladHandler)
+    server.catalog = build_catalog(products, folders)
+    server.requests = Counter()
+    server.lock = threading.Lock()
+    server.total_requests = 0
+    server.fail_every = fail_every
+    server.base_url = f"http://{host}:{server.server_address[1]}{API_PREFIX}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.base_url
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Локальная имитация API МойСклад")
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--folders', type=int, default=20)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--fail-every', type=int, default=0, help="Отвечать 429 на каждый N-й запрос")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_moysklad(args.products, args.folders, port=args.port, fail_every=args.fail_every)
+    print(f"Имитация МойСклад запущена: MOYSKLAD_API_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
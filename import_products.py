@@ -1,255 +1,759 @@
-import requests
-import base64
-from config import MOYSKLAD_LOGIN, MOYSKLAD_PASSWORD, DB_CONFIG
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from config import (
+    MOYSKLAD_LOGIN, MOYSKLAD_PASSWORD, IMPORT_BATCH_SIZE, IMPORT_PREFETCH_PAGES,
+    IMPORT_PROGRESS_INTERVAL, DB_CONFIG
+)
 import mysql.connector
-from datetime import datetime
-
-def get_moysklad_token():
-    """Получение токена для доступа к API МойСклад"""
-    credentials = f"{MOYSKLAD_LOGIN}:{MOYSKLAD_PASSWORD}"
-    encoded_credentials = base64.b64encode(credentials.encode()).decode()
-    return encoded_credentials
-
-def get_products_from_moysklad():
-    """Получение списка товаров из МойСклад"""
-    token = get_moysklad_token()
-    headers = {
-        'Authorization': f'Basic {token}',
-        'Content-Type': 'application/json'
-    }
-    
-    url = "https://api.moysklad.ru/api/remap/1.2/entity/product"
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json()['rows']
-    else:
-        print(f"Ошибка при получении товаров: {response.status_code}")
-        print(response.text)
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from database import bump_catalog_version
+from moysklad import MoySkladClient, MoySkladError
+
+logger = logging.getLogger(__name__)
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Имя записи в sync_state для синхронизации товаров
+PRODUCTS_SYNC = 'products'
+# Имя записи в sync_state с моментом последней проверки остатков
+STOCK_SYNC = 'stock'
+# МойСклад принимает время в фильтрах по московскому времени
+MOYSKLAD_TZ = ZoneInfo('Europe/Moscow')
+# Запас на расхождение часов при запросе изменений остатков
+STOCK_CHANGES_OVERLAP = timedelta(minutes=1)
+# Изменения остатков запрашиваются не более чем за сутки, при большем перерыве сверяется весь каталог
+STOCK_CHANGES_MAX_AGE = timedelta(hours=24)
+# Имя блокировки MySQL, не дающей запустить два импорта одновременно
+IMPORT_LOCK = 'import_products'
+
+def create_moysklad_client():
+    """Клиент МойСклад на один запуск импорта (со своим кэшем папок)"""
+    return MoySkladClient(MOYSKLAD_LOGIN, MOYSKLAD_PASSWORD)
+
+def iter_product_pages(client, updated_since=None):
+    """
+    Постранично получает товары из МойСклад, следуя по meta.nextHref
+
+    Args:
+        client (MoySkladClient): Клиент МойСклад
+        updated_since (str): Если указано - только товары, измененные начиная с этого момента
+                             (формат МойСклад: 'YYYY-MM-DD HH:MM:SS')
+
+    Yields:
+        list: Страница товаров МойСклад
+    """
+    params = {}
+    if updated_since:
+        params['filter'] = f"updated>={updated_since}"
+    yield from client.iter_pages('entity/product', params)
+
+def iter_products_from_moysklad(client, updated_since=None):
+    """Товары из МойСклад по одному (все страницы)"""
+    for page in iter_product_pages(client, updated_since):
+        yield from page
+
+def get_products_from_moysklad(updated_since=None):
+    """
+    Получение списка товаров из МойСклад (все страницы)
+
+    Весь каталог загружается в память; импорт использует постраничный prefetch_pages.
+    """
+    try:
+        with create_moysklad_client() as client:
+            return list(iter_products_from_moysklad(client, updated_since))
+    except MoySkladError as e:
+        logger.error(str(e))
         return None
 
-def get_full_category_path(product, headers):
+def load_sync_watermark(cursor, name):
+    """Возвращает отметку последней синхронизации (значение поля updated МойСклад) или None"""
+    cursor.execute("SELECT watermark FROM sync_state WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row['watermark'] if isinstance(row, dict) else row[0]
+
+def save_sync_state(cursor, name, watermark, status):
+    """Сохраняет отметку и результат синхронизации"""
+    cursor.execute("""
+        INSERT INTO sync_state (name, watermark, last_run_at, last_status)
+        VALUES (%s, %s, NOW(), %s)
+        ON DUPLICATE KEY UPDATE
+            watermark = VALUES(watermark),
+            last_run_at = VALUES(last_run_at),
+            last_status = VALUES(last_status)
+    """, (name, watermark, status))
+
+def get_folder_href(product):
+    """Ссылка на папку товара, если путь придется брать из нее"""
+    if 'pathName' not in product and product.get('productFolder'):
+        return product['productFolder']['meta']['href']
+    return None
+
+def get_full_category_path(product, client):
     """Получение полного пути категории товара"""
     if 'pathName' in product:
         return product['pathName'].split('/')
-    elif 'productFolder' in product and product['productFolder']:
-        folder_url = product['productFolder']['meta']['href']
-        folder_response = requests.get(folder_url, headers=headers)
-        if folder_response.status_code == 200:
-            folder_data = folder_response.json()
+    folder_href = get_folder_href(product)
+    if folder_href:
+        try:
+            # Папки кэшируются клиентом на весь запуск импорта
+            folder_data = client.get_folder(folder_href)
+        except MoySkladError as e:
+            logger.warning(f"Ошибка при получении папки товара {product.get('name')}: {e}")
+        else:
             if 'pathName' in folder_data:
                 return folder_data['pathName'].split('/')
             return [folder_data['name']]
     return ['Без категории']
 
-def ensure_category_exists(cursor, conn, category_path, categories):
-    """Создание категории и подкатегорий если они не существуют"""
-    parent_id = None
-    current_path = []
-    
-    for level in category_path:
-        current_path.append(level)
-        current_name = current_path[-1]  # Текущее имя категории
-        full_path = ' / '.join(current_path)  # Полный путь для отображения
-        
-        # Проверяем существование категории по имени и parent_id
-        if parent_id is None:
-            cursor.execute(
-                "SELECT id FROM categories WHERE name = %s AND parent_id IS NULL",
-                (current_name,)
-            )
-        else:
-            cursor.execute(
-                "SELECT id FROM categories WHERE name = %s AND parent_id = %s",
-                (current_name, parent_id)
-            )
-        category = cursor.fetchone()
-        
-        if not category:
-            # Создаем новую категорию
-            cursor.execute(
-                "INSERT INTO categories (name, parent_id) VALUES (%s, %s)",
-                (current_name, parent_id)
-            )
-            conn.commit()
-            
-            # Получаем ID новой категории
+class CategoryIndex:
+    """
+    Индекс категорий (parent_id, name) -> id на весь запуск импорта.
+
+    Иерархия загружается из базы одним запросом, недостающие категории
+    создаются пакетно - по одному INSERT на уровень вложенности.
+    """
+
+    def __init__(self, cursor):
+        cursor.execute("SELECT id, name, parent_id FROM categories")
+        self._ids = {}
+        for row in cursor.fetchall():
+            # При дублях в таблице используем категорию с меньшим ID
+            self._ids.setdefault((row['parent_id'], row['name']), row['id'])
+
+    def __len__(self):
+        return len(self._ids)
+
+    def resolve(self, category_path, pending=None):
+        """ID последней категории пути или None, если какого-то уровня нет"""
+        parent_id = None
+        for name in category_path:
+            key = (parent_id, name)
+            parent_id = self._ids.get(key)
+            if parent_id is None and pending:
+                parent_id = pending.get(key)
             if parent_id is None:
-                cursor.execute(
-                    "SELECT id FROM categories WHERE name = %s AND parent_id IS NULL",
-                    (current_name,)
+                return None
+        return parent_id
+
+    def ensure_paths(self, cursor, conn, category_paths):
+        """
+        Создает недостающие категории для всех путей
+
+        Новые ID попадают в индекс только после коммита: если запись откатится,
+        в индексе не останется категорий, которых нет в базе.
+
+        Returns:
+            int: Количество созданных категорий
+        """
+        paths = [path for path in category_paths if path]
+        pending = {}
+        created = 0
+        depth = 0
+        while True:
+            missing = {}
+            for path in paths:
+                if len(path) <= depth:
+                    continue
+                parent_id = self.resolve(path[:depth], pending) if depth else None
+                key = (parent_id, path[depth])
+                if key not in self._ids and key not in pending:
+                    missing[key] = ' / '.join(path[:depth + 1])
+            if not missing and not any(len(path) > depth for path in paths):
+                break
+
+            if missing:
+                cursor.executemany(
+                    "INSERT INTO categories (name, parent_id) VALUES (%s, %s)",
+                    [(name, parent_id) for parent_id, name in missing]
                 )
-            else:
+                # ID новых категорий не обязательно идут подряд, поэтому перечитываем их по именам
+                names = sorted({name for _, name in missing})
+                placeholders = ', '.join(['%s'] * len(names))
                 cursor.execute(
-                    "SELECT id FROM categories WHERE name = %s AND parent_id = %s",
-                    (current_name, parent_id)
+                    f"SELECT id, name, parent_id FROM categories WHERE name IN ({placeholders}) ORDER BY id",
+                    names
                 )
-            category = cursor.fetchone()
-            print(f"Создана новая категория: {full_path}")
-        
-        # Сохраняем ID текущей категории как parent_id для следующего уровня
-        parent_id = category['id'] if isinstance(category, dict) else category[0]
-        
-        # Добавляем в словарь categories
-        categories[full_path] = parent_id
-    
-    return parent_id  # Возвращаем ID последней категории в пути
-
-def get_product_stock(product_id, headers):
-    """Получение остатков товара по всем складам"""
-    url = "https://api.moysklad.ru/api/remap/1.2/report/stock/bystore/current"
-    params = {
-        'filter': f'assortmentId={product_id}'
-    }
-    response = requests.get(url, headers=headers, params=params)
-    
-    if response.status_code == 200:
-        print(f"Ответ API по остаткам: {response.text}")  # Отладочный вывод
-        return response.json()
-    else:
-        print(f"Ошибка при получении остатков: {response.status_code}")
-        print(f"Текст ошибки: {response.text}")
-        return []
+                for row in cursor.fetchall():
+                    key = (row['parent_id'], row['name'])
+                    if key not in self._ids:
+                        pending.setdefault(key, row['id'])
+                created += len(missing)
+                for full_path in missing.values():
+                    logger.debug(f"Создана новая категория: {full_path}")
+            depth += 1
+
+        if created:
+            # Дерево категорий в кэше бота должно увидеть новые категории
+            bump_catalog_version(cursor)
+            conn.commit()
+        self._ids.update(pending)
+        return created
+
+def ensure_category_exists(cursor, conn, category_path, categories):
+    """Создание категории и подкатегорий если они не существуют; возвращает ID последней категории"""
+    categories.ensure_paths(cursor, conn, [category_path])
+    return categories.resolve(category_path)
+
+def get_store_points(stores):
+    """Номер точки продаж (0 - stock_point1, 1 - stock_point2) для складов, привязанных к точкам"""
+    points = {}
+    for store_id, store_name in stores.items():
+        if "1 склад" in store_name or "Дзержинского" in store_name:
+            points[store_id] = 0
+        elif "2 склад" in store_name or "Степана Разина" in store_name:
+            points[store_id] = 1
+    return points
+
+def get_stock_index(client, stores):
+    """
+    Получение остатков всех товаров по точкам продаж одним отчетом
+
+    В индекс попадают только товары, которые есть хотя бы на одной точке,
+    поэтому его размер не зависит от числа отсутствующих товаров.
+
+    Returns:
+        dict: assortmentId -> (остаток на точке 1, остаток на точке 2)
+    """
+    store_points = get_store_points(stores)
+    url = 'report/stock/bystore/current'
+    params = {'stockType': 'stock'}
+    index = {}
+
+    while url:
+        data = client.get(url, params)
+        # Отчет current возвращает список, постраничные отчеты - объект с rows и meta.nextHref
+        if isinstance(data, list):
+            rows, url = data, None
+        else:
+            rows, url = data.get('rows', []), data.get('meta', {}).get('nextHref')
+        params = None
+
+        for stock in rows:
+            point = store_points.get(stock.get('storeId'))
+            quantity = int(float(stock.get('stock', 0)))
+            if point is None or quantity <= 0:
+                continue
+            points = list(index.get(stock.get('assortmentId'), (0, 0)))
+            points[point] = quantity
+            index[stock.get('assortmentId')] = tuple(points)
+
+    return index
+
+def moysklad_now():
+    """Текущее время в формате фильтров МойСклад ('YYYY-MM-DD HH:MM:SS', московское время)"""
+    return datetime.now(MOYSKLAD_TZ).strftime('%Y-%m-%d %H:%M:%S')
+
+def get_changed_stock_ids(client, changed_since):
+    """
+    Товары, остатки которых изменились с момента changed_since (параметр changedSince отчета)
+
+    Returns:
+        set: assortmentId или None, если отметки нет или она старше STOCK_CHANGES_MAX_AGE -
+             тогда сверяется весь каталог
+    """
+    if not changed_since:
+        return None
+    since = datetime.strptime(changed_since, '%Y-%m-%d %H:%M:%S') - STOCK_CHANGES_OVERLAP
+    if datetime.now(MOYSKLAD_TZ).replace(tzinfo=None) - since > STOCK_CHANGES_MAX_AGE:
+        return None
 
-def import_products_to_db():
-    """Импорт товаров из МойСклад в базу данных"""
-    products = get_products_from_moysklad()
-    if not products:
-        print("Не удалось получить товары из МойСклад")
+    url = 'report/stock/bystore/current'
+    params = {'changedSince': since.strftime('%Y-%m-%d %H:%M:%S')}
+    changed = set()
+    while url:
+        data = client.get(url, params)
+        if isinstance(data, list):
+            rows, url = data, None
+        else:
+            rows, url = data.get('rows', []), data.get('meta', {}).get('nextHref')
+        params = None
+        changed.update(row['assortmentId'] for row in rows if row.get('assortmentId'))
+    return changed
+
+def _iter_products_stock(cursor, moysklad_ids):
+    """Наличие товаров порциями по IMPORT_BATCH_SIZE: все товары или только из moysklad_ids"""
+    if moysklad_ids is not None:
+        ids = sorted(moysklad_ids)
+        for i in range(0, len(ids), IMPORT_BATCH_SIZE):
+            chunk = ids[i:i + IMPORT_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"""
+                SELECT id, moysklad_id, stock_point1, stock_point2 FROM products
+                WHERE moysklad_id IN ({placeholders})
+            """, chunk)
+            yield cursor.fetchall()
         return
 
-    # Подключение к базе данных
-    conn = mysql.connector.connect(**DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
+    last_id = 0
+    while True:
+        cursor.execute("""
+            SELECT id, moysklad_id, stock_point1, stock_point2 FROM products
+            WHERE moysklad_id IS NOT NULL AND id > %s
+            ORDER BY id LIMIT %s
+        """, (last_id, IMPORT_BATCH_SIZE))
+        products = cursor.fetchall()
+        if not products:
+            return
+        last_id = products[-1]['id']
+        yield products
+
+def sync_stock_flags(cursor, stock_index, moysklad_ids=None):
+    """
+    Обновляет наличие у товаров, данные которых не менялись, но изменились остатки.
+    Записываются только строки, где наличие действительно отличается.
+
+    Args:
+        moysklad_ids (set): Сверять только эти товары (остатки которых изменились);
+                            None - сверять весь каталог
 
-    # Определяем заголовки для всех API-запросов
-    headers = {
-        'Authorization': f'Basic {get_moysklad_token()}',
-        'Content-Type': 'application/json'
+    Returns:
+        int: Количество обновленных товаров
+    """
+    updated = 0
+    for products in _iter_products_stock(cursor, moysklad_ids):
+        changes = []
+        for product in products:
+            stock_point1, stock_point2 = stock_index.get(product['moysklad_id'], (0, 0))
+            if bool(product['stock_point1']) != (stock_point1 > 0) or bool(product['stock_point2']) != (stock_point2 > 0):
+                changes.append((stock_point1 > 0, stock_point2 > 0, product['moysklad_id']))
+        if changes:
+            cursor.executemany(
+                "UPDATE products SET stock_point1 = %s, stock_point2 = %s WHERE moysklad_id = %s",
+                changes
+            )
+            updated += len(changes)
+    return updated
+
+def get_strength(product):
+    """Крепость из характеристик товара"""
+    for char in product.get('characteristics', []):
+        if char['name'].lower() == 'крепость':
+            return char['value']
+    return None
+
+def build_product_row(product, category_id, stock_point1, stock_point2):
+    """Строка таблицы products из товара МойСклад"""
+    return {
+        'moysklad_id': product['id'],
+        'name': product['name'],
+        'description': product.get('description', ''),
+        'price': float(product.get('salePrices', [{'value': 0}])[0]['value']) / 100,
+        'category_id': category_id,
+        'stock_point1': stock_point1 > 0,
+        'stock_point2': stock_point2 > 0,
+        'strength': get_strength(product),
     }
 
+def is_product_changed(existing, row):
+    """Отличается ли товар в базе от данных МойСклад"""
+    for field in ('name', 'description', 'category_id', 'strength'):
+        if existing[field] != row[field]:
+            return True
+    if bool(existing['stock_point1']) != row['stock_point1'] or bool(existing['stock_point2']) != row['stock_point2']:
+        return True
+    return existing['price'] is None or abs(float(existing['price']) - row['price']) >= 0.005
+
+class ImportMetrics:
+    """
+    Метрики одного запуска импорта: счетчики товаров, время, записи в базу
+    и ошибки по этапам. Периодически пишет прогресс в лог и в конце формирует
+    сводку, пригодную для машинной обработки.
+    """
+
+    def __init__(self, progress_interval: float = IMPORT_PROGRESS_INTERVAL):
+        self.counters = {'fetched': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'stock_updated': 0, 'errors': 0}
+        self.durations = {}
+        self.errors = Counter()
+        self.db_writes = Counter()
+        self.progress_interval = progress_interval
+        self._started = time.perf_counter()
+        self._last_progress = self._started
+
+    @contextmanager
+    def phase(self, name):
+        """Учитывает время выполнения блока в этапе name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - started
+
+    def error(self, phase, message):
+        """Учитывает ошибку этапа; подробности пишутся в лог"""
+        self.errors[phase] += 1
+        self.counters['errors'] += 1
+        logger.error(message)
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def progress(self, api_stats, force=False):
+        """Пишет прогресс в лог не чаще раза в progress_interval секунд"""
+        now = time.perf_counter()
+        if not force and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        elapsed = self.elapsed()
+        logger.info(
+            f"Импорт: товаров {self.counters['fetched']} ({self.counters['fetched'] / elapsed:.0f}/с), "
+            f"новых {self.counters['created']}, изменено {self.counters['updated']}, "
+            f"запросов к МойСклад {api_stats['requests']}, записей в базу {sum(self.db_writes.values())}, "
+            f"ошибок {self.counters['errors']}"
+        )
+
+    def summary(self, api_stats, status='ok'):
+        """Итоговая сводка запуска"""
+        elapsed = self.elapsed()
+        return {
+            'status': status,
+            'duration': round(elapsed, 3),
+            'products_per_second': round(self.counters['fetched'] / elapsed, 1) if elapsed else 0.0,
+            'counters': dict(self.counters),
+            'phases': {name: round(seconds, 3) for name, seconds in self.durations.items()},
+            'errors_by_phase': dict(self.errors),
+            'db_writes': dict(self.db_writes),
+            'api': dict(api_stats),
+        }
+
+UPSERT_PRODUCT_SQL = """
+    INSERT INTO products (
+        moysklad_id, name, description, price,
+        category_id, stock_point1, stock_point2, strength
+    ) VALUES (
+        %(moysklad_id)s, %(name)s, %(description)s, %(price)s,
+        %(category_id)s, %(stock_point1)s, %(stock_point2)s, %(strength)s
+    )
+    ON DUPLICATE KEY UPDATE
+        name = VALUES(name), description = VALUES(description), price = VALUES(price),
+        category_id = VALUES(category_id), stock_point1 = VALUES(stock_point1),
+        stock_point2 = VALUES(stock_point2), strength = VALUES(strength)
+"""
+
+def load_existing_products(cursor, moysklad_ids):
+    """Текущие данные товаров по списку moysklad_id одним запросом"""
+    if not moysklad_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(moysklad_ids))
+    cursor.execute(f"""
+        SELECT moysklad_id, name, description, price, category_id,
+               stock_point1, stock_point2, strength
+        FROM products WHERE moysklad_id IN ({placeholders})
+    """, list(moysklad_ids))
+    return {row['moysklad_id']: row for row in cursor.fetchall()}
+
+def upsert_products(cursor, conn, rows):
+    """
+    Пакетно записывает товары (INSERT ... ON DUPLICATE KEY UPDATE) с коммитом на пакет.
+    Если пакет не записался, товары пишутся по одному, чтобы ошибка одной строки
+    не мешала остальным.
+
+    Returns:
+        list: Пары (строка, ошибка) для товаров, которые записать не удалось
+    """
+    if not rows:
+        return []
     try:
-        # Получаем существующие категории
-        cursor.execute("SELECT id, name FROM categories")
-        categories = {cat['name']: cat['id'] for cat in cursor.fetchall()}
+        cursor.executemany(UPSERT_PRODUCT_SQL, rows)
+        conn.commit()
+        return []
+    except mysql.connector.Error:
+        conn.rollback()
 
-        # Получаем информацию о складах
-        stores_url = "https://api.moysklad.ru/api/remap/1.2/entity/store"
-        stores_response = requests.get(stores_url, headers=headers)
-        stores = {}
-        if stores_response.status_code == 200:
-            for store in stores_response.json()['rows']:
-                stores[store['id']] = store['name']
-                print(f"Найден склад: {store['name']} (ID: {store['id']})")
+    failed = []
+    for row in rows:
+        try:
+            cursor.execute(UPSERT_PRODUCT_SQL, row)
+            conn.commit()
+        except mysql.connector.Error as e:
+            conn.rollback()
+            failed.append((row, e))
+    return failed
 
-        for product in products:
+def prefetch_pages(client, updated_since=None, depth=IMPORT_PREFETCH_PAGES):
+    """
+    Загружает страницы товаров (и их папки) в фоновом потоке
+
+    Загрузка опережает запись не более чем на depth страниц: когда очередь
+    заполнена, поток ждет, пока страницы будут записаны. Поэтому в памяти
+    одновременно находится не больше depth + 1 страниц независимо от размера каталога.
+
+    Yields:
+        list: Страница товаров МойСклад
+    """
+    pages = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
             try:
-                # Получаем название товара
-                product_name = product['name']
-                print(f"\nОбработка товара: {product_name}")
-
-                # Получаем полный путь категории
-                category_path = get_full_category_path(product, headers)
-                print(f"Полный путь категории: {' / '.join(category_path)}")
-                
-                # Создаем категории если они не существуют и получаем ID последней категории
-                category_id = ensure_category_exists(cursor, conn, category_path, categories)
-
-                # Получаем остатки на складах
-                stock_data = get_product_stock(product['id'], headers)
-                
-                # Определяем наличие на складах
-                stock_point1 = 0
-                stock_point2 = 0
-                
-                if isinstance(stock_data, list):
-                    for stock in stock_data:
-                        store_id = stock.get('storeId', '')
-                        if store_id in stores:
-                            store_name = stores[store_id]
-                            stock_quantity = float(stock.get('stock', 0))
-                            print(f"Склад: {store_name}, остаток: {stock_quantity}")
-                            
-                            if "1 склад" in store_name or "Дзержинского" in store_name:
-                                stock_point1 = int(stock_quantity)
-                            elif "2 склад" in store_name or "Степана Разина" in store_name:
-                                stock_point2 = int(stock_quantity)
-
-                print(f"Итоговые остатки:")
-                print(f"1 склад (Дзержинского): {stock_point1}")
-                print(f"2 склад (Степана Разина): {stock_point2}")
-
-                # Получаем крепость из характеристик товара
-                strength = None
-                if 'characteristics' in product:
-                    for char in product['characteristics']:
-                        if char['name'].lower() == 'крепость':
-                            strength = char['value']
-                            print(f"Крепость: {strength}")
-
-                # Проверяем, существует ли товар
-                cursor.execute(
-                    "SELECT id FROM products WHERE moysklad_id = %s",
-                    (product['id'],)
-                )
-                existing_product = cursor.fetchone()
-
-                if existing_product:
-                    # Обновляем существующий товар
-                    cursor.execute("""
-                        UPDATE products 
-                        SET name = %s, description = %s, price = %s, 
-                            category_id = %s, stock_point1 = %s, stock_point2 = %s,
-                            strength = %s
-                        WHERE moysklad_id = %s
-                    """, (
-                        product_name,
-                        product.get('description', ''),
-                        float(product.get('salePrices', [{'value': 0}])[0]['value']) / 100,
-                        category_id,
-                        stock_point1 > 0,
-                        stock_point2 > 0,
-                        strength,
-                        product['id']
-                    ))
-                    print("Товар обновлен в базе данных")
-                else:
-                    # Добавляем новый товар
-                    cursor.execute("""
-                        INSERT INTO products (
-                            moysklad_id, name, description, price, 
-                            category_id, stock_point1, stock_point2, strength
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        product['id'],
-                        product_name,
-                        product.get('description', ''),
-                        float(product.get('salePrices', [{'value': 0}])[0]['value']) / 100,
-                        category_id,
-                        stock_point1 > 0,
-                        stock_point2 > 0,
-                        strength
-                    ))
-                    print("Товар добавлен в базу данных")
-
-                conn.commit()
-                print(f"Наличие: 1 склад (Дзержинского) - {stock_point1} шт., 2 склад (Степана Разина) - {stock_point2} шт.")
-                print(f"В базе данных: 1 склад - {stock_point1 > 0}, 2 склад - {stock_point2 > 0}")
-                print("------------------")
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in iter_product_pages(client, updated_since):
+                # Папки товаров без pathName загружаем заранее и параллельно
+                client.prefetch_folders(filter(None, map(get_folder_href, page)))
+                if not put(page):
+                    return
+        except Exception as e:
+            put(e)
+        else:
+            put(done)
+
+    thread = threading.Thread(target=produce, name='moysklad-pages', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def import_page(cursor, conn, client, page, categories, stock_index, metrics):
+    """Преобразует страницу товаров, создает недостающие категории и записывает изменения"""
+    # Преобразование товаров МойСклад в строки таблицы products
+    with metrics.phase('transform'):
+        category_paths = {product['id']: get_full_category_path(product, client) for product in page}
+
+    # Недостающие категории всей страницы создаются одним пакетом
+    with metrics.phase('categories'):
+        try:
+            metrics.db_writes['categories'] += categories.ensure_paths(cursor, conn, category_paths.values())
+        except mysql.connector.Error as e:
+            metrics.error('categories', f"Ошибка при создании категорий: {str(e)}")
+            conn.rollback()
 
+    rows = []
+    with metrics.phase('transform'):
+        for product in page:
+            try:
+                category_id = categories.resolve(category_paths[product['id']])
+                if category_id is None:
+                    raise ValueError(f"категория {' / '.join(category_paths[product['id']])} не создана")
+                # Остатки берем из общего отчета, без запроса на каждый товар
+                stock_point1, stock_point2 = stock_index.get(product['id'], (0, 0))
+                rows.append(build_product_row(product, category_id, stock_point1, stock_point2))
             except Exception as e:
-                print(f"Ошибка при обработке товара {product.get('name', 'Неизвестный товар')}: {str(e)}")
-                print(f"Детали ошибки: {e.__class__.__name__}")
-                continue
+                metrics.error('transform', f"Ошибка при обработке товара {product.get('name', 'Неизвестный товар')}: {str(e)}")
+
+    # Записываем только изменившиеся товары
+    with metrics.phase('db_read'):
+        existing = load_existing_products(cursor, [row['moysklad_id'] for row in rows])
+    changed = []
+    for row in rows:
+        current = existing.get(row['moysklad_id'])
+        if current and not is_product_changed(current, row):
+            metrics.counters['unchanged'] += 1
+        else:
+            changed.append(row)
+
+    with metrics.phase('db_write'):
+        failed = []
+        for i in range(0, len(changed), IMPORT_BATCH_SIZE):
+            failed += upsert_products(cursor, conn, changed[i:i + IMPORT_BATCH_SIZE])
+
+    failed_ids = {row['moysklad_id'] for row, _ in failed}
+    for row, e in failed:
+        metrics.error('db_write', f"Ошибка при записи товара {row['name']}: {str(e)}")
+    for row in changed:
+        if row['moysklad_id'] in failed_ids:
+            continue
+        metrics.db_writes['products'] += 1
+        action = 'updated' if row['moysklad_id'] in existing else 'created'
+        metrics.counters[action] += 1
+        logger.debug(f"Товар {row['name']} ({row['moysklad_id']}): {action}")
+
+def record_sync_run(cursor, name, summary):
+    """Сохраняет итоги запуска синхронизации в историю (sync_runs)"""
+    counters = summary['counters']
+    cursor.execute("""
+        INSERT INTO sync_runs (
+            name, started_at, finished_at, duration, status,
+            fetched, created, updated, stock_updated, errors, summary
+        ) VALUES (%s, %s, NOW(), %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        name, datetime.now() - timedelta(seconds=summary['duration']), summary['duration'], summary['status'],
+        counters['fetched'], counters['created'], counters['updated'],
+        counters['stock_updated'], counters['errors'], json.dumps(summary, ensure_ascii=False)
+    ))
+
+def sync_products(cursor, conn, client, full, metrics):
+    """
+    Один проход синхронизации товаров (вызывается под блокировкой импорта)
 
+    Returns:
+        str: 'ok' или 'partial', если часть товаров записать не удалось
+    """
+    counters = metrics.counters
+    updated_since = None if full else load_sync_watermark(cursor, PRODUCTS_SYNC)
+    if updated_since:
+        logger.info(f"Дельта-синхронизация: товары, измененные с {updated_since}")
+    else:
+        logger.info("Полная синхронизация каталога")
+    watermark = updated_since
+    stock_since = None if full else load_sync_watermark(cursor, STOCK_SYNC)
+    # Отметка ставится до чтения остатков, чтобы не пропустить изменения во время импорта
+    stock_checked_at = moysklad_now()
+
+    # Иерархия категорий загружается один раз на весь запуск
+    categories = CategoryIndex(cursor)
+
+    with metrics.phase('fetch'):
+        # Получаем информацию о складах
+        stores = {}
+        for store in client.iter_rows('entity/store'):
+            stores[store['id']] = store['name']
+            logger.debug(f"Найден склад: {store['name']} (ID: {store['id']})")
+
+        # Остатки всех товаров одним отчетом: assortmentId -> (точка 1, точка 2)
+        stock_index = get_stock_index(client, stores)
+        logger.info(f"Складов: {len(stores)}, товаров в наличии: {len(stock_index)}")
+
+        # Товары с изменившимися остатками - только их наличие сверяется с базой
+        changed_stock = get_changed_stock_ids(client, stock_since)
+        if changed_stock is not None:
+            logger.info(f"Остатки изменились у {len(changed_stock)} товаров с {stock_since}")
+
+    pages = prefetch_pages(client, updated_since)
+    try:
+        while True:
+            # Время ожидания следующей страницы от загрузчика
+            with metrics.phase('fetch'):
+                page = next(pages, None)
+            if page is None:
+                break
+            counters['fetched'] += len(page)
+
+            import_page(cursor, conn, client, page, categories, stock_index, metrics)
+
+            # Отметка - самое позднее время изменения среди обработанных товаров
+            for product in page:
+                updated = (product.get('updated') or '')[:19]
+                if updated and (watermark is None or updated > watermark):
+                    watermark = updated
+
+            metrics.progress(client.stats)
+    finally:
+        pages.close()
+
+    with metrics.phase('stock'):
+        # Товары, у которых изменились только остатки, в дельту не попадают
+        counters['stock_updated'] = sync_stock_flags(cursor, stock_index, changed_stock)
+        metrics.db_writes['stock'] += counters['stock_updated']
+        save_sync_state(cursor, STOCK_SYNC, stock_checked_at, f"stock_updated={counters['stock_updated']}")
+        conn.commit()
+
+    if counters['created'] or counters['updated'] or counters['stock_updated']:
+        # Увеличиваем версию каталога, чтобы бот сбросил кэш
+        bump_catalog_version(cursor)
+
+    # При ошибках отметку не сдвигаем, чтобы следующий запуск повторил проблемные товары
+    status = 'ok'
+    if counters['errors']:
+        watermark = updated_since
+        status = 'partial'
+    save_sync_state(cursor, PRODUCTS_SYNC, watermark,
+                    ', '.join(f"{key}={value}" for key, value in counters.items()))
+    conn.commit()
+    return status
+
+def import_products_to_db(full=False, client=None):
+    """
+    Синхронизация товаров из МойСклад в базу данных
+
+    По умолчанию выполняется дельта-синхронизация: запрашиваются только товары,
+    измененные после сохраненной отметки (sync_state), и в базу записываются
+    только действительно изменившиеся строки - пакетами по IMPORT_BATCH_SIZE.
+    Страницы обрабатываются потоком: пока одна записывается, следующие
+    загружаются (не больше IMPORT_PREFETCH_PAGES вперед).
+
+    Одновременно выполняется только один импорт (блокировка GET_LOCK в MySQL),
+    повторный запуск пропускается. Итоги каждого запуска сохраняются в sync_runs.
+
+    Args:
+        full (bool): Игнорировать отметку и обработать весь каталог
+        client (MoySkladClient): Клиент МойСклад (по умолчанию создается из настроек)
+
+    Returns:
+        dict: Сводка запуска (см. ImportMetrics.summary), status - ok/partial/failed/skipped
+    """
+    # Подключение к базе данных
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor(dictionary=True)
+
+    # Один клиент на запуск: общие соединения, лимиты и кэш папок
+    own_client = client is None
+    if own_client:
+        client = create_moysklad_client()
+
+    metrics = ImportMetrics()
+    locked = False
+
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (IMPORT_LOCK,))
+        locked = cursor.fetchone()['locked'] == 1
+        if locked:
+            status = sync_products(cursor, conn, client, full, metrics)
+        else:
+            status = 'skipped'
+            logger.warning("Импорт товаров уже выполняется, запуск пропущен")
     except Exception as e:
-        print(f"Ошибка при импорте товаров: {str(e)}")
+        status = 'failed'
+        metrics.error('import', f"Ошибка при импорте товаров: {str(e)}")
         conn.rollback()
+
+    metrics.progress(client.stats, force=True)
+    summary = metrics.summary(client.stats, status)
+    try:
+        if status != 'skipped':
+            record_sync_run(cursor, PRODUCTS_SYNC, summary)
+            conn.commit()
+    except mysql.connector.Error as e:
+        logger.error(f"Ошибка при сохранении итогов импорта: {str(e)}")
     finally:
+        if locked:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (IMPORT_LOCK,))
+            cursor.fetchone()
         cursor.close()
         conn.close()
+        if own_client:
+            client.close()
+
+    # Одна строка JSON с итогами - для разбора логов и мониторинга
+    logger.info(f"IMPORT_SUMMARY {json.dumps(summary, ensure_ascii=False)}")
+    return summary
 
 if __name__ == '__main__':
-    print("Начинаем импорт товаров из МойСклад...")
-    import_products_to_db()
-    print("Импорт завершен") 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Синхронизация товаров из МойСклад")
+    parser.add_argument('--full', action='store_true', help="Полная синхронизация вместо дельты")
+    parser.add_argument('--verbose', action='store_true', help="Подробный лог по каждому товару (DEBUG)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else getattr(logging, LOG_LEVEL),
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    summary = import_products_to_db(full=args.full)
+    if summary['status'] == 'failed':
+        sys.exit(1)
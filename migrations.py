@@ -0,0 +1,322 @@
+import argparse
+import logging
+import mysql.connector
+from mysql.connector import errorcode
+from config import DB_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Имя блокировки, чтобы два процесса не применяли миграции одновременно
+MIGRATIONS_LOCK = 'puff_smoke_migrations'
+
+# MySQL фиксирует каждый DDL-запрос сразу, поэтому после ошибки в середине миграции
+# часть ее запросов уже выполнена, а версия не записана. При повторном запуске
+# такие запросы падают с этими ошибками - значит, шаг уже сделан, и его можно пропустить.
+ALREADY_APPLIED_ERRORS = {
+    errorcode.ER_TABLE_EXISTS_ERROR,  # Table already exists
+    errorcode.ER_DUP_FIELDNAME,       # Duplicate column name
+    errorcode.ER_DUP_KEYNAME,         # Duplicate key name
+}
+
+# Версионированные миграции схемы: (версия, описание, список SQL-запросов).
+# Уже примененные миграции не изменяются - для изменений схемы добавляется новая версия.
+MIGRATIONS = [
+    (1, 'Базовая схема', [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            telegram_id BIGINT UNIQUE NOT NULL,
+            username VARCHAR(255),
+            nickname VARCHAR(255),
+            language VARCHAR(2) DEFAULT 'ru',
+            is_subscribed BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            parent_id INT NULL,
+            CONSTRAINT fk_parent
+                FOREIGN KEY (parent_id)
+                REFERENCES categories(id)
+                ON DELETE CASCADE
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            moysklad_id VARCHAR(255) UNIQUE,
+            name VARCHAR(255) NOT NULL,
+            description TEXT,
+            price DECIMAL(10, 2),
+            category_id INT,
+            stock_point1 BOOLEAN DEFAULT FALSE,
+            stock_point2 BOOLEAN DEFAULT FALSE,
+            strength VARCHAR(50),
+            FOREIGN KEY (category_id)
+                REFERENCES categories(id)
+                ON DELETE SET NULL
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS orders (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            username VARCHAR(255),
+            phone VARCHAR(20),
+            address TEXT,
+            delivery_type VARCHAR(50),
+            payment_type VARCHAR(50),
+            total_amount DECIMAL(10, 2),
+            status VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            order_id INT,
+            product_id INT,
+            quantity INT,
+            price DECIMAL(10, 2),
+            FOREIGN KEY (order_id)
+                REFERENCES orders(id)
+                ON DELETE CASCADE,
+            FOREIGN KEY (product_id)
+                REFERENCES products(id)
+                ON DELETE SET NULL
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id BIGINT,
+            text TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status ENUM('new', 'read', 'answered') DEFAULT 'new'
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS carts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id BIGINT,
+            product_id INT,
+            quantity INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            status ENUM('active', 'abandoned', 'completed') DEFAULT 'active'
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (2, 'Версия каталога для инвалидации кэша', [
+        """
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id TINYINT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """,
+        "INSERT IGNORE INTO catalog_version (id, version) VALUES (1, 0)",
+    ]),
+    (3, 'Индекс для постраничного просмотра товаров категории', [
+        "CREATE INDEX idx_products_category_name ON products (category_id, name, id)",
+    ]),
+    (4, 'Состояние синхронизации с МойСклад', [
+        """
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name VARCHAR(64) PRIMARY KEY,
+            watermark VARCHAR(32) NULL,
+            last_run_at TIMESTAMP NULL,
+            last_status VARCHAR(255) NULL
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (5, 'История запусков синхронизации', [
+        """
+        CREATE TABLE IF NOT EXISTS sync_runs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(64) NOT NULL,
+            started_at TIMESTAMP NULL,
+            finished_at TIMESTAMP NULL,
+            duration FLOAT NULL,
+            status VARCHAR(16) NOT NULL,
+            fetched INT NOT NULL DEFAULT 0,
+            created INT NOT NULL DEFAULT 0,
+            updated INT NOT NULL DEFAULT 0,
+            stock_updated INT NOT NULL DEFAULT 0,
+            errors INT NOT NULL DEFAULT 0,
+            summary TEXT NULL,
+            INDEX idx_sync_runs_name_started (name, started_at)
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (6, 'Рассылки постов канала с сохранением прогресса', [
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            from_chat_id BIGINT NOT NULL,
+            message_id INT NOT NULL,
+            status ENUM('running', 'done', 'failed') NOT NULL DEFAULT 'running',
+            last_user_id INT NOT NULL DEFAULT 0,
+            sent INT NOT NULL DEFAULT 0,
+            failed INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP NULL,
+            UNIQUE KEY uq_broadcasts_message (from_chat_id, message_id),
+            INDEX idx_broadcasts_status (status)
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (7, 'Статус доставки сообщений пользователям', [
+        """
+        ALTER TABLE users
+            ADD COLUMN delivery_status ENUM('active', 'blocked', 'deactivated') NOT NULL DEFAULT 'active',
+            ADD COLUMN last_delivery_error VARCHAR(255) NULL,
+            ADD COLUMN delivery_checked_at TIMESTAMP NULL,
+            ADD INDEX idx_users_delivery_status (delivery_status, id)
+        """,
+        "ALTER TABLE broadcasts ADD COLUMN skipped INT NOT NULL DEFAULT 0 AFTER failed",
+    ]),
+    (8, 'Время последней проверки подписки', [
+        "ALTER TABLE users ADD COLUMN subscription_checked_at TIMESTAMP NULL AFTER is_subscribed",
+    ]),
+    (9, 'Дневные итоги для статистики магазина', [
+        """
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day DATE PRIMARY KEY,
+            orders INT NOT NULL DEFAULT 0,
+            completed_orders INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stats_daily_products (
+            day DATE NOT NULL,
+            product_id INT NOT NULL,
+            units INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    # products(category_id) уже покрыт idx_products_category_name (версия 3).
+    # Индексы order_items(order_id) и categories(parent_id) заменяют собой
+    # индексы, которые InnoDB создал для внешних ключей.
+    (10, 'Индексы для частых запросов', [
+        "CREATE INDEX idx_orders_user_created ON orders (user_id, created_at)",
+        "CREATE INDEX idx_orders_status_created ON orders (status, created_at)",
+        "CREATE INDEX idx_orders_created ON orders (created_at)",
+        "CREATE INDEX idx_order_items_order_product ON order_items (order_id, product_id, quantity)",
+        "CREATE INDEX idx_categories_parent_name ON categories (parent_id, name)",
+        "CREATE INDEX idx_carts_status_updated ON carts (status, last_updated)",
+        "CREATE INDEX idx_feedback_status_created ON feedback (status, created_at)",
+        "CREATE INDEX idx_users_created ON users (created_at)",
+        "CREATE INDEX idx_users_username ON users (username)",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+
+def _execute_step(cursor, version, statement):
+    """Выполняет запрос миграции; запрос, уже выполненный прерванным запуском, пропускается"""
+    try:
+        cursor.execute(statement)
+    except mysql.connector.Error as err:
+        if err.errno not in ALREADY_APPLIED_ERRORS:
+            raise
+        logger.warning(f"Миграция {version}: шаг уже выполнен ранее, пропускаем ({err.msg})")
+
+def get_applied_versions(cursor) -> set:
+    """Возвращает множество уже примененных версий схемы"""
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def run_migrations(target_version: int = None) -> int:
+    """
+    Применяет недостающие миграции до target_version (по умолчанию до последней)
+
+    Returns:
+        int: Текущая версия схемы после применения
+    """
+    target_version = target_version or LATEST_VERSION
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (MIGRATIONS_LOCK,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Не удалось получить блокировку для применения миграций")
+
+        try:
+            _ensure_version_table(cursor)
+            applied = get_applied_versions(cursor)
+
+            for version, name, statements in MIGRATIONS:
+                if version in applied or version > target_version:
+                    continue
+                logger.info(f"Применение миграции {version}: {name}")
+                for statement in statements:
+                    _execute_step(cursor, version, statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                conn.commit()
+                applied.add(version)
+
+            current_version = max(applied) if applied else 0
+            logger.info(f"Версия схемы базы данных: {current_version}")
+            return current_version
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATIONS_LOCK,))
+            cursor.fetchone()
+
+    except mysql.connector.Error as err:
+        logger.error(f"Ошибка при применении миграций: {err}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def show_status():
+    """Выводит список миграций и их статус"""
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+
+    try:
+        _ensure_version_table(cursor)
+        applied = get_applied_versions(cursor)
+        for version, name, _ in MIGRATIONS:
+            mark = '✅' if version in applied else '⏳'
+            print(f"{mark} {version}: {name}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Миграции схемы базы данных")
+    parser.add_argument('command', nargs='?', default='migrate', choices=['migrate', 'status'])
+    parser.add_argument('--target', type=int, default=None, help="Версия схемы, до которой применять миграции")
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        show_status()
+    else:
+        print("Начинаем применение миграций...")
+        version = run_migrations(args.target)
+        print(f"Миграции применены, версия схемы: {version}")
@@ -1,26 +1,203 @@
 import requests
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator
+from requests.adapters import HTTPAdapter
+from config import (
+    MOYSKLAD_API_URL, MOYSKLAD_PAGE_SIZE, MOYSKLAD_CONCURRENCY,
+    MOYSKLAD_RATE_LIMIT, MOYSKLAD_RATE_PERIOD, MOYSKLAD_MAX_RETRIES, MOYSKLAD_TIMEOUT
+)
 
 logger = logging.getLogger(__name__)
 
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class MoySkladError(Exception):
+    """Ошибка API МойСклад"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class TokenBucket:
+    """Ограничитель частоты запросов: не более capacity запросов за period секунд"""
+
+    def __init__(self, capacity: int = MOYSKLAD_RATE_LIMIT, period: float = MOYSKLAD_RATE_PERIOD):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Ждет, пока не освободится токен"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+# Лимиты МойСклад действуют на весь аккаунт, поэтому все клиенты процесса
+# (синхронизация каталога, вебхуки) по умолчанию делят один ограничитель
+# частоты и одно ограничение параллельных запросов
+shared_rate_limiter = TokenBucket()
+shared_semaphore = threading.BoundedSemaphore(MOYSKLAD_CONCURRENCY)
+
+class MoySkladClient:
+    """
+    Общий HTTP-клиент МойСклад.
+
+    Держит пул keep-alive соединений (requests.Session), ограничивает число
+    параллельных запросов и их частоту под лимиты МойСклад (общие для всех
+    клиентов процесса), повторяет запросы при 429/5xx и сетевых ошибках
+    с экспоненциальной задержкой и кэширует папки товаров на время жизни
+    клиента (одного запуска импорта или одной пачки вебхуков).
+    """
+
+    def __init__(self, login: str, password: str, base_url: str = MOYSKLAD_API_URL,
+                 concurrency: int = MOYSKLAD_CONCURRENCY, max_retries: int = MOYSKLAD_MAX_RETRIES,
+                 timeout: float = MOYSKLAD_TIMEOUT, rate_limiter: TokenBucket = None,
+                 semaphore: threading.BoundedSemaphore = None):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or shared_rate_limiter
+        self.stats = Counter()
+
+        self.session = requests.Session()
+        self.session.auth = (login, password)
+        self.session.headers.update({'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'})
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._semaphore = semaphore or shared_semaphore
+        self._executor = None
+        self._folders = {}
+        self._folders_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Закрывает соединения и пул потоков"""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
+
+    def _url(self, path_or_url: str) -> str:
+        if path_or_url.startswith('http://') or path_or_url.startswith('https://'):
+            return path_or_url
+        return f"{self.base_url}/{path_or_url.lstrip('/')}"
+
+    def _retry_delay(self, response, attempt: int) -> float:
+        if response is not None:
+            # МойСклад сообщает, через сколько миллисекунд можно повторить запрос
+            retry_after_ms = response.headers.get('X-Lognex-Retry-TimeInterval') or response.headers.get('X-Lognex-Retry-After')
+            if retry_after_ms:
+                return float(retry_after_ms) / 1000
+            if response.headers.get('Retry-After'):
+                return float(response.headers['Retry-After'])
+        return min(0.5 * 2 ** attempt, 30)
+
+    def get(self, path_or_url: str, params: dict = None) -> Any:
+        """GET-запрос с ограничением частоты и повторами; возвращает разобранный JSON"""
+        url = self._url(path_or_url)
+        for attempt in range(self.max_retries + 1):
+            response = None
+            self.rate_limiter.acquire()
+            with self._semaphore:
+                self.stats['requests'] += 1
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt == self.max_retries:
+                        raise MoySkladError(f"Ошибка соединения с МойСклад: {e}") from e
+                    logger.warning(f"Ошибка соединения с МойСклад ({e}), повтор {attempt + 1}")
+
+            if response is not None:
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    raise MoySkladError(
+                        f"Ошибка МойСклад {response.status_code}: {response.text[:500]}",
+                        response.status_code
+                    )
+                logger.warning(f"МойСклад ответил {response.status_code}, повтор {attempt + 1}")
+
+            self.stats['retries'] += 1
+            time.sleep(self._retry_delay(response, attempt))
+
+    def iter_pages(self, path: str, params: dict = None) -> Iterator[List[dict]]:
+        """Постранично отдает rows, следуя по meta.nextHref"""
+        params = dict(params or {})
+        params.setdefault('limit', MOYSKLAD_PAGE_SIZE)
+        url = path
+        while url:
+            data = self.get(url, params)
+            yield data.get('rows', [])
+            # nextHref уже содержит все параметры запроса
+            url = data.get('meta', {}).get('nextHref')
+            params = None
+
+    def iter_rows(self, path: str, params: dict = None) -> Iterator[dict]:
+        """Все строки коллекции по всем страницам"""
+        for rows in self.iter_pages(path, params):
+            yield from rows
+
+    def get_folder(self, href: str) -> dict:
+        """Папка товаров по ссылке meta.href (кэшируется на время жизни клиента)"""
+        with self._folders_lock:
+            if href in self._folders:
+                self.stats['folder_cache_hits'] += 1
+                return self._folders[href]
+        self.stats['folder_cache_misses'] += 1
+        folder = self.get(href)
+        with self._folders_lock:
+            self._folders[href] = folder
+        return folder
+
+    def prefetch_folders(self, hrefs):
+        """Параллельно загружает в кэш папки, которых там еще нет"""
+        with self._folders_lock:
+            missing = {href for href in hrefs if href not in self._folders}
+        if not missing:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='moysklad')
+        for href, result in zip(missing, self._executor.map(self._fetch_folder_safe, missing)):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при получении папки {href}: {result}")
+
+    def _fetch_folder_safe(self, href):
+        try:
+            return self.get_folder(href)
+        except MoySkladError as e:
+            return e
+
 class MoySklad:
     def __init__(self, login: str, password: str):
-        self.base_url = "https://online.moysklad.ru/api/remap/1.2"
-        self.auth = (login, password)
-        
+        self.client = MoySkladClient(login, password)
+
     def get_all_products(self) -> List[Dict[str, Any]]:
         """Получить все товары из МойСклад"""
         try:
-            response = requests.get(
-                f"{self.base_url}/entity/product",
-                auth=self.auth
-            )
-            response.raise_for_status()
-            data = response.json()
-            
             products = []
-            for item in data.get('rows', []):
+            for item in self.client.iter_rows('entity/product'):
                 product = {
                     'name': item.get('name'),
                     'description': item.get('description', ''),
@@ -30,9 +207,9 @@ class MoySklad:
                     # Добавьте дополнительные поля, которые вам нужны
                 }
                 products.append(product)
-            
+
             return products
-            
+
         except Exception as e:
             logger.error(f"Ошибка при получении товаров из МойСклад: {str(e)}")
             return []
@@ -40,15 +217,12 @@ class MoySklad:
     def get_stock_info(self, product_id: str) -> int:
         """Получить информацию о наличии товара"""
         try:
-            response = requests.get(
-                f"{self.base_url}/entity/product/{product_id}/positions",
-                auth=self.auth
+            data = self.client.get(
+                'report/stock/bystore/current',
+                params={'filter': f'assortmentId={product_id}'}
             )
-            response.raise_for_status()
-            data = response.json()
-            
-            return data.get('quantity', 0)
-            
+            return sum(float(row.get('stock', 0)) for row in data)
+
         except Exception as e:
             logger.error(f"Ошибка при получении остатков товара {product_id}: {str(e)}")
-            return 0 
\ No newline at end of file
+            return 0
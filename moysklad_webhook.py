@@ -0,0 +1,388 @@
+import argparse
+import hmac
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import Request, urlopen
+from config import (
+    MOYSKLAD_API_URL, MOYSKLAD_WEBHOOK_PORT, MOYSKLAD_WEBHOOK_TOKEN, MOYSKLAD_WEBHOOK_DEBOUNCE
+)
+from database import Database, bump_catalog_version, notify_catalog_listeners
+from import_products import (
+    CategoryIndex, create_moysklad_client, get_full_category_path, get_store_points,
+    build_product_row, upsert_products
+)
+
+# Прием вебхуков МойСклад об изменении товаров и остатков.
+# Запуск вместе с ботом: MOYSKLAD_WEBHOOK_PORT=8081 (адрес вебхука в МойСклад:
+#   https://<host>:8081/moysklad/webhook?token=<MOYSKLAD_WEBHOOK_TOKEN>)
+# Без MOYSKLAD_WEBHOOK_TOKEN прием вебхуков не запускается.
+# Проверка на записанных запросах:
+#   python moysklad_webhook.py apply webhook_samples/*.json
+#   python moysklad_webhook.py replay webhook_samples/*.json --url http://127.0.0.1:8081/moysklad/webhook
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = '/moysklad/webhook'
+# ID сущностей МойСклад (UUID); все остальное в ссылках вебхука отклоняется
+ENTITY_ID_RE = re.compile(r'^[\w-]+$')
+# Сколько товаров перечислять в одном фильтре отчета по остаткам
+STOCK_FILTER_SIZE = 100
+
+def api_path(href, base_url=MOYSKLAD_API_URL):
+    """
+    Путь запроса относительно корня API или None, если ссылка ведет не в API из base_url
+
+    Запросы по ссылкам из вебхука идут с логином и паролем МойСклад, поэтому
+    ссылки с другой схемой, хостом, портом или корнем API не принимаются.
+    """
+    parsed, base = urlparse(href), urlparse(base_url)
+    if (parsed.scheme, parsed.hostname, parsed.port) != (base.scheme, base.hostname, base.port):
+        return None
+    if parsed.username or parsed.password:
+        return None
+    root = base.path.rstrip('/') + '/'
+    if not parsed.path.startswith(root):
+        return None
+    path = parsed.path[len(root):]
+    return f"{path}?{parsed.query}" if parsed.query else path
+
+def parse_webhook(payload, base_url=MOYSKLAD_API_URL):
+    """
+    Разбирает тело вебхука МойСклад
+
+    Returns:
+        tuple: (ID измененных товаров, ID удаленных товаров, пути отчетов об изменении остатков)
+    """
+    updated, deleted, stock_reports = set(), set(), set()
+    for event in payload.get('events', []):
+        meta = event.get('meta', {})
+        if meta.get('type') != 'product' or not meta.get('href'):
+            continue
+        product_id = meta['href'].rstrip('/').rsplit('/', 1)[-1]
+        if not ENTITY_ID_RE.match(product_id):
+            logger.warning(f"Вебхук МойСклад: некорректная ссылка на товар {meta['href']!r}")
+            continue
+        if event.get('action') == 'DELETE':
+            deleted.add(product_id)
+            updated.discard(product_id)
+        else:
+            updated.add(product_id)
+            deleted.discard(product_id)
+    # Вебхук на изменение остатков присылает ссылку на отчет с измененными позициями
+    if payload.get('reportUrl'):
+        report = api_path(payload['reportUrl'], base_url)
+        if report is None:
+            logger.warning(f"Вебхук МойСклад: ссылка на отчет не ведет в API МойСклад: {payload['reportUrl']!r}")
+        else:
+            stock_reports.add(report)
+    return updated, deleted, stock_reports
+
+def stock_points_from_report(rows, store_points, assortment_ids=()):
+    """
+    Остатки на точках продаж по строкам отчета по складам, запрошенного по
+    всем складам для товаров assortment_ids. Склада нет в отчете - остаток на
+    нем нулевой, поэтому для товаров, которых нет в отчете совсем, возвращается (0, 0).
+
+    Returns:
+        dict: assortmentId -> (остаток на точке 1, остаток на точке 2)
+    """
+    points = {assortment_id: (0, 0) for assortment_id in assortment_ids}
+    for row in rows:
+        assortment_id = row.get('assortmentId')
+        if not assortment_id:
+            continue
+        current = list(points.get(assortment_id, (0, 0)))
+        point = store_points.get(row.get('storeId'))
+        if point is not None:
+            current[point] = max(int(float(row.get('stock', 0))), 0)
+        points[assortment_id] = tuple(current)
+    return points
+
+class MoySkladWebhookProcessor:
+    """
+    Применяет события вебхуков МойСклад к таблице products.
+
+    События накапливаются и применяются пачкой через debounce секунд после
+    первого события пачки: серия изменений одного товара превращается в одно
+    обновление, а массовое изменение остатков - в один запрос к отчету
+    и одну пакетную запись. После записи сбрасывается кэш каталога.
+
+    На каждую пачку создается свой клиент МойСклад (кэш папок живет одну
+    пачку), лимиты запросов он делит с синхронизацией каталога.
+    """
+
+    def __init__(self, client_factory=create_moysklad_client, debounce: float = MOYSKLAD_WEBHOOK_DEBOUNCE,
+                 base_url: str = MOYSKLAD_API_URL):
+        self.client_factory = client_factory
+        self.base_url = base_url
+        self.debounce = debounce
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._updated, self._deleted, self._stock_reports = set(), set(), set()
+        self._thread = None
+
+    def start(self):
+        """Запускает фоновый поток применения событий"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='moysklad-webhook', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Применяет накопленные события и останавливает поток"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def submit(self, payload):
+        """Добавляет события вебхука в текущую пачку"""
+        updated, deleted, stock_reports = parse_webhook(payload, self.base_url)
+        with self._lock:
+            self._updated -= deleted
+            self._deleted -= updated
+            self._updated |= updated
+            self._deleted |= deleted
+            self._stock_reports |= stock_reports
+            self.stats['events'] += len(updated) + len(deleted) + len(stock_reports)
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            if self._stop.is_set():
+                break
+            # Ждем, пока соберется вся серия событий
+            time.sleep(self.debounce)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Ошибка при применении вебхуков МойСклад: {e}")
+
+    def flush(self):
+        """
+        Применяет накопленные события
+
+        Returns:
+            dict: Количество обновленных товаров и остатков
+        """
+        with self._lock:
+            updated, deleted, stock_reports = self._updated, self._deleted, self._stock_reports
+            self._updated, self._deleted, self._stock_reports = set(), set(), set()
+        if not (updated or deleted or stock_reports):
+            return {'products': 0, 'stock': 0, 'deleted': 0}
+
+        with self._apply_lock:
+            try:
+                result = self._apply(updated, deleted, stock_reports)
+            except Exception:
+                # Возвращаем события в очередь, чтобы применить их со следующей пачкой
+                with self._lock:
+                    self._updated |= updated - self._deleted
+                    self._deleted |= deleted - self._updated
+                    self._stock_reports |= stock_reports
+                raise
+        self.stats['batches'] += 1
+        self.stats['products_updated'] += result['products']
+        self.stats['stock_updated'] += result['stock']
+        self.stats['products_deleted'] += result['deleted']
+        logger.info(
+            f"Вебхуки МойСклад применены: товаров {result['products']}, "
+            f"остатков {result['stock']}, снято с продажи {result['deleted']}"
+        )
+        return result
+
+    def _fetch_stock(self, client, product_ids, stock_reports):
+        """
+        Остатки на точках продаж для измененных товаров и товаров из отчетов вебхуков остатков.
+
+        Отчет из вебхука может содержать только склад, на котором изменился остаток,
+        поэтому из него берутся лишь ID товаров, а остатки по всем складам
+        запрашиваются заново.
+        """
+        ids = set(product_ids)
+        for report in stock_reports:
+            data = client.get(report)
+            rows = data if isinstance(data, list) else data.get('rows', [])
+            ids.update(row['assortmentId'] for row in rows if row.get('assortmentId'))
+        ids = sorted(product_id for product_id in ids if ENTITY_ID_RE.match(product_id))
+        if not ids:
+            return {}
+
+        stores = {store['id']: store['name'] for store in client.iter_rows('entity/store')}
+        store_points = get_store_points(stores)
+        points = {}
+        for i in range(0, len(ids), STOCK_FILTER_SIZE):
+            chunk = ids[i:i + STOCK_FILTER_SIZE]
+            rows = client.get('report/stock/bystore/current', params={
+                'filter': ';'.join(f"assortmentId={product_id}" for product_id in chunk)
+            })
+            points.update(stock_points_from_report(rows, store_points, chunk))
+        return points
+
+    def _apply(self, updated, deleted, stock_reports):
+        with self.client_factory() as client:
+            products = [client.get(f"entity/product/{product_id}") for product_id in sorted(updated)]
+            stock = self._fetch_stock(client, updated, stock_reports)
+            paths = {product['id']: get_full_category_path(product, client) for product in products}
+        result = {'products': 0, 'stock': 0, 'deleted': 0}
+
+        with Database() as db:
+            cursor, conn = db.cursor, db.connection
+            if products:
+                categories = CategoryIndex(cursor)
+                categories.ensure_paths(cursor, conn, paths.values())
+                rows = []
+                for product in products:
+                    stock_point1, stock_point2 = stock.get(product['id'], (0, 0))
+                    rows.append(build_product_row(
+                        product, categories.resolve(paths[product['id']]), stock_point1, stock_point2
+                    ))
+                failed = upsert_products(cursor, conn, rows)
+                for row, e in failed:
+                    self.stats['errors'] += 1
+                    logger.error(f"Ошибка при записи товара {row['name']} из вебхука: {e}")
+                result['products'] = len(rows) - len(failed)
+
+            # Остатки товаров, которые не обновлялись целиком
+            stock_changes = [
+                (points[0] > 0, points[1] > 0, product_id)
+                for product_id, points in stock.items() if product_id not in updated
+            ]
+            if stock_changes:
+                cursor.executemany(
+                    "UPDATE products SET stock_point1 = %s, stock_point2 = %s WHERE moysklad_id = %s",
+                    stock_changes
+                )
+                result['stock'] = len(stock_changes)
+
+            # Удаленные товары не удаляем физически (на них ссылаются заказы), а снимаем с продажи
+            if deleted:
+                cursor.executemany(
+                    "UPDATE products SET stock_point1 = FALSE, stock_point2 = FALSE WHERE moysklad_id = %s",
+                    [(product_id,) for product_id in deleted]
+                )
+                result['deleted'] = len(deleted)
+
+            bump_catalog_version(cursor)
+            conn.commit()
+        notify_catalog_listeners()
+        return result
+
+class MoySkladWebhookHandler(BaseHTTPRequestHandler):
+    server_version = 'MoySkladWebhook/1.0'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self, parsed):
+        token = self.server.token
+        given = parse_qs(parsed.query).get('token', [''])[0]
+        return bool(token) and hmac.compare_digest(given.encode('utf-8'), token.encode('utf-8'))
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path != WEBHOOK_PATH:
+            return self._send_json({'error': 'not found'}, 404)
+        if not self._authorized(parsed):
+            return self._send_json({'error': 'forbidden'}, 403)
+        self._send_json(dict(self.server.processor.stats))
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        if parsed.path != WEBHOOK_PATH:
+            return self._send_json({'error': 'not found'}, 404)
+        if not self._authorized(parsed):
+            return self._send_json({'error': 'forbidden'}, 403)
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except (ValueError, UnicodeDecodeError):
+            return self._send_json({'error': 'invalid json'}, 400)
+        # МойСклад ждет быстрый ответ, события применяются в фоне
+        self.server.processor.submit(payload)
+        self._send_json({'status': 'accepted'})
+
+def start_webhook_server(processor: MoySkladWebhookProcessor, host: str = '0.0.0.0',
+                         port: int = MOYSKLAD_WEBHOOK_PORT, token: str = MOYSKLAD_WEBHOOK_TOKEN):
+    """
+    Запускает прием вебхуков в фоновом потоке
+
+    Returns:
+        ThreadingHTTPServer: server.shutdown() останавливает прием
+
+    Raises:
+        ValueError: Не задан token - без него вебхуки мог бы отправлять кто угодно
+    """
+    if not token:
+        raise ValueError("Не задан MOYSKLAD_WEBHOOK_TOKEN: прием вебхуков МойСклад без токена не запускается")
+    server = ThreadingHTTPServer((host, port), MoySkladWebhookHandler)
+    server.processor = processor.start()
+    server.token = token
+    thread = threading.Thread(target=server.serve_forever, name='moysklad-webhook-http', daemon=True)
+    thread.start()
+    logger.info(f"Прием вебхуков МойСклад: порт {server.server_address[1]}, путь {WEBHOOK_PATH}")
+    return server
+
+def load_payloads(paths):
+    payloads = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            payloads.append(json.load(f))
+    return payloads
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Вебхуки МойСклад: прием и проверка на записанных запросах")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('serve', help="Запустить прием вебхуков без бота")
+    apply_parser = subparsers.add_parser('apply', help="Применить записанные вебхуки напрямую")
+    apply_parser.add_argument('files', nargs='+')
+    replay_parser = subparsers.add_parser('replay', help="Отправить записанные вебхуки на работающий сервер")
+    replay_parser.add_argument('files', nargs='+')
+    replay_parser.add_argument('--url', default=f"http://127.0.0.1:{MOYSKLAD_WEBHOOK_PORT}{WEBHOOK_PATH}")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'serve':
+        server = start_webhook_server(MoySkladWebhookProcessor())
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+            server.processor.stop()
+    elif args.command == 'apply':
+        processor = MoySkladWebhookProcessor()
+        for payload in load_payloads(args.files):
+            processor.submit(payload)
+        print(processor.flush())
+    else:
+        url = args.url
+        if MOYSKLAD_WEBHOOK_TOKEN and 'token=' not in url:
+            url += f"?token={MOYSKLAD_WEBHOOK_TOKEN}"
+        for path, payload in zip(args.files, load_payloads(args.files)):
+            request = Request(url, data=json.dumps(payload).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'}, method='POST')
+            with urlopen(request) as response:
+                print(f"{path}: {response.status} {response.read().decode('utf-8')}")
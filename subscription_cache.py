@@ -0,0 +1,101 @@
+import logging
+import time
+from telegram import Update, ChatMember
+from telegram.ext import ContextTypes
+from config import CHANNEL_USERNAME, SUBSCRIPTION_CACHE_TTL
+from database import async_db
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBED_STATUSES = {ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER}
+
+class SubscriptionCache:
+    """
+    Кэш статуса подписки пользователей на канал.
+
+    Положительный результат проверки хранится ttl секунд в памяти и в
+    users.is_subscribed (с временем проверки), поэтому переживает перезапуск
+    бота. Отрицательный не кэшируется: пользователь мог только что подписаться.
+    Обновления chat_member канала (подписка/отписка) меняют статус сразу,
+    без опроса getChatMember.
+    """
+
+    def __init__(self, ttl: float = SUBSCRIPTION_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _get_cached(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    async def get(self, user_id):
+        """
+        Статус подписки из кэша или базы, без обращения к Telegram
+
+        Returns:
+            bool: True, если пользователь недавно подтвердил подписку, иначе None
+        """
+        if self._get_cached(user_id):
+            self.stats['hits'] += 1
+            return True
+        try:
+            row = await async_db.get_subscription(user_id)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении статуса подписки {user_id}: {e}")
+            row = None
+        if row and row['is_subscribed'] and row['age'] is not None and row['age'] < self.ttl:
+            self._entries[user_id] = (time.monotonic() + self.ttl - row['age'], True)
+            self.stats['hits'] += 1
+            return True
+        self.stats['misses'] += 1
+        return None
+
+    async def set(self, user_id, is_subscribed, username=None, register=False):
+        """
+        Сохраняет результат проверки в памяти и в базе
+
+        Args:
+            register (bool): Создать пользователя, если его еще нет в базе
+                             (для тех, кто сам нажал проверку подписки в боте)
+        """
+        if is_subscribed:
+            self._entries[user_id] = (time.monotonic() + self.ttl, True)
+        else:
+            self._entries.pop(user_id, None)
+        try:
+            if register:
+                await async_db.save_subscription(user_id, username, is_subscribed)
+            else:
+                await async_db.update_subscription(user_id, is_subscribed)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении статуса подписки {user_id}: {e}")
+
+    async def check(self, bot, user):
+        """Статус подписки: из кэша, а при промахе - через getChatMember"""
+        if await self.get(user.id):
+            return True
+        try:
+            member = await bot.get_chat_member(chat_id=CHANNEL_USERNAME, user_id=user.id)
+            logger.info(f"Статус пользователя {user.id} в канале: {member.status}")
+            is_subscribed = member.status in SUBSCRIBED_STATUSES
+        except Exception as e:
+            logger.error(f"Ошибка при проверке подписки: {str(e)}")
+            return False
+        await self.set(user.id, is_subscribed, user.username, register=True)
+        return is_subscribed
+
+    async def handle_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик обновлений chat_member: подписка и отписка от канала"""
+        change = update.chat_member
+        if not change or change.chat.username != CHANNEL_USERNAME[1:]:
+            return
+        user = change.new_chat_member.user
+        is_subscribed = change.new_chat_member.status in SUBSCRIBED_STATUSES
+        logger.info(f"Пользователь {user.id} {'подписался на канал' if is_subscribed else 'отписался от канала'}")
+        # Подписчиков канала, которые еще не пользовались ботом, в базу не добавляем
+        await self.set(user.id, is_subscribed)
+
+subscription_cache = SubscriptionCache()
@@ -0,0 +1,87 @@
+import time
+import pytest
+import callback_codec
+from callback_codec import CallbackStateStore, MAX_CALLBACK_DATA, decode_int, encode_int, pack, unpack
+from callback_router import CallbackRouter
+
+async def handler(update, context, **kwargs):
+    return kwargs
+
+@pytest.mark.parametrize('value', [0, 1, 61, 62, 3843, 3844, 10 ** 9, 2 ** 63, -1, -4821])
+def test_int_round_trip(value):
+    assert decode_int(encode_int(value)) == value
+
+def test_int_encoding_is_short():
+    assert encode_int(4821) == '1fL'
+    assert len(encode_int(10 ** 9)) == 6
+
+@pytest.mark.parametrize('text', ['', '-', 'a.b', 'ё', '1 2'])
+def test_invalid_int(text):
+    with pytest.raises(ValueError):
+        decode_int(text)
+
+def test_pack_unpack_inline():
+    store = CallbackStateStore()
+    data = pack('p', ['1fL', 'c'], store)
+    assert data == '~p.1fL.c'
+    assert unpack(data, store) == ('p', ['1fL', 'c'])
+    assert len(store) == 0
+
+def test_long_values_spill_to_store():
+    store = CallbackStateStore()
+    values = [encode_int(10 ** 9 + i) for i in range(20)]
+    data = pack('p', values, store)
+    assert data.startswith('~$')
+    assert len(data.encode('utf-8')) <= MAX_CALLBACK_DATA
+    assert unpack(data, store) == ('p', values)
+
+def test_store_expiry_and_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(callback_codec.time, 'monotonic', lambda: now[0])
+    store = CallbackStateStore(ttl=10, max_entries=2)
+    first = store.put('a')
+    now[0] += 5
+    second = store.put('b')
+    assert (store.get(first), store.get(second)) == ('a', 'b')
+
+    # Третья запись вытесняет самую старую
+    now[0] += 3
+    third = store.put('c')
+    assert store.get(first) is None
+    assert len(store) == 2
+
+    now[0] += 8
+    assert store.get(second) is None
+    assert store.get(third) == 'c'
+    assert unpack('~$unknown', store) is None
+
+@pytest.fixture
+def router():
+    router = CallbackRouter()
+    router.add('catpage_{category_id:int}_{direction}_{anchor_id:int}', handler, code='c')
+    router.add('product_{product_id:int}', handler, code='p')
+    return router
+
+@pytest.mark.parametrize('back', [(), (12,), (12, 3456, 1), tuple(range(10 ** 9, 10 ** 9 + 20))])
+def test_router_round_trip_with_back_stack(router, back):
+    data = router.pack('p', 4821, back=back)
+    assert len(data.encode('utf-8')) <= MAX_CALLBACK_DATA
+    route, args = router.match(data)
+    assert route.pattern == 'product_{product_id:int}'
+    expected = {'product_id': 4821}
+    if back:
+        expected['back'] = back
+    assert args == expected
+
+def test_router_round_trip_string_param(router):
+    route, args = router.match(router.pack('c', 12, 'n', 3456))
+    assert args == {'category_id': 12, 'direction': 'n', 'anchor_id': 3456}
+
+def test_router_rejects_bad_values(router):
+    with pytest.raises(ValueError):
+        router.pack('p')
+    with pytest.raises(ValueError):
+        router.pack('c', 12, 'n.x', 3456)
+    # Неизвестный код и испорченные значения не находят обработчик
+    assert router.match('~z.1') == (None, None)
+    assert router.match('~p.!!') == (None, None)
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from callback_router import CallbackRouter
+
+async def handler(update, context, **kwargs):
+    return kwargs
+
+@pytest.fixture
+def router():
+    router = CallbackRouter()
+    router.add('show_categories', handler)
+    router.add('category_{parent_id:int}', handler)
+    router.add('category_list_{parent_id:int}', handler)
+    router.add('catpage_{category_id:int}_{direction}_{anchor_id:int}', handler, code='c')
+    router.add('product_{product_id:int}', handler, code='p')
+    router.add('status_{order_id:int}_{new_status:rest}', handler)
+    return router
+
+@pytest.mark.parametrize('data, pattern, args', [
+    ('show_categories', 'show_categories', {}),
+    ('category_15', 'category_{parent_id:int}', {'parent_id': 15}),
+    ('category_list_7', 'category_list_{parent_id:int}', {'parent_id': 7}),
+    ('catpage_12_n_3456', 'catpage_{category_id:int}_{direction}_{anchor_id:int}',
+     {'category_id': 12, 'direction': 'n', 'anchor_id': 3456}),
+    ('status_913_in_delivery', 'status_{order_id:int}_{new_status:rest}',
+     {'order_id': 913, 'new_status': 'in_delivery'}),
+])
+def test_match(router, data, pattern, args):
+    route, matched = router.match(data)
+    assert route.pattern == pattern
+    assert matched == args
+
+@pytest.mark.parametrize('data', [
+    'category_', 'category_abc', 'category_-5', 'category_ 5', 'product_1_2', 'catpage_1_n', 'unknown', '',
+])
+def test_no_match(router, data):
+    assert router.match(data) == (None, None)
+
+@pytest.mark.parametrize('pattern', [
+    'show_categories',                  # тот же литерал
+    'category_{id:int}',                # тот же шаблон с другим именем параметра
+    'category_{name}',                  # строка принимает и числа
+    'category_5',                       # литерал подходит под {parent_id:int}
+    'category_list_{name:rest}',        # остаток совпадает с category_list_{parent_id:int}
+    'status_{order_id:int}_{a}_{b}',    # остаток принимает любое число сегментов
+])
+def test_overlapping_patterns_rejected(router, pattern):
+    with pytest.raises(ValueError):
+        router.add(pattern, handler)
+
+@pytest.mark.parametrize('pattern', [
+    'category_list',                    # меньше сегментов
+    'category_abc',                     # литерал не число
+    'product_{product_id:int}_{extra}', # больше сегментов без остатка
+    'status',
+])
+def test_distinct_patterns_accepted(router, pattern):
+    router.add(pattern, handler)
+
+def test_routes_registered_in_any_order_agree():
+    patterns = ['a_{x:int}', 'a_b_{y:int}', 'a_{x:int}_{z}', 'a']
+    forward, backward = CallbackRouter(), CallbackRouter()
+    for pattern in patterns:
+        forward.add(pattern, handler)
+    for pattern in reversed(patterns):
+        backward.add(pattern, handler)
+    for data, pattern in [('a_1', 'a_{x:int}'), ('a_b_2', 'a_b_{y:int}'), ('a_1_z', 'a_{x:int}_{z}'),
+                          ('a', 'a'), ('a_b', None)]:
+        for router in (forward, backward):
+            route, _ = router.match(data)
+            assert (route.pattern if route else None) == pattern
+
+def test_invalid_patterns():
+    router = CallbackRouter()
+    with pytest.raises(ValueError):
+        router.add('x_{a:float}', handler)
+    with pytest.raises(ValueError):
+        router.add('x_{a:rest}_{b}', handler)
+    with pytest.raises(ValueError):
+        router.add('x_{a}_y', handler)
+
+def test_duplicate_and_invalid_codes(router):
+    with pytest.raises(ValueError):
+        router.add('other_{x:int}', handler, code='p')
+    with pytest.raises(ValueError):
+        router.add('other_{x:int}', handler, code='p.x')
+    with pytest.raises(ValueError):
+        router.add('other_{x:rest}', handler, code='r')
+
+class Query:
+    def __init__(self, data):
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append((text, show_alert))
+
+class Update:
+    def __init__(self, data):
+        self.callback_query = Query(data)
+
+def test_dispatch_runs_guard_then_handler():
+    calls = []
+    router = CallbackRouter()
+
+    async def guard(update, context):
+        calls.append('guard')
+        return update.callback_query.data != 'admin_2'
+
+    @router.route('admin_{order_id:int}', guard=guard)
+    async def admin(update, context, order_id):
+        calls.append(order_id)
+
+    asyncio.run(router.dispatch(Update('admin_1'), None))
+    asyncio.run(router.dispatch(Update('admin_2'), None))
+    assert calls == ['guard', 1, 'guard']
+
+def test_dispatch_expired_compact_data():
+    update = Update('~$unknowntoken')
+    asyncio.run(CallbackRouter().dispatch(update, None))
+    assert update.callback_query.answers == [("Кнопка устарела, откройте раздел заново", True)]
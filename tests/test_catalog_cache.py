@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+import catalog_cache as catalog_cache_module
+from catalog_cache import CatalogCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+def make_cache(monkeypatch, ttl=10, max_entries=3):
+    clock = Clock()
+    monkeypatch.setattr(catalog_cache_module.time, 'monotonic', clock.monotonic)
+    # Проверка версии каталога обращается к базе, в тестах она не нужна
+    cache = CatalogCache(ttl=ttl, version_check_interval=float('inf'), max_entries=max_entries)
+    return cache, clock
+
+def get(cache, key, loads):
+    async def loader():
+        loads.append(key)
+        return f"value-{key}"
+    return asyncio.run(cache._get(key, loader))
+
+def test_expired_entry_dropped_on_read(monkeypatch):
+    cache, clock = make_cache(monkeypatch)
+    loads = []
+    get(cache, 'a', loads)
+    get(cache, 'b', loads)
+    clock.now += 5
+    get(cache, 'b', loads)
+    clock.now += 6
+    assert get(cache, 'a', loads) == 'value-a'
+    assert loads == ['a', 'b', 'a']
+    # Просроченная запись 'b' уходит при первом чтении, а не копится до сброса
+    get(cache, 'b', loads)
+    assert loads == ['a', 'b', 'a', 'b']
+    assert cache.get_stats()['entries'] == 2
+
+def test_expired_entry_removed_even_if_reload_fails(monkeypatch):
+    cache, clock = make_cache(monkeypatch)
+    get(cache, 'a', [])
+    clock.now += 11
+
+    async def failing_loader():
+        raise RuntimeError('база недоступна')
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache._get('a', failing_loader))
+    assert 'a' not in cache._entries
+
+def test_least_recently_used_entry_evicted(monkeypatch):
+    cache, clock = make_cache(monkeypatch, max_entries=3)
+    loads = []
+    for key in ('a', 'b', 'c'):
+        get(cache, key, loads)
+    get(cache, 'a', loads)
+    get(cache, 'd', loads)
+
+    stats = cache.get_stats()
+    assert stats['entries'] == 3
+    assert stats['evictions'] == 1
+    assert list(cache._entries) == ['c', 'a', 'd']
+
+    loads.clear()
+    get(cache, 'a', loads)
+    get(cache, 'b', loads)
+    assert loads == ['b']
+
+def test_invalidate_clears_entries(monkeypatch):
+    cache, clock = make_cache(monkeypatch)
+    loads = []
+    get(cache, 'a', loads)
+    cache.invalidate()
+    get(cache, 'a', loads)
+    assert loads == ['a', 'a']
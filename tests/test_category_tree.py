@@ -0,0 +1,54 @@
+from category_tree import CategoryTree
+
+ROWS = [
+    {'id': 1, 'name': 'Жидкости', 'parent_id': None},
+    {'id': 2, 'name': 'Солевые', 'parent_id': 1},
+    {'id': 3, 'name': 'Ягодные', 'parent_id': 2},
+    {'id': 4, 'name': 'Классические', 'parent_id': 1},
+    {'id': 5, 'name': 'Устройства', 'parent_id': None},
+]
+
+def names(nodes):
+    return [node['name'] for node in nodes]
+
+def test_children_and_roots():
+    tree = CategoryTree(ROWS)
+    assert names(tree.children()) == ['Жидкости', 'Устройства']
+    assert names(tree.children(1)) == ['Солевые', 'Классические']
+    assert tree.children(3) == []
+    assert tree.children(404) == []
+    assert len(tree) == 5 and 3 in tree and 404 not in tree
+
+def test_path_and_ancestors():
+    tree = CategoryTree(ROWS)
+    assert names(tree.path(3)) == ['Жидкости', 'Солевые', 'Ягодные']
+    assert names(tree.ancestors(3)) == ['Жидкости', 'Солевые']
+    assert tree.ancestors(1) == []
+    assert tree.path(404) == [] and tree.ancestors(404) == []
+    assert tree.parent_id(3) == 2 and tree.parent_id(1) is None
+
+def test_products_counted_through_subtree():
+    tree = CategoryTree(ROWS, {3: 2, 4: 1})
+    assert tree.product_count_below(1) == 3
+    assert tree.product_count_below(2) == 2
+    assert tree.has_products_below(2)
+    assert not tree.has_products(2)
+    assert tree.has_products(3)
+    assert not tree.has_products_below(5)
+    assert not tree.has_products_below(404)
+
+def test_orphan_becomes_root():
+    tree = CategoryTree(ROWS + [{'id': 6, 'name': 'Без родителя', 'parent_id': 99}])
+    assert 6 in [node['id'] for node in tree.children()]
+    assert names(tree.path(6)) == ['Без родителя']
+
+def test_cycle_does_not_hang():
+    rows = [
+        {'id': 1, 'name': 'Корень', 'parent_id': None},
+        {'id': 2, 'name': 'A', 'parent_id': 3},
+        {'id': 3, 'name': 'B', 'parent_id': 2},
+    ]
+    tree = CategoryTree(rows, {2: 1})
+    # Категории из цикла недостижимы от корня: пути у них нет, товары в корень не попадают
+    assert tree.path(2) == []
+    assert tree.product_count_below(1) == 0
@@ -0,0 +1,81 @@
+import pytest
+import moysklad
+from fake_moysklad import start_fake_moysklad
+from import_products import iter_product_pages
+from moysklad import MoySkladClient, TokenBucket
+
+@pytest.fixture
+def fake_moysklad():
+    """Запускает имитацию МойСклад и возвращает (server, клиент к ней)"""
+    started = []
+
+    def start(**kwargs):
+        server, base_url = start_fake_moysklad(**kwargs)
+        # Локальной имитации лимиты МойСклад не нужны
+        client = MoySkladClient('test', 'test', base_url=base_url, rate_limiter=TokenBucket(10 ** 6, 1))
+        started.append((server, client))
+        return server, client
+
+    yield start
+    for server, client in started:
+        client.close()
+        server.shutdown()
+
+def test_pages_follow_next_href(fake_moysklad):
+    server, client = fake_moysklad(products=25, folders=3)
+    pages = list(client.iter_pages('entity/product', {'limit': 10}))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ids = [product['id'] for page in pages for product in page]
+    assert ids == [f"product-{i}" for i in range(25)]
+    assert server.requests['/entity/product'] == 3
+
+def test_delta_filter_by_updated(fake_moysklad):
+    _, client = fake_moysklad(products=56, folders=3)
+    products = [product for page in iter_product_pages(client, '2024-01-27 00:00:00') for product in page]
+    # Дни 27 и 28 - по два товара из каждых 28
+    assert sorted(product['id'] for product in products) == sorted(
+        f"product-{i}" for i in range(56) if i % 28 + 1 >= 27
+    )
+
+def test_retries_throttled_requests(fake_moysklad):
+    server, client = fake_moysklad(products=30, folders=3, fail_every=2)
+    products = list(client.iter_rows('entity/product', {'limit': 10}))
+    assert len(products) == 30
+    assert server.requests['429'] > 0
+    assert client.stats['retries'] == server.requests['429']
+
+def test_folders_cached_per_client(fake_moysklad):
+    server, client = fake_moysklad(products=10, folders=2)
+    href = f"{client.base_url}/entity/productfolder/folder-1"
+    client.prefetch_folders([href, href])
+    assert client.get_folder(href)['name'] == 'Папка 2'
+    assert server.requests['/entity/productfolder'] == 1
+    assert client.stats['folder_cache_hits'] == 1
+
+def test_token_bucket_allows_burst_then_waits(monkeypatch):
+    now = [100.0]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(moysklad.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(moysklad.time, 'sleep', fake_sleep)
+
+    bucket = TokenBucket(capacity=5, period=0.5)
+    for _ in range(5):
+        bucket.acquire()
+    assert sleeps == []
+
+    # Шестой запрос ждет один токен: period / capacity = 0.1 с
+    bucket.acquire()
+    assert sleeps == [pytest.approx(0.1)]
+
+    # За секунду простоя накапливается не больше capacity токенов
+    now[0] += 1
+    for _ in range(5):
+        bucket.acquire()
+    assert len(sleeps) == 1
+    bucket.acquire()
+    assert sleeps[1:] == [pytest.approx(0.1)]
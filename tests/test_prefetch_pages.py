@@ -0,0 +1,60 @@
+import threading
+import time
+import pytest
+from import_products import prefetch_pages
+
+class PagedClient:
+    """Клиент МойСклад с count страницами товаров; считает выданные страницы"""
+
+    def __init__(self, count, fail_at=None):
+        self.count = count
+        self.fail_at = fail_at
+        self.produced = 0
+        self.folders = []
+
+    def iter_pages(self, path, params=None):
+        for i in range(self.count):
+            if i == self.fail_at:
+                raise RuntimeError("ошибка загрузки")
+            self.produced += 1
+            yield [{'id': f"product-{i}", 'productFolder': {'meta': {'href': f"folder-{i}"}}}]
+
+    def prefetch_folders(self, hrefs):
+        self.folders.extend(hrefs)
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_yields_all_pages_in_order():
+    client = PagedClient(5)
+    pages = list(prefetch_pages(client, depth=2))
+    assert [page[0]['id'] for page in pages] == [f"product-{i}" for i in range(5)]
+    # Папки товаров без pathName загружаются заранее
+    assert client.folders == [f"folder-{i}" for i in range(5)]
+
+def test_loader_stays_bounded_ahead_of_consumer():
+    client = PagedClient(100)
+    pages = prefetch_pages(client, depth=2)
+    next(pages)
+    wait_for(lambda: client.produced >= 4)
+    time.sleep(0.1)
+    # Отдана одна страница, в очереди depth, и еще одна ждет места в очереди
+    assert client.produced == 4
+    pages.close()
+
+def test_close_stops_loader_thread():
+    client = PagedClient(100)
+    pages = prefetch_pages(client, depth=1)
+    next(pages)
+    pages.close()
+    assert not any(thread.name == 'moysklad-pages' for thread in threading.enumerate())
+    assert client.produced < 100
+
+def test_loader_error_reaches_consumer():
+    client = PagedClient(5, fail_at=3)
+    pages = prefetch_pages(client, depth=2)
+    assert len([next(pages) for _ in range(3)]) == 3
+    with pytest.raises(RuntimeError, match="ошибка загрузки"):
+        next(pages)
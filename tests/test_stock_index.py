@@ -0,0 +1,45 @@
+from import_products import get_store_points, get_stock_index
+
+STORES = {
+    'store-1': '1 склад (Дзержинского)',
+    'store-2': 'Магазин на Степана Разина',
+    'store-3': 'Оптовый склад',
+}
+
+class FakeClient:
+    """Отдает заранее заданные ответы по порядку и запоминает запросы"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, params=None):
+        self.requests.append((url, params))
+        return self.responses.pop(0)
+
+def test_store_points_by_name():
+    assert get_store_points(STORES) == {'store-1': 0, 'store-2': 1}
+
+def test_stock_index_from_list_report():
+    client = FakeClient([
+        {'assortmentId': 'a', 'storeId': 'store-1', 'stock': 3},
+        {'assortmentId': 'a', 'storeId': 'store-2', 'stock': 1.0},
+        {'assortmentId': 'b', 'storeId': 'store-2', 'stock': 2},
+        # Склад не привязан к точке продаж
+        {'assortmentId': 'c', 'storeId': 'store-3', 'stock': 5},
+        # Нулевые и отрицательные остатки в индекс не попадают
+        {'assortmentId': 'd', 'storeId': 'store-1', 'stock': 0},
+        {'assortmentId': 'e', 'storeId': 'store-1', 'stock': -2},
+    ])
+    assert get_stock_index(client, STORES) == {'a': (3, 1), 'b': (0, 2)}
+    assert client.requests == [('report/stock/bystore/current', {'stockType': 'stock'})]
+
+def test_stock_index_follows_next_href():
+    next_href = 'https://api.moysklad.ru/api/remap/1.2/report/stock/bystore/current?offset=1'
+    client = FakeClient(
+        {'rows': [{'assortmentId': 'a', 'storeId': 'store-1', 'stock': 1}], 'meta': {'nextHref': next_href}},
+        {'rows': [{'assortmentId': 'a', 'storeId': 'store-2', 'stock': 4}], 'meta': {}},
+    )
+    assert get_stock_index(client, STORES) == {'a': (1, 4)}
+    # nextHref уже содержит параметры запроса
+    assert client.requests[1] == (next_href, None)